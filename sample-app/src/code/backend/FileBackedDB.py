@@ -1,55 +1,240 @@
+import os, bisect, itertools
+try:
+  import fcntl
+except ImportError:
+  #no locking across processes
+  fcntl = None
 from model import AddressBookItem
-from pywebmvc.framework.apache import Logger
+from pywebmvc.tools.table import ListDataSource
+from pywebmvc.tools.dbutils import BasicSearchCriteria, InSearchCriteria, \
+                                   AndSearchCriteria
+
+FIELDS = ("id", "firstName", "lastName", "street", "city", "state", "phone",
+          "email")
+
+def getIndexValue(value):
+  """returns C{value} as compared by the search criteria."""
+  if isinstance(value, str):
+    return value.decode("utf-8", "replace")
+  return unicode(value)
+
+def compareIds(x, y):
+  return cmp(int(x.id), int(y.id))
 
 class FileAddressBookHome:
-  def __init__(self, filename):
+  """Stores the address book in an append-only file, one entry per line.
+  Saving an entry appends it, and the last line written for an id is the
+  current entry. The entries are kept in memory by id, and are only read
+  again from the file when it was changed by another process: appended lines
+  are read from where the last read stopped, and the whole file is read if it
+  was replaced. The entries sorted on a property are kept until an entry
+  changes. The file is compacted when more than C{compactRatio} of its lines
+  are superseded entries. Appending an entry, which assigns the next id to a
+  new one, and compacting the file are done holding an exclusive C{fcntl}
+  lock on the file C{filename + ".lock"}, so that the processes and threads
+  sharing the file do not assign the same id or lose the entries appended
+  while it is rewritten."""
+  def __init__(self, filename, compactRatio = 0.5, compactMinLines = 100):
     self.filename = filename
+    self.compactRatio = compactRatio
+    self.compactMinLines = compactMinLines
+    self.entries = {}
+    self.maxId = 0
+    self.lines = 0
+    self.fileInfo = None
+    self.offset = 0
+    self.sortedIndexes = {}
   def getLength(self):
-    addressList = self.__readAllAddresses()
-    return len(addressList)
+    return len(self.getEntries())
   def find(self, searchCriteria, sortColumn, dir):
-    addressList = self.__readAllAddresses()
-    if sortColumn:
-      addressList.sort(lambda x, y: cmp(getattr(x, sortColumn.property), getattr(y, sortColumn.property)))
-    if dir == "desc":
-      addressList.reverse()
-    Logger.error("got here 22")
-    if searchCriteria:
-      Logger.error(repr(searchCriteria))
-      Logger.error("len addresslist = " + str(len(addressList)))
-      addressList = filter(lambda e: searchCriteria.accepts(e), addressList)
-    return addressList
+    return self.getDataSource().fetch(searchCriteria, sortColumn, dir, 0, None)
   def save(self, entry):
-    if not entry.id:
-      entry.id = self.__getNextId()
+    lockFile = self.lock()
+    try:
+      self.refresh()
+      if not entry.id:
+        entry.id = self.__getNextId()
+      line = self.__marshall(entry)
       fp = file(self.filename, "a")
-      fp.write(self.__marshall(entry))
-      fp.close()
-    else:
-      entryList = self.__readAllAddresses()
-      entryList = filter(lambda e: e.id != entry.id, entryList)
-      entryList.append(entry)
-      entryList.sort(lambda x, y: cmp(x.id, y.id))
-      data = "".join(map(lambda e: self.__marshall(e), entryList))
-      fp = file(self.filename, "w")
-      fp.write(data)
-      fp.close()
+      try:
+        fp.write(line)
+      finally:
+        fp.close()
+      self.refresh()
+      if self.lines >= self.compactMinLines and \
+         self.lines - len(self.entries) > self.lines * self.compactRatio:
+        self.__compact()
+    finally:
+      self.unlock(lockFile)
+  def lock(self):
+    """waits for the lock on the file and returns the open lock file to pass
+    to L{unlock}."""
+    if not fcntl:
+      return None
+    lockFile = open(self.filename + ".lock", "a")
+    fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+    return lockFile
+  def unlock(self, lockFile):
+    if lockFile:
+      fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+      lockFile.close()
+  def getDataSource(self):
+    """returns a data source listing the entries for a table."""
+    return FileDataSource(self)
   def findById(self, id):
-    return filter(lambda x: x.id == id, self.__readAllAddresses())[0]
-  def __readAllAddresses(self):
+    return self.getEntries()[str(id)]
+  def getEntries(self):
+    """returns the current entries by id."""
+    self.refresh()
+    return self.entries
+  def iterSorted(self, property, reverse = False):
+    """returns an iterator of the entries sorted on C{property}, then by
+    id."""
+    index = self.getSortedIndex(property)
+    if reverse:
+      index = reversed(index)
+    entries = self.entries
+    return (entries[id] for (value, number, id) in index)
+  def getSortedIndex(self, property):
+    """returns the list of the tuples (value, id number, id) of the entries,
+    sorted."""
+    self.refresh()
+    index = self.sortedIndexes.get(property)
+    if index is None:
+      index = [(getIndexValue(getattr(entry, property)), int(id), id)
+               for (id, entry) in self.entries.iteritems()]
+      index.sort()
+      self.sortedIndexes[property] = index
+    return index
+  def findEqual(self, property, value):
+    """returns the entries whose C{property} is C{value}."""
+    index = self.getSortedIndex(property)
+    value = getIndexValue(value)
+    start = bisect.bisect_left(index, (value,))
+    entries = []
+    for (entryValue, number, id) in itertools.islice(index, start, None):
+      if entryValue != value:
+        break
+      entries.append(self.entries[id])
+    return entries
+  def findCandidates(self, criteria):
+    """returns the entries which may meet C{criteria}, by id, looked up in
+    the sorted indexes, or C{None} if the criteria can not use them."""
+    if isinstance(criteria, BasicSearchCriteria):
+      if criteria.operator == BasicSearchCriteria.OP_EQUAL and \
+         criteria.property in FIELDS:
+        entries = self.findEqual(criteria.property, criteria.value)
+        entries.sort(compareIds)
+        return entries
+    elif isinstance(criteria, InSearchCriteria):
+      if criteria.property in FIELDS:
+        entries = []
+        for value in frozenset(map(getIndexValue, criteria.valueList)):
+          entries.extend(self.findEqual(criteria.property, value))
+        entries.sort(compareIds)
+        return entries
+    elif isinstance(criteria, AndSearchCriteria):
+      candidates1 = self.findCandidates(criteria.criteria1)
+      candidates2 = self.findCandidates(criteria.criteria2)
+      if candidates1 is None or (candidates2 is not None and
+                                 len(candidates2) < len(candidates1)):
+        return candidates2
+      return candidates1
+    return None
+  def refresh(self):
+    """reads the lines appended to the file since it was last read, or the
+    whole file if it was replaced."""
     try:
-      fp = file(self.filename, "r")
-      rawData = fp.read().strip()
+      stat = os.stat(self.filename)
+    except OSError:
+      if self.fileInfo is not None:
+        self.reset()
+      return
+    info = (stat.st_ino, stat.st_size, stat.st_mtime)
+    if info == self.fileInfo:
+      return
+    if self.fileInfo is None or stat.st_ino != self.fileInfo[0] or \
+       stat.st_size < self.offset:
+      self.reset()
+    fp = file(self.filename, "r")
+    try:
+      fp.seek(self.offset)
+      data = fp.read()
+    finally:
       fp.close()
-      lineData = rawData.split("\n")
-    except IOError:
-      lineData = []
-    return map(lambda line: AddressBookItem(*line.split("##")), lineData)
+    #an incomplete last line is read once it is complete
+    end = data.rfind("\n") + 1
+    for line in data[:end].split("\n")[:-1]:
+      if line.strip():
+        self.__addLine(line)
+    self.offset += end
+    self.fileInfo = info
+    if end:
+      self.sortedIndexes = {}
+  def reset(self):
+    self.entries = {}
+    self.maxId = 0
+    self.lines = 0
+    self.fileInfo = None
+    self.offset = 0
+    self.sortedIndexes = {}
+  def compact(self):
+    """rewrites the file with the current entries only."""
+    lockFile = self.lock()
+    try:
+      self.__compact()
+    finally:
+      self.unlock(lockFile)
+  def __compact(self):
+    entries = self.getEntries().values()
+    entries.sort(compareIds)
+    tempFile = "%s.%i" % (self.filename, os.getpid())
+    fp = file(tempFile, "w")
+    try:
+      fp.write("".join(map(lambda e: self.__marshall(e), entries)))
+    finally:
+      fp.close()
+    os.rename(tempFile, self.filename)
+    self.reset()
+    self.refresh()
+  def __addLine(self, line):
+    entry = AddressBookItem(*line.split("##"))
+    self.entries[entry.id] = entry
+    self.maxId = max(self.maxId, int(entry.id))
+    self.lines += 1
   def __getNextId(self):
-    addressList = self.__readAllAddresses()
-    if not addressList:
-      return 1
-    return int(addressList[-1].id) + 1
+    return self.maxId + 1
   def __marshall(self, entry):
     return "##".join([str(entry.id), entry.firstName, entry.lastName, entry.street, entry.city, entry.state, entry.phone, entry.email]) + "\n"
-  
+
+class FileDataSource(ListDataSource):
+  """Lists the entries of a L{FileAddressBookHome} from its sorted indexes:
+  the entries meeting an equality criteria are looked up in the index of its
+  property, and the pages sorted on a property are read from its index in
+  order, instead of sorting the entries for each page."""
+  def __init__(self, home):
+    ListDataSource.__init__(self, self.getEntryList)
+    self.home = home
+  def getEntryList(self):
+    entries = self.home.getEntries().values()
+    entries.sort(compareIds)
+    return entries
+  def iterate(self, criteria):
+    candidates = None
+    if criteria is not None:
+      candidates = self.home.findCandidates(criteria)
+    if candidates is None:
+      return ListDataSource.iterate(self, criteria)
+    return itertools.ifilter(criteria.getPredicate(), candidates)
+  def fetch(self, criteria, sortColumn, order, offset, limit):
+    if sortColumn is None or sortColumn.property not in FIELDS or \
+       (criteria is not None and
+        self.home.findCandidates(criteria) is not None):
+      return ListDataSource.fetch(self, criteria, sortColumn, order, offset,
+                                  limit)
+    items = self.home.iterSorted(sortColumn.property, order == "desc")
+    if criteria is not None:
+      items = itertools.ifilter(criteria.getPredicate(), items)
+    if limit is None:
+      return list(itertools.islice(items, offset, None))
+    return list(itertools.islice(items, offset, offset + limit))
@@ -21,7 +21,12 @@ class AddressBookPage(HtmlPage):
   def getBodyStart(self,req,mapping):
     return super(AddressBookPage, self).getBodyStart(req, mapping) + self.searchTool.renderHtml(req, mapping) + """
        <div id="editlink"> <a href="%s"> Add a Contact </a> </div>
-    """ % (href(req, "addressEntry")) + self.table.getTable(req)
+    """ % (href(req, "addressEntry"))
+  def generateBody(self, req, mapping):
+    yield self.getBodyStart(req, mapping)
+    for fragment in self.table.generateTable(req):
+      yield fragment
+    yield self.getBodyEnd(req, mapping)
 
 class AddressBookTable(Table):
   def __init__(self, searchTool):
@@ -29,11 +34,10 @@ class AddressBookTable(Table):
     self.searchTool = searchTool
   def getTypeString(self,req):
     return req.bundle["term.entries"]
-  def getListSize(self, req):
-    return getBackend(req).getAddressBookHome().getLength()
-  def getItems(self, req, sortColumn, sortOrder, startIndex, endIndex):
-    searchCriteria = self.searchTool.getSearchCriteria(req)
-    return getBackend(req).getAddressBookHome().find(searchCriteria, sortColumn, sortOrder)
+  def getDataSource(self, req):
+    return getBackend(req).getAddressBookHome().getDataSource()
+  def getSearchCriteria(self, req):
+    return self.searchTool.getSearchCriteria(req)
   def getColumns(self, req):
     def commandsFormatter(req, item, dummy):
       return """ <button onclick="location.href='%s?id=%s'; return false"> Edit </button> """ % (href(req, "addressEntry"), item.id)
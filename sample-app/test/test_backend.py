@@ -0,0 +1,102 @@
+"""Tests of the address book store of the sample application. Run from this
+directory with pywebmvc on the path."""
+import unittest, os, sys, shutil, tempfile, threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "src", "code", "backend"))
+from FileBackedDB import FileAddressBookHome
+from model import AddressBookItem
+from pywebmvc.unittest.testutils import *
+
+
+def createItem(id, firstName, city = "Oslo"):
+  return AddressBookItem(id, firstName, "Smith", "Main St", city, "NA",
+                         "555", "%s@example.com" % firstName.lower())
+
+class TestFileAddressBookHome(PyWebMvcTestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.filename = os.path.join(self.dir, "addressBook")
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+  def readLines(self):
+    return open(self.filename).read().splitlines()
+  def testLastLineWins(self):
+    home = FileAddressBookHome(self.filename)
+    home.save(createItem(None, "Ann"))
+    home.save(createItem(None, "Bob"))
+    home.save(createItem("1", "Anne", "Bergen"))
+    self.assertEqual(len(self.readLines()), 3)
+    self.assertEqual(home.getLength(), 2)
+    self.assertEqual(home.findById(1).firstName, "Anne")
+    self.assertEqual(FileAddressBookHome(self.filename).findById(1).city,
+                     "Bergen")
+    self.assertEqual([e.id for e in home.findEqual("city", "Oslo")], ["2"])
+  def testAppendedByOtherWriter(self):
+    home = FileAddressBookHome(self.filename)
+    other = FileAddressBookHome(self.filename)
+    home.save(createItem(None, "Ann"))
+    self.assertEqual([e.firstName for e in home.iterSorted("firstName")],
+                     ["Ann"])
+    other.save(createItem(None, "Bob"))
+    self.assertEqual(other.findById(2).firstName, "Bob")
+    self.assertEqual([e.firstName for e in home.iterSorted("firstName")],
+                     ["Ann", "Bob"])
+    item = createItem(None, "Cid")
+    home.save(item)
+    self.assertEqual(item.id, 3)
+    self.assertEqual(other.getLength(), 3)
+  def testReplacedFile(self):
+    home = FileAddressBookHome(self.filename)
+    home.save(createItem(None, "Ann"))
+    home.save(createItem(None, "Bob"))
+    self.assertEqual(home.getLength(), 2)
+    replacement = self.filename + ".new"
+    other = FileAddressBookHome(replacement)
+    other.save(createItem(None, "Cid"))
+    os.rename(replacement, self.filename)
+    self.assertEqual(home.getLength(), 1)
+    self.assertEqual(home.findById(1).firstName, "Cid")
+    self.assertRaises(KeyError, home.findById, 2)
+  def testCompact(self):
+    home = FileAddressBookHome(self.filename, compactMinLines = 10)
+    other = FileAddressBookHome(self.filename)
+    home.save(createItem(None, "Ann"))
+    home.save(createItem(None, "Bob"))
+    for i in range(7):
+      home.save(createItem("1", "Ann%i" % i))
+    self.assertEqual(len(self.readLines()), 9)
+    self.assertEqual(other.getLength(), 2)
+    home.save(createItem("1", "Anne"))
+    self.assertEqual(len(self.readLines()), 2)
+    self.assertEqual(home.findById(1).firstName, "Anne")
+    self.assertEqual(other.findById(1).firstName, "Anne")
+    other.save(createItem(None, "Cid"))
+    self.assertEqual(home.findById(3).firstName, "Cid")
+    home.compact()
+    self.assertEqual(len(self.readLines()), 3)
+  def testConcurrentWriters(self):
+    homes = [FileAddressBookHome(self.filename, compactMinLines = 20)
+             for i in range(4)]
+    def saveItems(home):
+      for i in range(25):
+        home.save(createItem(None, "Ann"))
+    threads = [threading.Thread(target = saveItems, args = (home,))
+               for home in homes]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    home = FileAddressBookHome(self.filename)
+    self.assertEqual(home.getLength(), 100)
+    ids = home.getEntries().keys()
+    ids.sort(lambda x, y: cmp(int(x), int(y)))
+    self.assertEqual(ids, map(str, range(1, 101)))
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestFileAddressBookHome))
+
+if __name__ == "__main__":
+  runner = unittest.TextTestRunner()
+  runner.run(suite)
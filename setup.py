@@ -24,6 +24,7 @@ setup(name='pywebmvc',
                  'pywebmvc.unittest',
                  'pywebmvc.unittest.test_framework',
                  'pywebmvc.unittest.test_tools',
+                 'pywebmvc.unittest.benchmark',
                ],
       package_dir = {
                       'pywebmvc'      : 'src/code/pywebmvc',
@@ -10,6 +10,7 @@ from types import *
 from util import PyWebMvcObject
 from core import ActionNotFoundException
 from parser import getPyWebMvcConfig
+from handler import ActionHandlerBase, getFormData, getPreferredLanguages
 from mod_python import apache as mod_apache
 from mod_python import util as mod_util
 from mod_python.Session import Session
@@ -69,8 +70,18 @@ class FieldStorage(mod_python.util.FieldStorage):
   #         raise
   #     req.log_error("FieldStorage = %s" % (self))
 
-  """Adds field setting to the mod_python FieldStorage class"""
+  """Adds field setting to the mod_python FieldStorage class. The fields are
+  kept in an index by field name that is built on first access and updated
+  incrementally by L{__setitem__} and L{__delitem__}, so repeated lookups of
+  the same field do not rescan the field list. The values of a field are only
+  decoded when it is first read, so a field that can not be decoded only fails
+  the lookups of that field. The mod_python
+  C{list} remains the authoritative record of the fields; the index is rebuilt
+  whenever C{list} is replaced (e.g. by L{reset}) or its length is changed
+  behind this object's back.
+  """
   def __init__(self, req = None, keep_blank_values=0, strict_parsing=0, file_callback=None, field_callback=None, defaultCharset = None, initialValues = None):
+    self.__index = None
     if defaultCharset:
       self.defaultCharset = defaultCharset
     elif req:
@@ -93,28 +104,71 @@ class FieldStorage(mod_python.util.FieldStorage):
       for (key, value) in initialValues:
         self[key] = value
     self.original_list = self.list[:]
-  def __delitem__(self, key):
+  def __decodeItem(self, item):
+    if isinstance(item.file, FileType) or \
+           isinstance(getattr(item.file, 'file', None), FileType):
+      return item
+    else:
+      return self.decode(item.value)
+  def __getIndex(self):
+    """returns the C{(items, names)} pair where C{items} maps each field name
+    to its list of fields and C{names} holds the field names in the order
+    they were first seen. Rebuilds it if C{list} has changed."""
     if self.list is None:
       raise TypeError, "not indexable"
-    newList = []
-    for item in self.list:
-      if item.name != key:
-        newList.append(item)
-    self.list = newList
+    if self.__index is None or \
+       self.__indexedList is not self.list or \
+       self.__indexedLength != len(self.list):
+      items = {}
+      names = []
+      for item in self.list:
+        if item.name == "_charset_":
+          continue
+        if not items.has_key(item.name):
+          items[item.name] = []
+          names.append(item.name)
+        items[item.name].append(item)
+      self.__index = (items, names)
+      self.__decoded = {}
+      self.__indexedList = self.list
+      self.__indexedLength = len(self.list)
+    return self.__index
+  def __append(self, key, value):
+    """adds a string value to C{list} and the index."""
+    (items, names) = self.__getIndex()
+    field = Field(key, StringIO.StringIO(self.encode(value)), "text/plain",
+                  {}, None, {})
+    self.list.append(field)
+    if not items.has_key(key):
+      items[key] = []
+      names.append(key)
+    items[key].append(field)
+    if self.__decoded.has_key(key):
+      del self.__decoded[key]
+    self.__indexedLength = len(self.list)
+  def __delitem__(self, key):
+    (items, names) = self.__getIndex()
+    if key == "_charset_":
+      self.list = [item for item in self.list if item.name != key]
+    elif items.has_key(key):
+      self.list = [item for item in self.list if item.name != key]
+      del items[key]
+      names.remove(key)
+      if self.__decoded.has_key(key):
+        del self.__decoded[key]
+      self.__indexedList = self.list
+      self.__indexedLength = len(self.list)
   def __setitem__(self, key, value):
     """Dictionary style index setting."""
     del self[key]
     if isinstance(value, NoneType):
       return
     if isinstance(value, StringTypes):
-      file = StringIO.StringIO(self.encode(value))
-      self.list.append(Field(key, file, "text/plain", {}, None, {}))
+      self.__append(key, value)
     elif isinstance(value, ListType) or isinstance(value, TupleType):
       for v in value:
         if isinstance(v, StringTypes):
-          file = StringIO.StringIO(v)
-          self.list.append(Field(key, file, "text/plain", {},
-                                 None, {}))
+          self.__append(key, v)
     else:
       raise TypeError, "invalid type for set: strings or sequences of strings"
   def getCharset(self):
@@ -138,40 +192,32 @@ class FieldStorage(mod_python.util.FieldStorage):
     return value
   def __getitem__(self, key):
     """Dictionary style indexing."""
-    if self.list is None:
-        raise TypeError, "not indexable"
-    found = []
-    for item in self.list:
-        if item.name == "_charset_":
-          continue
-        elif item.name == key:
-            if isinstance(item.file, FileType) or \
-                   isinstance(getattr(item.file, 'file', None), FileType):
-                found.append(item)
-            else:
-                found.append(item.value)
-    decodedlist = []
-    for item in found:
-      if hasattr(item,"file"):
-        decodedlist.append(item)
-      else:
-        decodedlist.append(self.decode(item))
-    found = decodedlist
-    if not found:
+    (items, names) = self.__getIndex()
+    try:
+      found = self.__decoded[key]
+    except KeyError:
+      try:
+        fields = items[key]
+      except KeyError:
         raise KeyError, key
+      found = [self.__decodeItem(item) for item in fields]
+      self.__decoded[key] = found
     if len(found) == 1:
-        return found[0]
+      return found[0]
     else:
-        return found
-  def keys(self):
-      """Dictionary style keys() method."""
-      if self.list is None:
-          raise TypeError, "not indexable"
-      keys = []
+      return found[:]
+  def has_key(self, key):
+    """Dictionary style membership test."""
+    if key == "_charset_":
       for item in self.list:
-          if item.name == "_charset_": continue
-          if item.name not in keys: keys.append(item.name)
-      return keys
+        if item.name == key:
+          return True
+      return False
+    return self.__getIndex()[0].has_key(key)
+  __contains__ = has_key
+  def keys(self):
+    """Dictionary style keys() method."""
+    return self.__getIndex()[1][:]
   def __unicode__(self):
     result = u""
     for key in self.keys():
@@ -180,121 +226,22 @@ class FieldStorage(mod_python.util.FieldStorage):
   def reset(self):
     self.list = self.original_list[:]
 
-class ActionHandler(PyWebMvcObject):
+class ActionHandler(ActionHandlerBase):
   """A mod_python handler class for passing control to a PyWebMVC L{Action<core.Action>}"""
-  def __init__(self):
-    self.bundleManager = None
-  def getExtension(self, req):
-    """reads the path extension from the apache config file.
-
-    The option C{pyWebMvcExtension} is used to indicate the extension.
-    For example:
-
-    C{PythonOption pyWebMvcExtension ptz}
-
-    This should be set only once per server/virtual-server.
-    """
-    options = req.get_options()
-    if options.has_key("pyWebMvcExtension"):
-      return options["pyWebMvcExtension"]
-    else:
-      return None
-  def getSessionSecret(self, req):
-    """reads the session secret from the apache config file.
-
-    The option C{sessionSecret} is used to indicate the extension.
-    For example:
-
-    C{PythonOption sessionSecret foo}
-
-    This should be set only once per server/virtual-server.
-    """
-    options = req.get_options()
-    if options.has_key("sessionSecret"):
-      return options["sessionSecret"]
-    else:
-      return None
-  def getSessionTimeout(self, req):
-    """reads the session timeout from the apache config file.
-
-    The option C{sessionTimeout} is used to indicate the duration of
-    a session in seconds before it times out.
-    For example:
-
-    C{PythonOption sessionTimeout 1800}
-
-    Sets the timeout for 30 minutes.
-    This should be set only once per server/virtual-server.
-    """
-    options = req.get_options()
-    if options.has_key("sessionTimeout"):
-      return int(options["sessionTimeout"])
-    else:
-      return 1800
-  def authorized(self, req, mapping):
-    """Base implementation for performing authorization.
-    Should return C{True} if the access is authorized, C{False} otherwise.
-
-    Default implementation always returns C{True}.
-    """
-    return True
-  def redirectMaybe(self, req, mapping):
-    """Base implementation for performing application-state-based redirects.
-    Should return C{None} if there is no redirect for the request, otherwise an
-    L{ActionForward<core.ActionForward>} object.
-
-    Default implementation always returns C{None}.
-    """
-    return None
-  def checkAuthentication(self,req, mapping):
-    """Base implementation for requiring form-based authentication to access
-    a resource. This implementation checks the apache configuration for this
-    request to see if the C{pyWebMvcAuthentication} option is set to
-    C{required}. If required, the user will be redirected to the login action
-    as specified by the C{authenticationForward} option. Any form data will be
-    persisted and reused after authentication is successful. For example::
-
-      <LocationMatch "/secure/.*">
-        PythonOption authenticationForward login
-        PythonOption pyWebMvcAuthentication required
-      </LocationMatch>
-
-    Would require authentication for all urls beginning with C{/secure/} by
-    redirecting the user to the C{login} L{Action<core.Action>}. These options
-    may be set in any apache context.
-    """
-    options = req.get_options()
-    if options.has_key("pyWebMvcAuthentication") and \
-       options["pyWebMvcAuthentication"] == "required":
-      if not (req.session.has_key("authenticated") and
-              req.session["authenticated"]):
-        if mapping.hasAttribute("onAuthenticationFailure") and \
-           mapping.getAttribute("onAuthenticationFailure") == "fail" \
-           or not options.has_key("pyWebMvcAuthenForward"):
-          raise mod_apache.SERVER_RETURN, mod_apache.HTTP_FORBIDDEN
-        else:
-          req.session["authenticationForward"] = mapping.id
-          dict = {}
-          for key in req.form.keys():
-            dict[key] = req.form[key]
-          req.session["authenticationForm"] = dict
-          req.session.save()
-          loginMapping = mapping.config.getActionMapping(
-            options["pyWebMvcAuthenForward"])
-          sendRedirect(req, loginMapping.getUrl())
-      else:
-        saveSession = False
-        if req.session.has_key("authenticationForward"):
-          del req.session["authenticationForward"]
-          saveSession = True
-        if req.session.has_key("authenticationForm"):
-          savedForm = req.session["authenticationForm"]
-          del req.session["authenticationForm"]
-          for key in savedForm.keys():
-            req.form[key] = savedForm[key]
-          saveSession = True
-        if saveSession:
-          req.session.save()
+  OK = mod_apache.OK
+  HTTP_FORBIDDEN = mod_apache.HTTP_FORBIDDEN
+  HTTP_NOT_FOUND = mod_apache.HTTP_NOT_FOUND
+  HTTP_INTERNAL_SERVER_ERROR = mod_apache.HTTP_INTERNAL_SERVER_ERROR
+  def createForm(self, req):
+    return FieldStorage(req,1,False)
+  def createSession(self, req, secret, timeout, lock = True):
+    return Session(req,secret=secret,timeout=timeout,lock=int(lock))
+  def sendRedirect(self, req, path):
+    sendRedirect(req, path)
+  def abort(self, req, status):
+    raise mod_apache.SERVER_RETURN, status
+  def isServerReturn(self, e):
+    return isinstance(e, mod_apache.SERVER_RETURN)
   def __call__(self, req):
     """Default handler function for mod_python. Mostly this function
     passes control to L{handleRequest}."""
@@ -333,168 +280,9 @@ Profile results for %s
         return result
     finally:
       Logger.setRequest(None)
-  def getPath(self, req):
-    """Calculates the path suitable for finding an 
-    L{action mapping<core.ActionMapping>} in the configuration file.
-    """
-    path = req.uri
-    pyWebMvcExtension = self.getExtension(req)
-    if pyWebMvcExtension:
-      path = path[:-(len(pyWebMvcExtension)+1)]
-    return path
-  def getConfig(self, req):
-    """Retrieves the singleton L{configuration<core.PyWebMvcConfiguration>}
-    object for the application.
-    """
-    return getPyWebMvcConfig(req)
-  def getActionMapping(self, req):
-    """Retrieves the L{ActionMapping<core.ActionMapping>} for the given request
-    and raises L{KeyError} when not found."""
-    config = getPyWebMvcConfig(req)
-    path = self.getPath(req)
-    return config.getActionMappingByPath(path)
-  def handleExceptionMaybe(self, req, e):
-    """Local Forwards to an L{ErrorHandler<core.ErrorHandler>} for the
-    exception C{e} based on the handlers specified in the application
-    configuration. Returns C{None} when the exception is not handled.
-    """
-    if isinstance(e, mod_apache.SERVER_RETURN):
-      return None
-    config = getPyWebMvcConfig(req)
-    for handler in config.errorHandlers:
-      if handler.shouldHandle(req, e):
-        forward = handler.handle(req, e)
-        return self.doForward(forward, req, forward.mapping)
-    return None
-  def getCharset(self,req):
-    """This function returns the charset set as::
-      PythonOption pyWebMvcDefaultCharset <charset>
-    and defaults to utf-8 if not set.
-    TODO: charset negotiation.
-    """
-    options = req.get_options()
-    charset = "utf-8"
-    if options.has_key("pyWebMvcDefaultCharset"):
-      charset = options["pyWebMvcDefaultCharset"]
-    return charset
-  def prepareRequest(self, req):
-    """Initializes the mod_python request object to have the PyWebMVC-related
-    attributes set. Initializes the session on first access.
-    """
-    # this "if" check is necessary because if the Session has already been
-    # created by a derived class, mod_python will hang.
-    if hasattr(req, "alreadyPrepared"):
-      return
-    else:
-      req.alreadyPrepared = True
-
-    req.charset = self.getCharset(req)
-    req.form = FieldStorage(req,1,False)
-
-    options = req.get_options()
-    if options.has_key("pyWebMvcDebug") and options["pyWebMvcDebug"].lower() in ("true", "on", "yes"):
-      #str:ok
-      req.log_error("Form values = \n" + str(req.form))
-      
-    req.locale = self.getRequestLocale(req)
-    req.bundle = self.getBundle(req)
-    req.session = self.retrieveSession(req)
-  def retrieveSession(self, req):
-    sessionSecret = self.getSessionSecret(req)
-    sessionTimeout = self.getSessionTimeout(req)
-    session = Session(req,secret=sessionSecret,timeout=sessionTimeout)
-    session.save()
-    return session
-  def getRequestLocale(self, req):
-    config = getPyWebMvcConfig(req)
-    preferredLanguages = getPreferredLanguages(req)
-    locale = config.bundleManager.negotiateLocale(preferredLanguages)
-    return locale
-  def getBundle(self, req):
-    config = getPyWebMvcConfig(req)
-    return config.bundleManager.getBundle(req.locale)
   def cleanupRequest(self, req):
     """Cleans up the mod_python session. Also disassociates the request from the Logger"""
-    if hasattr(req, "session"):
-      req.session.unlock()
+    super(ActionHandler, self).cleanupRequest(req)
     Logger.setRequest(None)
-  def handleRequest(self, req):
-    """This is the main request handling routine for all actions. It implements
-    a strategy that sub classes should adhere to by overriding the individual
-    methods of the strategy instead of this handler."""
-    config = getPyWebMvcConfig(req)
-    try:
-      try:
-        self.prepareRequest(req)
-        actionMapping = self.getActionMapping(req)
-        self.checkAuthentication(req,actionMapping)
-        if not self.authorized(req, actionMapping):
-          return mod_apache.HTTP_FORBIDDEN
-        forward = self.redirectMaybe(req, actionMapping)
-        if not forward:
-          forward = config.globalForwards[actionMapping.id]
-        return self.doForward(forward, req, actionMapping)
-      except:
-        e = sys.exc_info()[1]
-        ret = self.handleExceptionMaybe(req, e)
-        if ret is None:
-          raise
-        else:
-          return ret
-    except ActionNotFoundException:
-      return mod_apache.HTTP_NOT_FOUND
-    except:
-      if isinstance(sys.exc_info()[1], mod_apache.SERVER_RETURN):
-        self.cleanupRequest(req)
-        raise
-      #no handler found or a non-compliant exception was raised.
-      #let mod_python exception handling take over
-      #TODO: change this to simple sets on the request and use req.parent to access
-      req.err_headers_out.add("EXCEPTION",traceback.format_exc())
-      req.err_headers_out.add("FORMDATA",getFormData(req).encode("utf-8"))
-      return mod_apache.HTTP_INTERNAL_SERVER_ERROR
-  def doForward(self, forward, req, actionMapping = None,
-                statusCode = mod_apache.OK):
-    """recursive function. This utility function forwards until all of the
-    server-side forwards have completed and returns the status code
-    specified."""
-    if forward:
-      if forward.redirect:
-        sendRedirect(req, forward.getUrl())
-      else:
-        nextForward = forward(req, actionMapping)
-        if hasattr(nextForward,"mapping") and nextForward.mapping:
-          #context change
-          actionMapping = nextForward.mapping
-          redirectForward = self.redirectMaybe(req,actionMapping)
-          if redirectForward:
-            nextForward = redirectForward
-        return self.doForward(nextForward, req, actionMapping, statusCode)
-    else:
-      return statusCode
 
 actionHandler = ActionHandler()
-
-def getFormData(req):
-  """utility function for printing out the contents of the form"""
-  data = ""
-  if hasattr(req, "form"):
-    for key in req.form.keys():
-      data += "%s=%s\n" % (key, req.form[key])
-  if not data:
-    data = "No form was posted."
-  return data
-
-def getPreferredLanguages(req):
-  """get the preferred languages of user according to the HTTP specification"""
-  langs = []
-  try:
-    if req.headers_in.has_key("Accept-Language"):
-      header = req.headers_in["Accept-Language"]
-      for lang in header.split(","):
-        #TODO: make sure that the order is enforced by the browser
-        lang = lang.split(";")[0]
-        langs.append(lang)
-  except:
-    pass
-  return langs
@@ -0,0 +1,345 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""A precompiled cache of the configuration file and the properties files it
+refers to, and the lightweight document the L{parser} builds the configuration
+from when it is not parsed with C{xml.dom.minidom}.
+
+Parsing a large configuration file with C{xml.dom.minidom} and reading its
+properties files is the slowest part of the first request served by each
+apache child. With the C{pyWebMvcConfigCache} option::
+
+  PythonOption pyWebMvcConfig /home/foo/myapp/config.xml
+  PythonOption pyWebMvcConfigCache /home/foo/myapp/config.cache
+
+the parsed document and properties are read from the cache file instead. The
+cache is keyed by the modification time, size and md5 digest of each file it
+was built from and is rebuilt by the first request after any of them changes
+(if the cache file can be written by the server). It can also be built ahead
+of time, e.g. when the application is installed::
+
+  python .../pywebmvc/framework/configcache.py /home/foo/myapp/config.xml \
+                                              /home/foo/myapp/config.cache
+
+The python classes named by the configuration are still imported and the
+configuration objects built on each load: the cache holds the parsed
+document, not the L{configuration<core.PyWebMvcConfiguration>} itself.
+
+The configuration file is parsed with C{xml.dom.minidom} by default. The
+C{sax} parser (see L{PARSERS}) reads it with C{xml.sax} into L{ConfigNode}s
+instead, which takes a fraction of the memory and time for large files::
+
+  PythonOption pyWebMvcConfigParser sax
+"""
+import os, sys, marshal, threading, StringIO
+import xml.sax
+from xml.sax.handler import ContentHandler, property_lexical_handler
+from xml.dom.minidom import parse
+from xml.dom import Node
+from util import PyWebMvcObject
+from properties import readprops
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+
+CACHE_VERSION = 1
+"""The version of the cache file format. Caches written with another version
+(or by another version of python) are ignored."""
+
+class ConfigNode(object):
+  """A node of a configuration document read from the cache. Provides the
+  part of the C{xml.dom.minidom} API used by the L{parser}. Nodes are plain
+  slotted objects: there are many of them and they are never reloaded."""
+  __slots__ = ("nodeType", "tagName", "nodeValue", "attributes", "childNodes")
+  def __init__(self, nodeType, tagName = None, nodeValue = None,
+               attributes = None, childNodes = None):
+    self.nodeType = nodeType
+    self.tagName = tagName
+    self.nodeValue = nodeValue
+    if attributes is None:
+      attributes = {}
+    self.attributes = attributes
+    if childNodes is None:
+      childNodes = []
+    self.childNodes = childNodes
+  def getFirstChild(self):
+    if self.childNodes:
+      return self.childNodes[0]
+    return None
+  firstChild = property(getFirstChild)
+  def getAttribute(self, name):
+    return self.attributes.get(name, "")
+  def hasAttribute(self, name):
+    return self.attributes.has_key(name)
+  def getElementsByTagName(self, tagName):
+    """returns the descendant elements named C{tagName} in document order."""
+    elements = []
+    self.collectElements(tagName, elements)
+    return elements
+  def collectElements(self, tagName, elements):
+    for child in self.childNodes:
+      if child.nodeType == Node.ELEMENT_NODE:
+        if child.tagName == tagName:
+          elements.append(child)
+        child.collectElements(tagName, elements)
+  def unlink(self):
+    pass
+
+class ConfigDocument(ConfigNode):
+  """The document node of a configuration read from the cache or with
+  C{xml.sax}. Keeps the elements of the document by tag name so that finding
+  the sections of the configuration does not walk the whole document."""
+  __slots__ = ("elementsByTagName",)
+  def __init__(self, childNodes = None):
+    super(ConfigDocument, self).__init__(Node.DOCUMENT_NODE,
+                                         childNodes = childNodes)
+    self.elementsByTagName = {}
+    for child in self.childNodes:
+      if child.nodeType == Node.ELEMENT_NODE:
+        self.addElements(child)
+  def addElement(self, element):
+    """adds C{element} to the tag index. Elements must be added in document
+    order."""
+    if not self.elementsByTagName.has_key(element.tagName):
+      self.elementsByTagName[element.tagName] = []
+    self.elementsByTagName[element.tagName].append(element)
+  def addElements(self, element):
+    """adds C{element} and its descendants to the tag index."""
+    self.addElement(element)
+    for child in element.childNodes:
+      if child.nodeType == Node.ELEMENT_NODE:
+        self.addElements(child)
+  def getElementsByTagName(self, tagName):
+    return self.elementsByTagName.get(tagName, [])[:]
+
+def nodeToTuple(node):
+  """converts a minidom node and its descendants to nested tuples that can be
+  written with C{marshal}."""
+  if node.nodeType in (Node.ELEMENT_NODE, Node.DOCUMENT_NODE):
+    attributes = {}
+    if node.nodeType == Node.ELEMENT_NODE:
+      for (name, value) in node.attributes.items():
+        attributes[name] = value
+      tagName = node.tagName
+    else:
+      tagName = None
+    children = tuple([nodeToTuple(child) for child in node.childNodes])
+    return (node.nodeType, tagName, None, attributes, children)
+  return (node.nodeType, None, node.nodeValue, None, None)
+
+def tupleToNode(data):
+  """converts the result of L{nodeToTuple} to L{ConfigNode}s."""
+  (nodeType, tagName, nodeValue, attributes, children) = data
+  if children:
+    children = [tupleToNode(child) for child in children]
+  if nodeType == Node.DOCUMENT_NODE:
+    return ConfigDocument(children)
+  return ConfigNode(nodeType, tagName, nodeValue, attributes, children)
+
+class ConfigDocumentBuilder(ContentHandler):
+  """A C{xml.sax} handler building a L{ConfigDocument} with the same nodes
+  C{xml.dom.minidom} would create: adjacent character data is merged into a
+  single text or CDATA node and comments and processing instructions are
+  kept."""
+  def __init__(self):
+    ContentHandler.__init__(self)
+    self.document = ConfigDocument()
+    self.stack = [self.document]
+    self.textType = Node.TEXT_NODE
+    self.textStart = False
+  def startElement(self, name, attrs):
+    attributes = {}
+    for (key, value) in attrs.items():
+      attributes[key] = value
+    element = ConfigNode(Node.ELEMENT_NODE, name, None, attributes)
+    self.stack[-1].childNodes.append(element)
+    self.stack.append(element)
+    self.document.addElement(element)
+  def endElement(self, name):
+    self.stack.pop()
+  def characters(self, content):
+    children = self.stack[-1].childNodes
+    if not self.textStart and children and \
+       children[-1].nodeType == self.textType:
+      children[-1].nodeValue += content
+    else:
+      children.append(ConfigNode(self.textType, nodeValue = content))
+    self.textStart = False
+  ignorableWhitespace = characters
+  def processingInstruction(self, target, data):
+    self.stack[-1].childNodes.append(
+      ConfigNode(Node.PROCESSING_INSTRUCTION_NODE, nodeValue = data))
+  # lexical handler
+  def comment(self, content):
+    self.stack[-1].childNodes.append(
+      ConfigNode(Node.COMMENT_NODE, nodeValue = content))
+  def startCDATA(self):
+    self.textType = Node.CDATA_SECTION_NODE
+    self.textStart = True
+  def endCDATA(self):
+    self.textType = Node.TEXT_NODE
+    self.textStart = True
+  def startDTD(self, name, publicId, systemId):
+    pass
+  def endDTD(self):
+    pass
+  def startEntity(self, name):
+    pass
+  def endEntity(self, name):
+    pass
+
+def parseMinidom(configFile):
+  """parses C{configFile} with C{xml.dom.minidom}."""
+  return parse(configFile)
+
+def parseSax(configFile):
+  """parses C{configFile} with C{xml.sax} into a L{ConfigDocument}."""
+  builder = ConfigDocumentBuilder()
+  reader = xml.sax.make_parser()
+  reader.setContentHandler(builder)
+  reader.setProperty(property_lexical_handler, builder)
+  reader.parse(configFile)
+  return builder.document
+
+PARSERS = {
+  "minidom" : parseMinidom,
+  "sax" : parseSax,
+}
+"""The functions available to parse the configuration file by name."""
+DEFAULT_PARSER = "minidom"
+
+def getFileInfo(path, data = None):
+  """returns the modification time, size and md5 digest of the file C{path}.
+  The digest is computed from C{data} if given."""
+  stat = os.stat(path)
+  if data is None:
+    file = open(path, "rb")
+    try:
+      data = file.read()
+    finally:
+      file.close()
+  return (stat.st_mtime, stat.st_size, md5(data).hexdigest())
+
+def isFileUnchanged(path, info):
+  """returns whether the file C{path} still matches the L{getFileInfo}
+  result C{info}. The digest is only computed when the modification time or
+  size differ."""
+  try:
+    stat = os.stat(path)
+  except OSError:
+    return False
+  (mtime, size, digest) = info
+  if stat.st_mtime == mtime and stat.st_size == size:
+    return True
+  return stat.st_size == size and getFileInfo(path)[2] == digest
+
+class ConfigSource(PyWebMvcObject):
+  """The parsed configuration file and properties files read while building
+  a configuration. C{document} is the document to build the configuration
+  from and C{files} maps the path of each file read to its L{getFileInfo}.
+  """
+  def __init__(self, configFile, document = None, properties = None,
+               files = None, cached = False):
+    self.configFile = configFile
+    self.document = document
+    if properties is None:
+      properties = {}
+    self.properties = properties
+    if files is None:
+      files = {}
+    self.files = files
+    self.cached = cached
+    self.documentTuple = None
+  def parse(self, parser = None):
+    """parses the configuration file with the L{parser<PARSERS>} named
+    C{parser}, by default L{DEFAULT_PARSER}."""
+    if not parser:
+      parser = DEFAULT_PARSER
+    if not PARSERS.has_key(parser):
+      raise ValueError, "unknown configuration parser '%s'" % parser
+    self.files[self.configFile] = getFileInfo(self.configFile)
+    self.document = PARSERS[parser](self.configFile)
+  def readProperties(self, path):
+    """returns the properties read from the file C{path} as a dictionary."""
+    if not self.properties.has_key(path):
+      file = open(path)
+      try:
+        data = file.read()
+      finally:
+        file.close()
+      self.files[path] = getFileInfo(path, data)
+      self.properties[path] = readprops(StringIO.StringIO(data))
+    return self.properties[path]
+  def getKey(self):
+    return (CACHE_VERSION, sys.version, os.path.abspath(self.configFile))
+  def isCurrent(self):
+    """returns whether none of the files the source was read from changed."""
+    for path in self.files.keys():
+      if not isFileUnchanged(path, self.files[path]):
+        return False
+    return True
+  def save(self, cacheFile):
+    """writes the source to C{cacheFile}. Must be called after the
+    configuration has been built so that the properties files have been
+    read."""
+    if self.documentTuple is None:
+      self.documentTuple = nodeToTuple(self.document)
+    data = marshal.dumps((self.getKey(), self.files, self.properties,
+                          self.documentTuple))
+    tempFile = "%s.%i.%s" % (cacheFile, os.getpid(),
+                             threading.currentThread().getName())
+    file = open(tempFile, "wb")
+    try:
+      file.write(data)
+    finally:
+      file.close()
+    os.rename(tempFile, cacheFile)
+
+def readConfigSource(configFile, parser = None):
+  """returns a L{ConfigSource} for C{configFile} parsed with the
+  L{parser<PARSERS>} named C{parser}."""
+  source = ConfigSource(configFile)
+  source.parse(parser)
+  return source
+
+def loadConfigSource(configFile, cacheFile):
+  """returns the L{ConfigSource} for C{configFile} saved in C{cacheFile}, or
+  C{None} if the cache does not exist, is for another file, version or python
+  or if any of the files it was built from changed."""
+  source = ConfigSource(configFile)
+  try:
+    file = open(cacheFile, "rb")
+    try:
+      data = file.read()
+    finally:
+      file.close()
+    (key, files, properties, documentTuple) = marshal.loads(data)
+  except (IOError, EOFError, ValueError, TypeError):
+    return None
+  if key != source.getKey():
+    return None
+  source.files = files
+  source.properties = properties
+  if not source.isCurrent():
+    return None
+  source.documentTuple = documentTuple
+  source.document = tupleToNode(documentTuple)
+  source.cached = True
+  return source
+
+def compileConfig(configFile, cacheFile):
+  """builds the configuration in C{configFile} and writes its cache to
+  C{cacheFile}."""
+  from parser import readConfigFromFile
+  readConfigFromFile(configFile, None, None, cacheFile)
+
+if __name__ == "__main__":
+  if len(sys.argv) != 3:
+    print "usage: %s config.xml config.cache" % sys.argv[0]
+    sys.exit(2)
+  #import through the package so the configuration classes are not loaded
+  #twice
+  from pywebmvc.framework.configcache import compileConfig
+  compileConfig(sys.argv[1], sys.argv[2])
@@ -3,12 +3,23 @@
 #  All Rights Reserved.
 #  END OF COPYRIGHT NOTICE 
 """The core classes for the framework."""
-import weakref, traceback
+import weakref, traceback, codecs, StringIO
 import htmlutil
-from util import PyWebMvcObject
+from util import PyWebMvcObject, SlottedObject, overrides
+from session import LazySession
 
 PYWEBMVC_INTERNAL_ENCODING="utf-8"
 
+PYWEBMVC_DEFAULT_BUFFER_SIZE=None
+"""The number of bytes of a page that are rendered before any of it is sent to
+the browser, unless the C{pyWebMvcBufferSize} option says otherwise. C{None}
+sends the complete page. See L{Page.getBufferSize}."""
+
+PYWEBMVC_STREAMING_BUFFER_SIZE=65536
+"""The buffer size of the pages which generate their content to be sent as it
+is rendered (see L{Page.isStreamed}), unless the C{pyWebMvcBufferSize} option
+says otherwise."""
+
 class PyWebMvcException(Exception):
   """Base Class Exception for all PyWebMVC exceptions"""
   def __init__(self, message):
@@ -201,10 +212,11 @@ class PageMapping(PyWebMvcObject):
     """Factory creation for the L{Page} instance."""
     return self.pythonClass()
 
-class ActionForward(PyWebMvcObject):
+class ActionForward(SlottedObject):
   """Generic forwarding base class that allows the L{Action} classes to
   abstractly send the user to another "place" without knowing what implements
   that "place"."""
+  __slots__ = ("requestHandler", "mapping", "redirect")
   def __init__(self,requestHandler,mapping=None,redirect=False):
     """Constructor takes the following parameters:
     - C{requestHandler} - a callable that accepts a request and a mapping and
@@ -243,6 +255,7 @@ class PathForward(ActionForward):
     - C{id} - The global id of this forward. Must be unique within the document.
     - C{path} - the server-relative path to the resource.
   """
+  __slots__ = ("id", "path")
   def __init__(self, id, path):
     super(PathForward, self).__init__(lambda req, mapping: None, redirect=True)
     self.id = id
@@ -269,6 +282,7 @@ class LocalForward(ActionForward):
       Will cause the browser to redirect to the next L{Action} instead of
       handling it on the server-side.
   """
+  __slots__ = ("configuration", "globalForwardKey")
   def __init__(self,configuration, globalForwardKey, redirect=False):
     """Constructor takes the following parameters:
     - C{configuration} - a reference to the application
@@ -291,6 +305,7 @@ class AppendQueryForward(ActionForward):
   AppendQueryForward constructor.  The AppendQueryForward always performs a
   redirect. 
   """
+  __slots__ = ("origForward", "queryString")
   def __init__(self, req, forward, urlQueryString):
     """Constructor takes the following parameters:
       - C{req} - the request object.
@@ -311,6 +326,7 @@ class ExternalForward(ActionForward):
   TODO: Add an xml configuration mechanism for defining these in the
   config file instead of in the code.
   """
+  __slots__ = ("url",)
   def __init__(self, requestHandler, url, mapping=None):
     self.url = url
     super(ExternalForward,self).__init__(requestHandler,mapping,True)
@@ -320,12 +336,13 @@ class ExternalForward(ActionForward):
     return None
 
 
-class ActionError(PyWebMvcObject):
+class ActionError(SlottedObject):
   """Associates an error message associated to a particular form field.
   """
   GLOBAL = "GLOBAL"
   """The C{GLOBAL} key is used to indicate that an error message is for the
   entire form instead of just one field."""
+  __slots__ = ("key", "message", "index")
   def __init__(self, key, message, index = None):
     """constructs an L{ActionError}. Constructor Parameters:
     - key - The form field id that is associated to the error message or
@@ -338,11 +355,26 @@ class ActionError(PyWebMvcObject):
     self.message = message
     self.index = index
 
-class ActionErrors(PyWebMvcObject):
+class ActionErrors(SlottedObject):
   """Container that holds L{ActionError}s and provides convenience methods for
-  retrieving the errors by field."""
+  retrieving the errors by field.
+
+  The errors are indexed by key and by key and index the first time they are
+  looked up, so L{hasError} and L{getErrors} do not scan every error. Errors
+  added later are indexed as they are added. Validation functions may still
+  set the C{index} of the errors they return before they are looked up."""
+  __slots__ = ("errors", "errorsByKey", "errorsByIndex")
   def __init__(self):
     self.errors = []
+    self.errorsByKey = None
+    self.errorsByIndex = None
+  def __getstate__(self):
+    """only the errors are pickled, the indexes are rebuilt when needed."""
+    return {"errors" : self.errors}
+  def __setstate__(self, state):
+    self.errors = state["errors"]
+    self.errorsByKey = None
+    self.errorsByIndex = None
   def __iter__(self):
     """iterator access for the all errors"""
     return self.errors.__iter__()
@@ -356,45 +388,59 @@ class ActionErrors(PyWebMvcObject):
   def removeAll(self):
     """remove the errors stored so far"""
     self.errors = []
+    self.errorsByKey = None
+    self.errorsByIndex = None
   def addAll(self,errors):
     """Add the errors from another L{ActionErrors} Collection"""
-    for error in errors:
-      self.add(error)
+    if isinstance(errors, ActionErrors):
+      added = errors.errors
+    else:
+      added = list(errors)
+    self.errors.extend(added)
+    if self.errorsByKey is not None:
+      for error in added:
+        self.indexError(error)
+  def indexError(self, error):
+    """adds C{error} to the lookup tables of L{hasError} and L{getErrors}."""
+    if self.errorsByKey.has_key(error.key):
+      self.errorsByKey[error.key].append(error)
+    else:
+      self.errorsByKey[error.key] = [error]
+    key = (error.key, error.index)
+    if self.errorsByIndex.has_key(key):
+      self.errorsByIndex[key].append(error)
+    else:
+      self.errorsByIndex[key] = [error]
+  def findErrors(self, key, index):
+    """returns the list of errors indexed for C{key} and C{index}, building
+    the index if needed. Must not be modified."""
+    if self.errorsByKey is None:
+      self.errorsByKey = {}
+      self.errorsByIndex = {}
+      for error in self.errors:
+        self.indexError(error)
+    if index is None:
+      return self.errorsByKey.get(key, ())
+    elif index < 0:
+      return self.errorsByIndex.get((key, None), ())
+    else:
+      return self.errorsByIndex.get((key, index), ())
   def hasError(self,key,index = None):
     """Test if an L{error<ActionError>} exists for the given key and index (if
     provided)"""
-    for error in self.errors:
-      if error.key == key:
-        if index is None:
-          return True
-        elif index < 0:
-          if error.index is None:
-            return True
-        else:
-          if error.index == index:
-            return True
-    return False
+    return len(self.findErrors(key, index)) != 0
   def add(self,error):
     """Add an L{error<ActionError>} to the container. Any number of errors can
     be added against any number of fields. They do not mask the other errors
     previously added against the same field/index.
     """
     self.errors.append(error)
+    if self.errorsByKey is not None:
+      self.indexError(error)
   def getErrors(self,key,index = None):
     """get the L{ActionError}s for the form field id (or L{GLOBAL<ActionError.GLOBAL>}) and index.
     """
-    errs = []
-    for error in self.errors:
-      if error.key == key:
-        if index is None:
-          errs.append(error)
-        elif index < 0:
-          if error.index is None:
-            errs.append(error)
-        else:
-          if error.index == index:
-            errs.append(error)
-    return errs
+    return list(self.findErrors(key, index))
 
 class Action(PyWebMvcObject):
   """Action base class. Each action must have a zero-argument constructor and
@@ -464,26 +510,98 @@ class Page(PyWebMvcObject):
             ("Cache-Control", "no-cache"),
             ("Pragma", "no-cache"),
            ]
+  def getBufferSize(self, req, mapping):
+    """returns the number of bytes of the page to render before they are sent
+    to the browser. A page that fits in the buffer is sent once it is complete,
+    with a C{Content-Length}, exactly as a page returned by L{render}. A larger
+    page is sent in chunks of about this size as it is rendered, so its
+    headers (see L{getHeaders}) are sent before the rest of the page has been
+    rendered. Returns C{None} to always send the complete page.
+    Uses C{pyWebMvcBufferSize} (optional) - The buffer size in bytes or 0 for
+    no limit. Defaults to L{PYWEBMVC_STREAMING_BUFFER_SIZE} for the pages
+    which are L{streamed<isStreamed>}, and L{PYWEBMVC_DEFAULT_BUFFER_SIZE}
+    for the others.
+    """
+    options = req.get_options()
+    if options and options.has_key("pyWebMvcBufferSize"):
+      return int(options["pyWebMvcBufferSize"]) or None
+    if self.isStreamed(req, mapping):
+      return PYWEBMVC_STREAMING_BUFFER_SIZE
+    return PYWEBMVC_DEFAULT_BUFFER_SIZE
+  def isStreamed(self, req, mapping):
+    """returns whether the page generates its content to be sent as it is
+    rendered, by overriding L{generate}."""
+    return overrides(self, Page, "generate")
   def render(self, req, mapping):
     """returns the content of the page"""
     return ""
+  def generate(self, req, mapping):
+    """returns an iterable of the encoded fragments making up the content of
+    the page. Pages that render large content should return a generator so
+    that it can be sent to the browser while it is rendered. The default
+    returns the result of L{render} as a single fragment."""
+    return [self.render(req, mapping)]
   def __call__(self,req, mapping):
     """does the mundane mod_python integration for sending a well-formed
     response."""
-    response = self.render(req, mapping)
+    fragments = iter(self.generate(req, mapping))
+    bufferSize = self.getBufferSize(req, mapping)
+    (response, complete) = readFragments(fragments, bufferSize)
     req.content_type = "%s; charset=%s" % (self.getContentType(req,mapping),
                                            self.getCharset(req,mapping))
-    responseLength = len(response)
-    req.set_content_length(responseLength)
+    if complete:
+      responseLength = len(response)
+      req.set_content_length(responseLength)
+    elif hasattr(req, "session") and isinstance(req.session, LazySession):
+      #the rest of the page may use the session, whose cookie can't be set
+      #once the headers have been sent
+      req.session.getSession()
     for header in self.getHeaders(req, mapping):
       req.headers_out[header[0]] = header[1]
     req.send_http_header()
-    try:
-      req.write(response)
-    except:
-      ###Don't raise exception if the client has closed the connection
-      pass
-    return None
+    while True:
+      try:
+        req.write(response)
+      except:
+        ###Don't raise exception if the client has closed the connection
+        return None
+      if complete:
+        return None
+      try:
+        (response, complete) = readFragments(fragments, bufferSize)
+      except:
+        #the response has started, it can't be replaced by an error page
+        req.log_error("pywebmvc: error rendering a partly sent page\n" +
+                      traceback.format_exc())
+        return None
+      if complete and not response:
+        return None
+
+def readFragments(fragments, size = None):
+  """reads from the iterator C{fragments} until at least C{size} bytes have
+  been read or it is exhausted. Returns C{(data, complete)} where C{complete}
+  is true if the iterator has been exhausted. Reads everything if C{size} is
+  C{None}."""
+  data = []
+  length = 0
+  for fragment in fragments:
+    data.append(fragment)
+    length += len(fragment)
+    if size and length >= size:
+      return ("".join(data), False)
+  return ("".join(data), True)
+
+def encodeFragments(fragments, charset):
+  """returns a generator of the C{fragments} encoded with C{charset}. A
+  single encoder is used for all the fragments so the result is the same as
+  encoding them once they are joined (e.g. only one byte order mark)."""
+  buffer = StringIO.StringIO()
+  writer = codecs.getwriter(charset)(buffer)
+  for fragment in fragments:
+    writer.write(fragment)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
 
 class XMLPage(Page):
   def getContentType(self, req, mapping):
@@ -557,11 +675,12 @@ class HtmlPage(Page):
     action mapping context. This will ensure that pages work correctly when
     server-side forwards are used. not usually overridden."""
     from formutils import href
-    from mod_python import apache as mod_apache
     try:
       host = req.hostname
-      if req.parsed_uri and req.parsed_uri[mod_apache.URI_PORT]:
-        host += ":"+req.parsed_uri[mod_apache.URI_PORT]
+      if req.parsed_uri:
+        from mod_python import apache as mod_apache
+        if req.parsed_uri[mod_apache.URI_PORT]:
+          host += ":"+req.parsed_uri[mod_apache.URI_PORT]
       return "%s://%s%s" % (
       ("http","https")[self.isHttps(req)],
       host,
@@ -592,18 +711,37 @@ class HtmlPage(Page):
   def getBodyEnd(self,req,mapping):
     """renders the body end. often overridden."""
     return "</body>"
+  def generateBody(self, req, mapping):
+    """returns an iterable of the fragments making up the body. The default
+    returns the body start and end. Override this instead of
+    L{getBodyStart} to send large content (e.g. the fragments of
+    L{pywebmvc.tools.table.Table.generateTable}) as it is rendered."""
+    return [self.getBodyStart(req,mapping), self.getBodyEnd(req,mapping)]
+  def isStreamed(self, req, mapping):
+    """returns whether the page overrides L{generateBody} or L{generate}."""
+    return overrides(self, HtmlPage, "generateBody") or \
+           overrides(self, HtmlPage, "generate")
+  def generateContent(self, req, mapping):
+    """puts the whole page together in the correct order as a generator of
+    unencoded fragments. This is not usually overridden"""
+    yield self.getPreamble(req,mapping)
+    yield self.getPageStart(req,mapping)
+    yield self.getHeaderStart(req,mapping)
+    yield self.getHeaderEnd(req,mapping)
+    for fragment in self.generateBody(req,mapping):
+      yield fragment
+    yield self.getPageEnd(req,mapping)
+  def generate(self, req, mapping):
+    """returns the encoded fragments of L{generateContent}. Subclasses
+    which override L{render} are sent as a single fragment instead."""
+    if overrides(self, HtmlPage, "render"):
+      return [self.render(req, mapping)]
+    return encodeFragments(self.generateContent(req, mapping),
+                           self.getCharset(req,mapping))
   def render(self,req, mapping):
-    """puts the whole page together in the correct order. This is not usually
-    overridden"""
-    page = "%s%s%s%s%s%s%s" % (
-                                self.getPreamble(req,mapping),
-                                self.getPageStart(req,mapping),
-                                self.getHeaderStart(req,mapping),
-                                self.getHeaderEnd(req,mapping),
-                                self.getBodyStart(req,mapping),
-                                self.getBodyEnd(req,mapping),
-                                self.getPageEnd(req,mapping)
-                              )
+    """returns the whole page as a single encoded string. Kept for
+    compatibility, pages are sent to the browser using L{generate}."""
+    page = "".join(self.generateContent(req, mapping))
     return page.encode(self.getCharset(req,mapping))
 
 class PyWebMvcConfiguration(PyWebMvcObject):
@@ -626,6 +764,7 @@ class PyWebMvcConfiguration(PyWebMvcObject):
     self.formMetadata = {}
     self.pageMappings = {}
     self.actionMappings = {}
+    self.actionMappingsByPath = {}
     self.globalForwards = {}
     self.errorHandlers = []
     self.metadataClasses = {
@@ -683,13 +822,15 @@ class PyWebMvcConfiguration(PyWebMvcObject):
     """Gets the L{PageMapping} with the specified id."""
     return self.pageMappings[id]
   def addActionMapping(self,actionMapping):
-    """Adds an L{ActionMapping} to the application."""
-    try:
-      mapping = self.getActionMappingByPath(actionMapping.path)
+    """Adds an L{ActionMapping} to the application. The mapping is indexed by
+    its path so that L{getActionMappingByPath} does not depend on the number
+    of actions configured. Changing the path of a mapping after it has been
+    added is not supported."""
+    if self.actionMappingsByPath.has_key(actionMapping.path):
+      mapping = self.actionMappingsByPath[actionMapping.path]
       raise PyWebMvcInvalidConfigurationException("path '%s' on action '%s' is already defined for mapping '%s'" % (mapping.path, actionMapping.id, mapping.id))
-    except ActionNotFoundException:
-      pass
     self.actionMappings[actionMapping.id] = actionMapping
+    self.actionMappingsByPath[actionMapping.path] = actionMapping
     self.addGlobalForward(actionMapping.id,ActionForward(actionMapping.createInstance(), actionMapping))
   def getActionMappings(self):
     """Returns a list of all the L{ActionMappings<ActionMapping>}
@@ -710,10 +851,10 @@ class PyWebMvcConfiguration(PyWebMvcObject):
   def getActionMappingByPath(self,path):
     """Gets the L{ActionMapping} having the specified C{path} (prefix
     and extension removed)."""
-    for actionMapping in self.actionMappings.values():
-      if actionMapping.path == path:
-        return actionMapping
-    raise ActionNotFoundException(path)
+    try:
+      return self.actionMappingsByPath[path]
+    except KeyError:
+      raise ActionNotFoundException(path)
   def setMetadataClass(self, type, constructor):
     assert type in ("field", "fieldgroup", "form")
     self.metadataClasses[type] = constructor
@@ -0,0 +1,374 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""The request lifecycle shared by the mod_python and WSGI integrations of
+pywebmvc."""
+import sys, traceback
+from util import PyWebMvcObject
+from core import ActionNotFoundException, Page
+from parser import getPyWebMvcConfig
+from session import LazySession
+from instrument import instrument, configureInstrument
+
+class ActionHandlerBase(PyWebMvcObject):
+  """Passes control for a request to a PyWebMVC L{Action<core.Action>}. This
+  class implements the request lifecycle independently of the server the
+  application runs in. The L{mod_python<apache.ActionHandler>} and
+  L{WSGI<wsgi.WsgiActionHandler>} handlers provide the parts that depend on
+  the server by implementing L{createForm}, L{createSession},
+  L{sendRedirect}, L{abort} and L{isServerReturn}.
+
+  The request object passed to the handler must provide the part of the
+  mod_python request API used by the framework: C{uri}, C{get_options()},
+  C{headers_in}, C{headers_out}, C{err_headers_out}, C{content_type},
+  C{set_content_length()}, C{send_http_header()}, C{write()} and
+  C{log_error()}.
+  """
+  OK = 0
+  HTTP_FORBIDDEN = 403
+  HTTP_NOT_FOUND = 404
+  HTTP_INTERNAL_SERVER_ERROR = 500
+  def __init__(self):
+    self.bundleManager = None
+  def createForm(self, req):
+    """returns the form data of the request as a
+    L{FieldStorage<apache.FieldStorage>}. Must be overridden."""
+    raise NotImplementedError()
+  def createSession(self, req, secret, timeout, lock = True):
+    """returns the session of the request, creating a new one if the browser
+    does not have one. The session is locked until the end of the request if
+    C{lock} is true. Must be overridden."""
+    raise NotImplementedError()
+  def sendRedirect(self, req, path):
+    """redirects the browser to C{path} and ends the request. Must be
+    overridden."""
+    raise NotImplementedError()
+  def abort(self, req, status):
+    """ends the request with the http status code C{status}. Must be
+    overridden."""
+    raise NotImplementedError()
+  def isServerReturn(self, e):
+    """returns whether C{e} was raised to end the request (see L{abort}) and
+    should be passed on to the server. Must be overridden."""
+    raise NotImplementedError()
+  def getExtension(self, req):
+    """reads the path extension from the apache config file.
+
+    The option C{pyWebMvcExtension} is used to indicate the extension.
+    For example:
+
+    C{PythonOption pyWebMvcExtension ptz}
+
+    This should be set only once per server/virtual-server.
+    """
+    options = req.get_options()
+    if options.has_key("pyWebMvcExtension"):
+      return options["pyWebMvcExtension"]
+    else:
+      return None
+  def getSessionSecret(self, req):
+    """reads the session secret from the apache config file.
+
+    The option C{sessionSecret} is used to indicate the extension.
+    For example:
+
+    C{PythonOption sessionSecret foo}
+
+    This should be set only once per server/virtual-server.
+    """
+    options = req.get_options()
+    if options.has_key("sessionSecret"):
+      return options["sessionSecret"]
+    else:
+      return None
+  def getSessionTimeout(self, req):
+    """reads the session timeout from the apache config file.
+
+    The option C{sessionTimeout} is used to indicate the duration of
+    a session in seconds before it times out.
+    For example:
+
+    C{PythonOption sessionTimeout 1800}
+
+    Sets the timeout for 30 minutes.
+    This should be set only once per server/virtual-server.
+    """
+    options = req.get_options()
+    if options.has_key("sessionTimeout"):
+      return int(options["sessionTimeout"])
+    else:
+      return 1800
+  def authorized(self, req, mapping):
+    """Base implementation for performing authorization.
+    Should return C{True} if the access is authorized, C{False} otherwise.
+
+    Default implementation always returns C{True}.
+    """
+    return True
+  def redirectMaybe(self, req, mapping):
+    """Base implementation for performing application-state-based redirects.
+    Should return C{None} if there is no redirect for the request, otherwise an
+    L{ActionForward<core.ActionForward>} object.
+
+    Default implementation always returns C{None}.
+    """
+    return None
+  def checkAuthentication(self,req, mapping):
+    """Base implementation for requiring form-based authentication to access
+    a resource. This implementation checks the apache configuration for this
+    request to see if the C{pyWebMvcAuthentication} option is set to
+    C{required}. If required, the user will be redirected to the login action
+    as specified by the C{authenticationForward} option. Any form data will be
+    persisted and reused after authentication is successful. For example::
+
+      <LocationMatch "/secure/.*">
+        PythonOption authenticationForward login
+        PythonOption pyWebMvcAuthentication required
+      </LocationMatch>
+
+    Would require authentication for all urls beginning with C{/secure/} by
+    redirecting the user to the C{login} L{Action<core.Action>}. These options
+    may be set in any apache context.
+    """
+    options = req.get_options()
+    if options.has_key("pyWebMvcAuthentication") and \
+       options["pyWebMvcAuthentication"] == "required":
+      if not (req.session.has_key("authenticated") and
+              req.session["authenticated"]):
+        if mapping.hasAttribute("onAuthenticationFailure") and \
+           mapping.getAttribute("onAuthenticationFailure") == "fail" \
+           or not options.has_key("pyWebMvcAuthenForward"):
+          self.abort(req, self.HTTP_FORBIDDEN)
+        else:
+          req.session["authenticationForward"] = mapping.id
+          dict = {}
+          for key in req.form.keys():
+            dict[key] = req.form[key]
+          req.session["authenticationForm"] = dict
+          req.session.save()
+          loginMapping = mapping.config.getActionMapping(
+            options["pyWebMvcAuthenForward"])
+          self.sendRedirect(req, loginMapping.getUrl())
+      else:
+        saveSession = False
+        if req.session.has_key("authenticationForward"):
+          del req.session["authenticationForward"]
+          saveSession = True
+        if req.session.has_key("authenticationForm"):
+          savedForm = req.session["authenticationForm"]
+          del req.session["authenticationForm"]
+          for key in savedForm.keys():
+            req.form[key] = savedForm[key]
+          saveSession = True
+        if saveSession:
+          req.session.save()
+  def getPath(self, req):
+    """Calculates the path suitable for finding an
+    L{action mapping<core.ActionMapping>} in the configuration file.
+    """
+    path = req.uri
+    pyWebMvcExtension = self.getExtension(req)
+    if pyWebMvcExtension:
+      path = path[:-(len(pyWebMvcExtension)+1)]
+    return path
+  def getConfig(self, req):
+    """Retrieves the singleton L{configuration<core.PyWebMvcConfiguration>}
+    object for the application.
+    """
+    return getPyWebMvcConfig(req)
+  def getActionMapping(self, req):
+    """Retrieves the L{ActionMapping<core.ActionMapping>} for the given request
+    and raises L{KeyError} when not found."""
+    config = getPyWebMvcConfig(req)
+    path = self.getPath(req)
+    return config.getActionMappingByPath(path)
+  def handleExceptionMaybe(self, req, e):
+    """Local Forwards to an L{ErrorHandler<core.ErrorHandler>} for the
+    exception C{e} based on the handlers specified in the application
+    configuration. Returns C{None} when the exception is not handled.
+    """
+    if self.isServerReturn(e):
+      return None
+    config = getPyWebMvcConfig(req)
+    for handler in config.errorHandlers:
+      if handler.shouldHandle(req, e):
+        forward = handler.handle(req, e)
+        return self.doForward(forward, req, forward.mapping)
+    return None
+  def getCharset(self,req):
+    """This function returns the charset set as::
+      PythonOption pyWebMvcDefaultCharset <charset>
+    and defaults to utf-8 if not set.
+    TODO: charset negotiation.
+    """
+    options = req.get_options()
+    charset = "utf-8"
+    if options.has_key("pyWebMvcDefaultCharset"):
+      charset = options["pyWebMvcDefaultCharset"]
+    return charset
+  def prepareRequest(self, req):
+    """Initializes the request object to have the PyWebMVC-related
+    attributes set. Initializes the session on first access.
+    """
+    # this "if" check is necessary because if the Session has already been
+    # created by a derived class, mod_python will hang.
+    if hasattr(req, "alreadyPrepared"):
+      return
+    else:
+      req.alreadyPrepared = True
+
+    req.charset = self.getCharset(req)
+    span = instrument.start("form.parse")
+    try:
+      req.form = self.createForm(req)
+    finally:
+      span.stop()
+
+    options = req.get_options()
+    if options.has_key("pyWebMvcDebug") and options["pyWebMvcDebug"].lower() in ("true", "on", "yes"):
+      #str:ok
+      req.log_error("Form values = \n" + str(req.form))
+
+    req.locale = self.getRequestLocale(req)
+    req.bundle = self.getBundle(req)
+    req.session = self.retrieveSession(req)
+  def retrieveSession(self, req):
+    """returns a L{LazySession<session.LazySession>} that retrieves the session
+    with L{createSession} when it is first used. The session is written back
+    by L{cleanupRequest} if it was modified."""
+    sessionSecret = self.getSessionSecret(req)
+    sessionTimeout = self.getSessionTimeout(req)
+    def createSession(lock):
+      span = instrument.start("session.retrieve")
+      try:
+        return self.createSession(req, sessionSecret, sessionTimeout, lock)
+      finally:
+        span.stop()
+    return LazySession(createSession)
+  def configureSession(self, req, mapping):
+    """Turns off the locking of the session for an action mapping with the
+    C{sessionLocking} attribute set to C{off}. Such actions can run at the
+    same time as other requests from the same browser, so they should only
+    read the session or accept that concurrent changes may be lost. For
+    example::
+
+      <action id="status" path="/status" python-class="app.actions::Status">
+        <attribute name="sessionLocking" value="off"/>
+      </action>
+    """
+    if mapping.hasAttribute("sessionLocking") and \
+       mapping.getAttribute("sessionLocking").lower() in ("off", "false", "no"):
+      if isinstance(req.session, LazySession):
+        req.session.setLocking(False)
+  def getRequestLocale(self, req):
+    config = getPyWebMvcConfig(req)
+    preferredLanguages = getPreferredLanguages(req)
+    locale = config.bundleManager.negotiateLocale(preferredLanguages)
+    return locale
+  def getBundle(self, req):
+    config = getPyWebMvcConfig(req)
+    return config.bundleManager.getBundle(req.locale)
+  def cleanupRequest(self, req):
+    """Writes back the session if it was modified and unlocks it."""
+    if hasattr(req, "session"):
+      if isinstance(req.session, LazySession):
+        req.session.commit()
+      req.session.unlock()
+  def handleRequest(self, req):
+    """This is the main request handling routine for all actions. It implements
+    a strategy that sub classes should adhere to by overriding the individual
+    methods of the strategy instead of this handler. The request is timed by
+    the L{instrument<instrument.instrument>} when it is sampled."""
+    configureInstrument(req.get_options())
+    instrument.begin(req.uri)
+    try:
+      return self.handleInstrumentedRequest(req)
+    finally:
+      instrument.end()
+  def handleInstrumentedRequest(self, req):
+    """handles the request for L{handleRequest} once it is being timed."""
+    config = getPyWebMvcConfig(req)
+    try:
+      try:
+        self.prepareRequest(req)
+        actionMapping = self.getActionMapping(req)
+        self.configureSession(req, actionMapping)
+        self.checkAuthentication(req,actionMapping)
+        if not self.authorized(req, actionMapping):
+          return self.HTTP_FORBIDDEN
+        forward = self.redirectMaybe(req, actionMapping)
+        if not forward:
+          forward = config.globalForwards[actionMapping.id]
+        return self.doForward(forward, req, actionMapping)
+      except:
+        e = sys.exc_info()[1]
+        ret = self.handleExceptionMaybe(req, e)
+        if ret is None:
+          raise
+        else:
+          return ret
+    except ActionNotFoundException:
+      return self.HTTP_NOT_FOUND
+    except:
+      if self.isServerReturn(sys.exc_info()[1]):
+        self.cleanupRequest(req)
+        raise
+      #no handler found or a non-compliant exception was raised.
+      #let the server's exception handling take over
+      #TODO: change this to simple sets on the request and use req.parent to access
+      req.err_headers_out.add("EXCEPTION",traceback.format_exc())
+      req.err_headers_out.add("FORMDATA",getFormData(req).encode("utf-8"))
+      return self.HTTP_INTERNAL_SERVER_ERROR
+  def doForward(self, forward, req, actionMapping = None,
+                statusCode = None):
+    """recursive function. This utility function forwards until all of the
+    server-side forwards have completed and returns the status code
+    specified (L{OK} by default)."""
+    if statusCode is None:
+      statusCode = self.OK
+    if forward:
+      if forward.redirect:
+        self.sendRedirect(req, forward.getUrl())
+      else:
+        if isinstance(forward.requestHandler, Page):
+          span = instrument.start("page.render")
+        else:
+          span = instrument.start("action")
+        try:
+          nextForward = forward(req, actionMapping)
+        finally:
+          span.stop()
+        if hasattr(nextForward,"mapping") and nextForward.mapping:
+          #context change
+          actionMapping = nextForward.mapping
+          redirectForward = self.redirectMaybe(req,actionMapping)
+          if redirectForward:
+            nextForward = redirectForward
+        return self.doForward(nextForward, req, actionMapping, statusCode)
+    else:
+      return statusCode
+
+def getFormData(req):
+  """utility function for printing out the contents of the form"""
+  data = ""
+  if hasattr(req, "form"):
+    for key in req.form.keys():
+      data += "%s=%s\n" % (key, req.form[key])
+  if not data:
+    data = "No form was posted."
+  return data
+
+def getPreferredLanguages(req):
+  """get the preferred languages of user according to the HTTP specification"""
+  langs = []
+  try:
+    if req.headers_in.has_key("Accept-Language"):
+      header = req.headers_in["Accept-Language"]
+      for lang in header.split(","):
+        #TODO: make sure that the order is enforced by the browser
+        lang = lang.split(";")[0]
+        langs.append(lang)
+  except:
+    pass
+  return langs
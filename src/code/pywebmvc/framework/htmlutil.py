@@ -26,6 +26,25 @@ def truncateText(html, size):
   else:
     return html
 
+class HtmlBuffer(object):
+  """Collects the fragments of markup written by a renderer and joins them
+  once, when the markup is complete, instead of concatenating each fragment
+  to the markup written so far, which copies the whole markup each time for
+  unicode strings."""
+  __slots__ = ("fragments", "write")
+  def __init__(self, *fragments):
+    self.fragments = list(fragments)
+    self.write = self.fragments.append
+  def writeAll(self, fragments):
+    """writes each of the C{fragments} in turn."""
+    self.fragments.extend(fragments)
+  def getvalue(self):
+    """returns the markup written."""
+    return "".join(self.fragments)
+  def encode(self, charset):
+    """returns the markup written, encoded with C{charset}."""
+    return self.getvalue().encode(charset)
+
 def mapToListOfTuples(map):
   l = []
   for key in map.keys():
@@ -41,16 +60,7 @@ def getParameterString(params):
   """Creates a url query string from a list of tuples or a dictionary::
 
   [(name, value), ...] or { name : value, name : [value1, value2, ...], ... }"""
-  paramStr = ""
   if hasattr(params, "keys"):
     params = mapToListOfTuples(params)
-  first = True
-  for (key, value) in params:
-    if first:
-      first = False
-    else:
-      paramStr += "&"
-    paramStr += escapeUrl(key)
-    paramStr += "="
-    paramStr += escapeUrl(value)
-  return paramStr
+  return "&".join([escapeUrl(key) + "=" + escapeUrl(value)
+                   for (key, value) in params])
@@ -0,0 +1,264 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Timing of the request lifecycle that is cheap enough to leave on in
+production.
+
+The framework times named spans of each request: C{config.load},
+C{form.parse}, C{session.retrieve}, C{action} and C{page.render} (one for
+each forward followed by L{doForward<handler.ActionHandlerBase.doForward>}),
+C{validate} and C{bundle.lookup}, as well as the whole C{request}. The time
+and number of the spans of each name are added up over the request and
+handed to the L{sinks<Sink>} of the L{Instrument} when it ends. A fraction of
+the requests can be sampled, the others only pay for a thread local lookup
+per span. Applications can time their own spans the same way::
+
+  from pywebmvc.framework.instrument import instrument
+  span = instrument.start("search")
+  try:
+    results = home.find(criteria)
+  finally:
+    span.stop()
+
+The instrument is configured with the following options, given with
+C{PythonOption} or to the L{WsgiApplication<wsgi.WsgiApplication>}::
+
+  PythonOption pyWebMvcInstrument "histogram log statsd:/tmp/pywebmvc.stats"
+  PythonOption pyWebMvcInstrumentSampleRate 0.05
+
+C{pyWebMvcInstrument} lists the L{SINKS} to report to, C{statsd} taking the
+path of the file to append to. Nothing is timed when it is not set.
+C{pyWebMvcInstrumentSampleRate} is the fraction of the requests timed,
+C{1} by default.
+"""
+import sys, time, random, threading
+from util import PyWebMvcObject
+
+class NullSpan(PyWebMvcObject):
+  """The span returned when the current request is not sampled."""
+  __slots__ = ()
+  def stop(self):
+    pass
+
+NULL_SPAN = NullSpan()
+
+class Span(PyWebMvcObject):
+  """A span being timed. L{stop} adds its time to C{timings}."""
+  __slots__ = ("timings", "name", "started")
+  def __init__(self, timings, name):
+    self.timings = timings
+    self.name = name
+    self.started = time.time()
+  def stop(self):
+    elapsed = time.time() - self.started
+    timing = self.timings.get(self.name)
+    if timing is None:
+      self.timings[self.name] = [1, elapsed]
+    else:
+      timing[0] += 1
+      timing[1] += elapsed
+
+class RequestState(threading.local):
+  """The request being timed by the current thread, if any."""
+  name = None
+  started = None
+  timings = None
+
+class Instrument(PyWebMvcObject):
+  """Times the spans of the requests handled by the current thread and
+  reports them to C{sinks}. C{sampleRate} is the fraction of the requests
+  that are timed. Spans started outside of L{begin} and L{end} are not
+  timed."""
+  def __init__(self, sinks = None, sampleRate = 1.0):
+    if sinks is None:
+      sinks = []
+    self.sinks = sinks
+    self.sampleRate = sampleRate
+    self.local = RequestState()
+    self.configured = False
+  def addSink(self, sink):
+    self.sinks.append(sink)
+  def begin(self, name):
+    """starts timing the request C{name}, usually its path, if it is
+    sampled."""
+    if self.sinks and (self.sampleRate >= 1 or
+                       random.random() < self.sampleRate):
+      self.local.name = name
+      self.local.started = time.time()
+      self.local.timings = {}
+    else:
+      self.local.timings = None
+  def end(self):
+    """ends the current request and reports its spans to the sinks."""
+    timings = self.local.timings
+    if timings is None:
+      return
+    self.local.timings = None
+    timings["request"] = [1, time.time() - self.local.started]
+    for sink in self.sinks:
+      sink.report(self.local.name, timings, self.sampleRate)
+  def isSampled(self):
+    """returns whether the current request is being timed."""
+    return self.local.timings is not None
+  def start(self, name):
+    """returns a L{Span} named C{name} that is timed until its C{stop}
+    method is called."""
+    timings = self.local.timings
+    if timings is None:
+      return NULL_SPAN
+    return Span(timings, name)
+
+class Sink(PyWebMvcObject):
+  """Receives the timings of the sampled requests."""
+  def report(self, name, timings, sampleRate):
+    """called at the end of the request C{name}. C{timings} maps the name
+    of each span to the list C{[count, seconds]} of the number of spans and
+    their total time. Must be overridden."""
+    raise NotImplementedError()
+
+HISTOGRAM_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""The upper bounds in seconds of the buckets of a L{HistogramSink}."""
+
+class HistogramSink(Sink):
+  """Keeps a histogram in memory of the time taken by the spans of each name
+  over the requests."""
+  def __init__(self, bounds = HISTOGRAM_BOUNDS):
+    self.bounds = bounds
+    self.histograms = {}
+    self.lock = threading.Lock()
+  def report(self, name, timings, sampleRate):
+    self.lock.acquire()
+    try:
+      for (span, (count, seconds)) in timings.iteritems():
+        histogram = self.histograms.get(span)
+        if histogram is None:
+          histogram = self.histograms[span] = \
+            [0, 0, 0.0, 0.0, [0] * (len(self.bounds) + 1)]
+        histogram[0] += 1
+        histogram[1] += count
+        histogram[2] += seconds
+        histogram[3] = max(histogram[3], seconds)
+        histogram[4][self.getBucket(seconds)] += 1
+    finally:
+      self.lock.release()
+  def getBucket(self, seconds):
+    for i in range(len(self.bounds)):
+      if seconds <= self.bounds[i]:
+        return i
+    return len(self.bounds)
+  def getNames(self):
+    names = self.histograms.keys()
+    names.sort()
+    return names
+  def getStats(self, span):
+    """returns a dictionary of the statistics of the spans named C{span}:
+    the number of C{requests} they were timed in, their C{count}, the
+    C{total}, C{mean} and C{max} seconds taken per request and the bucket
+    C{counts}."""
+    self.lock.acquire()
+    try:
+      (requests, count, total, maximum, counts) = self.histograms[span]
+      return {"requests" : requests, "count" : count, "total" : total,
+              "mean" : total / requests, "max" : maximum,
+              "counts" : counts[:]}
+    finally:
+      self.lock.release()
+  def getPercentile(self, span, percent):
+    """returns the upper bound of the bucket holding the C{percent}th
+    percentile of the seconds taken by the spans named C{span} per request,
+    or their maximum if it is past the last bound."""
+    stats = self.getStats(span)
+    rank = stats["requests"] * percent / 100.0
+    seen = 0
+    for i in range(len(self.bounds)):
+      seen += stats["counts"][i]
+      if seen >= rank:
+        return min(self.bounds[i], stats["max"])
+    return stats["max"]
+  def reset(self):
+    self.lock.acquire()
+    try:
+      self.histograms = {}
+    finally:
+      self.lock.release()
+
+def formatTimings(name, timings):
+  """returns a line describing the C{timings} of the request C{name}."""
+  spans = timings.keys()
+  spans.sort()
+  return "%s %s" % (name, " ".join(
+    ["%s=%.3fms/%i" % (span, timings[span][1] * 1000, timings[span][0])
+     for span in spans]))
+
+class LogSink(Sink):
+  """Writes a line with the timings of each request with C{log}, by default
+  to C{sys.stderr}, which goes to the error log under apache."""
+  def __init__(self, log = None):
+    self.log = log
+  def report(self, name, timings, sampleRate):
+    line = "pywebmvc timing " + formatTimings(name, timings)
+    if self.log is None:
+      sys.stderr.write(line + "\n")
+    else:
+      self.log(line)
+
+class StatsdFileSink(Sink):
+  """Appends the timings of each request to the file C{path} in the statsd
+  format, e.g. C{pywebmvc.action:12.500|ms|@0.1}, for a collector to send on.
+  The lines of a request are written at once."""
+  def __init__(self, path, prefix = "pywebmvc"):
+    self.path = path
+    self.prefix = prefix
+  def report(self, name, timings, sampleRate):
+    if sampleRate < 1:
+      rate = "|@%g" % sampleRate
+    else:
+      rate = ""
+    lines = ["%s.%s:%.3f|ms%s\n" % (self.prefix, span, seconds * 1000, rate)
+             for (span, (count, seconds)) in timings.iteritems()]
+    try:
+      file = open(self.path, "a")
+      try:
+        file.write("".join(lines))
+      finally:
+        file.close()
+    except IOError:
+      #timings are not worth failing the request for
+      pass
+
+SINKS = {
+  "histogram" : HistogramSink,
+  "log" : LogSink,
+  "statsd" : StatsdFileSink,
+}
+"""The sinks that can be named by the C{pyWebMvcInstrument} option. The text
+after a C{:} is passed to the constructor."""
+
+def createSinks(spec):
+  """returns the sinks listed in C{spec}, separated by spaces."""
+  sinks = []
+  for name in spec.split():
+    arguments = ()
+    if ":" in name:
+      (name, argument) = name.split(":", 1)
+      arguments = (argument,)
+    if not SINKS.has_key(name):
+      raise ValueError, "unknown instrument sink '%s'" % name
+    sinks.append(SINKS[name](*arguments))
+  return sinks
+
+instrument = Instrument()
+"""The instrument the framework times requests with."""
+
+def configureInstrument(options):
+  """configures L{instrument} from the C{pyWebMvcInstrument} and
+  C{pyWebMvcInstrumentSampleRate} C{options} the first time it is called."""
+  if instrument.configured:
+    return
+  if options.has_key("pyWebMvcInstrument"):
+    instrument.sinks = createSinks(options["pyWebMvcInstrument"])
+  if options.has_key("pyWebMvcInstrumentSampleRate"):
+    instrument.sampleRate = float(options["pyWebMvcInstrumentSampleRate"])
+  instrument.configured = True
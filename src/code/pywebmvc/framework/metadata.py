@@ -8,12 +8,24 @@
 import re, weakref, types
 from core import ActionErrors, PyWebMvcException, PyWebMvcInvalidConfigurationException
 from util import PyWebMvcObject
+from validate import compileValidation
 from weakref import ReferenceType
 
 DISPLAY_READONLY = "readonly"
 DISPLAY_NORMAL = "normal"
 DISPLAY_HIDDEN = "hidden"
 
+rendererGeneration = 0
+"""Incremented by L{renderersChanged} whenever a renderer is set on metadata
+or a group's C{metadataChanged()} is called, e.g. when metadata is added to
+it. Renderers resolved through the metadata are looked up again and render
+plans are compiled again when it changes."""
+
+def renderersChanged():
+  """invalidates the renderers resolved through the metadata of every form."""
+  global rendererGeneration
+  rendererGeneration += 1
+
 class WebBoolean(PyWebMvcObject):
   """A boolean object which understands the standard boolean textual
   representations. The following values are interpreted (case-insensitive) as
@@ -352,6 +364,7 @@ class MetadataBase(PyWebMvcObject):
     """set the renderer for C{type} in this context, overriding the default in
     the factory"""
     self.renderers[type] = renderer
+    renderersChanged()
   def getRenderer(self, type):
     """get the renderer for C{type} in this metadata context."""
     return self.renderers[type]
@@ -504,6 +517,8 @@ class MetadataGroup(MetadataBase):
     self.metadataByProperty = {}
     self.order = []
     self.metadataClasses = {}
+    self.descendants = {}
+    self.fieldNames = None
   def setMetadataClass(self, type, constructor):
     assert type in ("field", "fieldgroup", "form")
     self.metadataClasses[type] = constructor
@@ -523,6 +538,29 @@ class MetadataGroup(MetadataBase):
     self.metadataByName[metadata.id] = metadata
     if metadata.property:
       self.metadataByProperty[metadata.property] = metadata
+    self.indexMetadata(metadata)
+  def indexMetadata(self, metadata):
+    """adds C{metadata} and its descendants to the index of descendants of
+    this group and of each of its ancestors. The metadata directly in a group
+    takes precedence over the metadata of its sub groups having the same id,
+    otherwise the first one added is kept."""
+    added = [metadata]
+    if isinstance(metadata, MetadataGroup):
+      added += metadata.descendants.values()
+    group = self
+    while group is not None:
+      descendants = group.descendants
+      for item in added:
+        if not descendants.has_key(item.id) or \
+           group.metadataByName.get(item.id) is item:
+          descendants[item.id] = item
+      group.metadataChanged()
+      group = group.parent
+  def metadataChanged(self):
+    """called when metadata is added to this group or any of its sub groups
+    to reset what is computed from the descendants of the group."""
+    self.fieldNames = None
+    renderersChanged()
   def __getitem__(self, key):
     """dictionary access to get a child metadata by id"""
     return self.metadataByName[key]
@@ -531,60 +569,41 @@ class MetadataGroup(MetadataBase):
     return self.metadataByName.keys()
   def hasProperty(self, property):
     """check if there is metadata for the model-layer C{property}."""
-    return property in self.metadataByProperty.keys()
+    return self.metadataByProperty.has_key(property)
   def getProperties(self):
     """get a list of all the model-layer properties of the child metadata."""
     return self.metadataByProperty.keys()
   def getMetadata(self, id):
     """get a child metadata from any depth"""
-    if self.metadataByName.has_key(id):
-      return self.metadataByName[id]
-    else:
-      for group in self.subGroups:
-        if group.hasMetadata(id):
-          return group.getMetadata(id)
-    raise KeyError, id
+    return self.descendants[id]
   def hasMetadata(self, id):
     """check if there is a child metadata identified by C{id}."""
-    if self.metadataByName.has_key(id):
-      return True
-    else:
-      for group in self.subGroups:
-        if group.hasMetadata(id):
-          return True
-    return False
+    return self.descendants.has_key(id)
   def hasFieldMetadata(self, id):
     """check if there is a descendent metadata for a field identified by
     C{id}."""
-    if (self.metadataByName.has_key(id) and 
-        isinstance(self.metadataByName[id], FieldMetadata)):
-      return True
-    else:
-      for group in self.subGroups:
-        if group.hasFieldMetadata(id):
-          return True
-    return False
+    return isinstance(self.descendants.get(id), FieldMetadata)
   def getFieldNames(self):
-    """get a list of all the descendent field names"""
-    names = []
-    for metadata in self.metadataByName.values():
-      if isinstance(metadata, FieldMetadata):
-        names.append(metadata.id)
-    for group in self.subGroups:
-      names += group.getFieldNames()
-    return names
+    """get a tuple of all the descendent field names: the fields of this
+    group in the order they were added followed by the fields of each sub
+    group."""
+    if self.fieldNames is None:
+      names = []
+      for id in self.order:
+        if isinstance(self.metadataByName[id], FieldMetadata):
+          names.append(id)
+      for group in self.subGroups:
+        names.extend(group.getFieldNames())
+      self.fieldNames = tuple(names)
+    return self.fieldNames
   def getFieldMetadata(self, id):
     """Retrieve the descendent L{FieldMetadata} identified by C{id} or raise
     L{KeyError} if not found.
     """
-    if (self.metadataByName.has_key(id) and 
-        isinstance(self.metadataByName[id], FieldMetadata)):
-      return self.metadataByName[id]
-    else:
-      for group in self.subGroups:
-        if group.hasFieldMetadata(id):
-          return group.getFieldMetadata(id)
-    raise KeyError, id
+    metadata = self.descendants[id]
+    if not isinstance(metadata, FieldMetadata):
+      raise KeyError, id
+    return metadata
   def getMetadataByProperty(self, property):
     """get a child metadata defined for the specified model-layer
     C{property}."""
@@ -615,6 +634,19 @@ class FormMetadata(MetadataGroup):
     self.method = method
     self.type = type
     self.tabIndexTable = tabIndexTable
+    self.validationProgram = None
+  def metadataChanged(self):
+    super(FormMetadata,self).metadataChanged()
+    self.validationProgram = None
+  def getValidationProgram(self):
+    """get the functions validating each field of the form, compiled by
+    L{compileValidation<validate>} when first needed. L{validateForm<validate>}
+    runs them for each request instead of looking up the metadata and type
+    of every field again. Call L{metadataChanged} after changing the fields
+    of a form in use."""
+    if self.validationProgram is None:
+      self.validationProgram = compileValidation(self)
+    return self.validationProgram
   def setFocus(self,fieldId):
     """Sets the field metadata id for the form."""
     self.focus = self.getFieldMetadata(fieldId)
@@ -652,6 +684,10 @@ class TypeMetadata(PyWebMvcObject):
         - C{enumeration} - each C{<value>} is a interpreted as a possible legal
           value.  The value received from the user must match exactly to one of
           these C{<value>} elements.
+        - C{enumgenerator} - only one C{<value>} child is allowed and its
+          contents are interpreted similarly to python-class. The imported
+          object must be callable, accept the C{request} and return the legal
+          values as a list of dictionaries with a C{value} and a C{label}.
         - C{regex} - only one C{<value>} child is allowed. The contents of
           which are interpreted as a regular expression.
         - C{function} - only one C{<value>} child is allowed and its contents
@@ -661,6 +697,10 @@ class TypeMetadata(PyWebMvcObject):
           by passing the value in this way, validator functions can perform
           validation dependent on another field's values. The callable should
           return an L{ActionErrors<core>} object.
+    - C{cache} - Optional. How long the values returned by an
+      C{enumgenerator} are kept: C{request} (the default) calls the function
+      once per request, C{none} each time the values are needed and a number
+      caches them for that many seconds across requests.
   C{<value>} elements enclose their value with a start and end tag.
   Additionally, they take the following attributes:
     - C{label} - A resource bundle key which can be used to display the value.
@@ -4,9 +4,8 @@
 #  END OF COPYRIGHT NOTICE 
 """Reads the XML configuration file and parses it into the PyWebMVC object
 model."""
-import types
+import types, threading
 from copy import copy
-from xml.dom.minidom import parse
 from xml.dom import Node
 
 from core import *
@@ -14,25 +13,40 @@ from metadata import *
 from validate import *
 from resourcebundle import BundleManager, ResourceBundle
 from util import TabIndexTable
+from configcache import readConfigSource, loadConfigSource
+from instrument import instrument
 
 pyWebMvcConfig = None
+pyWebMvcConfigLock = threading.Lock()
 def getPyWebMvcConfig(req):
-  """returns the singleton instance of the L{application configuration<core.PyWebMvcConfiguration>}."""
+  """returns the singleton instance of the L{application configuration<core.PyWebMvcConfiguration>}.
+  The configuration is read once by the first request, the concurrent
+  requests of a threaded server wait for it."""
   global pyWebMvcConfig
   if not pyWebMvcConfig:
-    pyWebMvcConfig = readConfig(req)
+    pyWebMvcConfigLock.acquire()
+    try:
+      if not pyWebMvcConfig:
+        pyWebMvcConfig = readConfig(req)
+    finally:
+      pyWebMvcConfigLock.release()
   return pyWebMvcConfig
 
 class Initializer(object):
-  def __init__(self,configFileName, prefix = None,extension = None):
+  def __init__(self,configFileName, prefix = None,extension = None,
+               cacheFileName = None, parserName = None):
     self.configFileName = configFileName
     self.prefix = prefix
     self.extension = extension
+    self.cacheFileName = cacheFileName
+    self.parserName = parserName
   def initialize(self):
     global pyWebMvcConfig
     pyWebMvcConfig = readConfigFromFile(self.configFileName,
                                         self.prefix,
-                                        self.extension)
+                                        self.extension,
+                                        self.cacheFileName,
+                                        self.parserName)
 
 def readConfig(req):
   """Accepts a C{mod_python} request object and uses the following options to create the application L{configuration<pywebmvc.framework.core.PyWebMvcConfiguration>}:
@@ -43,30 +57,69 @@ def readConfig(req):
       one.
     - C{pyWebMvcExtension} - If provided, add C{"."+extension} to each action
       path. If omitted, no extension will be used.
+    - C{pyWebMvcConfigCache} - If provided, the path of the precompiled
+      L{cache<configcache>} of the configuration file.
+    - C{pyWebMvcConfigParser} - The L{parser<configcache.PARSERS>} used to
+      read the configuration file: C{minidom} (the default) or C{sax}.
   """
   options = req.get_options()
   file = options["pyWebMvcConfig"]
   prefix = None
   extension = None
+  cacheFile = None
+  parserName = None
   if options.has_key("pyWebMvcPrefix"):
     prefix = options["pyWebMvcPrefix"]
   if options.has_key("pyWebMvcExtension"):
     extension = options["pyWebMvcExtension"]
-  return readConfigFromFile(file,prefix,extension)
-
-def readConfigFromFile(file,prefix,extension):
+  if options.has_key("pyWebMvcConfigCache"):
+    cacheFile = options["pyWebMvcConfigCache"]
+  if options.has_key("pyWebMvcConfigParser"):
+    parserName = options["pyWebMvcConfigParser"]
+  return readConfigFromFile(file,prefix,extension,cacheFile,parserName)
+
+def readConfigFromFile(file,prefix,extension,cacheFile = None,
+                       parserName = None):
   """Returns a L{configuration<pywebmvc.framework.core.PyWebMvcConfiguration>}
   object having been set up according to the provided C{file}, C{prefix} and
   C{extension}. All arguments are strings, the file parameter is a path to the
-  xml configuration file.
+  xml configuration file. If C{cacheFile} is given, the configuration file
+  and its properties files are read from that L{cache<configcache>} when it
+  is up to date; otherwise they are parsed and the cache is rewritten.
+  C{parserName} selects the L{parser<configcache.PARSERS>} used to read the
+  configuration file, C{minidom} by default.
   """
+  span = instrument.start("config.load")
+  try:
+    source = None
+    if cacheFile:
+      source = loadConfigSource(file, cacheFile)
+    if source is None:
+      source = readConfigSource(file, parserName)
+    config = readConfigFromSource(source, prefix, extension)
+    if cacheFile and not source.cached:
+      try:
+        source.save(cacheFile)
+      except (IOError, OSError):
+        #the server may not be allowed to write the cache, it can be built
+        #ahead of time instead
+        pass
+    source.document.unlink()
+    return config
+  finally:
+    span.stop()
+
+def readConfigFromSource(source,prefix,extension):
+  """Returns a L{configuration<pywebmvc.framework.core.PyWebMvcConfiguration>}
+  built from the document of the L{ConfigSource<configcache.ConfigSource>}
+  C{source}."""
   config = PyWebMvcConfiguration(prefix,extension)
-  document = parse(file)
+  document = source.document
 
   resourcesElements = document.getElementsByTagName("resources")
   assert len(resourcesElements) <= 1
   if resourcesElements:
-    readResources(resourcesElements[0], config)
+    readResources(resourcesElements[0], config, source)
   else:
     config.bundleManager = BundleManager()
 
@@ -105,7 +158,6 @@ def readConfigFromFile(file,prefix,extension):
     assert len(errorHandlersElements) == 1
     readErrorHandlers(errorHandlersElements[0], config)
 
-  document.unlink()
   return config
 
 def readTypes(typesElement,config):
@@ -245,7 +297,8 @@ def getValidationFunction(element):
       if len(valueTags) == 1 and valueTags[0].firstChild:
         functionStr = valueTags[0].firstChild.nodeValue
         (module, funcName) = parseImport(functionStr)
-        functions.append(createEnumGeneratorValidator(importObject(module, funcName), errorMsgKey))
+        cache = createEnumValuesCache(validationElement.getAttribute("cache"))
+        functions.append(createEnumGeneratorValidator(importObject(module, funcName), errorMsgKey, cache))
       else:
         raise PyWebMvcInvalidConfigurationException("enumgenerator <validation> tags should have exactly one <value>")
     elif type == "regex":
@@ -383,7 +436,7 @@ def unmarshallForm(element, config):
     formMetadata.setFocus(element.getAttribute("focus"))
   return formMetadata
 
-def readResources(element, config):
+def readResources(element, config, source):
   resourceBundleElements = element.getElementsByTagName("resource-bundle")
   firstLocale = None
   defaultLocale = None
@@ -405,7 +458,8 @@ def readResources(element, config):
     #XXX overridding happens in document order?
     propertiesElements = resourceBundleElement.getElementsByTagName("properties")
     for propertiesElement in propertiesElements:
-      bundle.addPropertiesFile(propertiesElement.getAttribute("path"))
+      bundle.addProperties(
+        source.readProperties(propertiesElement.getAttribute("path")))
     propertyElements = resourceBundleElement.getElementsByTagName("property")
     for propertyElement in propertyElements:
       key = propertyElement.getAttribute("key")
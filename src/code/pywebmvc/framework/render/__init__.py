@@ -46,14 +46,14 @@ class Renderer(PyWebMvcObject):
   def getRenderer(self, req, mapping, type, name):
     return mapping.rendererFactory.getRenderer(type, req, mapping, name)
   def getIgnoreAttributes(self):
-    return ["options","required"]
+    return ["options","optionsSource","required"]
   def renderAttributes(self, map):
-    html = ""
+    html = htmlutil.HtmlBuffer()
     ignore= self.getIgnoreAttributes()
     for key in map.keys():
       if not key in ignore:
-        html += ' %s="%s"' % (key, htmlutil.escapeAttribute(map[key]))
-    return html
+        html.write(' %s="%s"' % (key, htmlutil.escapeAttribute(map[key])))
+    return html.getvalue()
   def render(self, request, mapping, *args, **kwargs):
     """All Subclasses must implement this method"""
     return ""
@@ -70,34 +70,36 @@ class ListRenderer(Renderer):
     self.separator = separator
   def render(self, request, mapping, name, values, cssClass, **kwargs):
     elementRenderer = self.getRenderer(request, mapping, self.type, name)
-    html = ""
+    html = htmlutil.HtmlBuffer()
     first = True
     for v in values:
       if first:
         first = False
       else:
-        html += self.separator
-      html += self.before + elementRenderer.render(request, mapping, name, v,
-              cssClass, **kwargs) + self.after
-    return html
+        html.write(self.separator)
+      html.write(self.before)
+      html.write(elementRenderer.render(request, mapping, name, v, cssClass,
+                                        **kwargs))
+      html.write(self.after)
+    return html.getvalue()
 
 class MutableListRenderer(Renderer):
   def __init__(self, type):
     self.type = type
   def render(self, request, mapping, name, values, cssClass, **kwargs):
     index = 0
-    html = ""
+    html = htmlutil.HtmlBuffer()
     elementRenderer = self.getRenderer(request, mapping, self.type, name)
     for v in values:
-      html += '<div style="white-space: nowrap">'
-      html += elementRenderer.render(request, mapping, name, v,
-                                     cssClass, **kwargs)
-      html += '<span>'
+      html.write('<div style="white-space: nowrap">')
+      html.write(elementRenderer.render(request, mapping, name, v,
+                                        cssClass, **kwargs))
+      html.write('<span>')
       if len(values) > 1:
-        html += '<button type="button" dontSubmit="true" onclick="delRow(this, event)">-</button>'
+        html.write('<button type="button" dontSubmit="true" onclick="delRow(this, event)">-</button>')
       if index + 1 == len(values):
-        html += '<button type="button" dontSubmit="true" onclick="addRow(this, event)">+</button>'
-      html += "</span></div>"
+        html.write('<button type="button" dontSubmit="true" onclick="addRow(this, event)">+</button>')
+      html.write("</span></div>")
       index += 1
-    return html
+    return html.getvalue()
 
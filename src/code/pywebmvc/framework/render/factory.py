@@ -4,6 +4,7 @@
 #  END OF COPYRIGHT NOTICE 
 """Group and access renderers abstractly."""
 
+import weakref
 from types import *
 from pywebmvc.framework import htmlutil, metadata
 from pywebmvc.framework.util import PyWebMvcObject
@@ -50,20 +51,41 @@ class RendererFactory(PyWebMvcObject):
     return self.getRenderer(Renderer.TYPE_FORM, req, mapping)
   def setRenderer(self,type,renderer):
     self.renderers[type] = renderer
+    self.__dict__.pop("resolvedRenderers", None)
   def getRenderer(self,type, req = None, mapping = None, name = None):
+    """Returns the renderer for C{type}: the renderer set on the metadata of
+       the field or group C{name} of the current form or on its nearest
+       ancestor, otherwise the renderer of this factory. The renderer is
+       resolved once per form, field name and type and kept until a renderer
+       is set on this factory or on any metadata, or metadata is added to a
+       group."""
+    if not (mapping and req):
+      return self.renderers[type]
+    form = mapping.getFormMetadata(req)
+    if not form:
+      return self.renderers[type]
+    cache = self.__dict__.get("resolvedRenderers")
+    if cache is None:
+      cache = self.resolvedRenderers = weakref.WeakKeyDictionary()
+    resolved = cache.get(form)
+    if resolved is None or resolved[0] != metadata.rendererGeneration:
+      resolved = cache[form] = (metadata.rendererGeneration, {})
+    key = (name, type)
+    renderer = resolved[1].get(key)
+    if renderer is None:
+      renderer = resolved[1][key] = self.resolveRenderer(type, form, name)
+    return renderer
+  def resolveRenderer(self, type, form, name):
+    """Looks up the renderer for C{type} and the field or group C{name} of
+       C{form} as described in L{getRenderer}, without caching."""
     renderer = None
-    if mapping and req and mapping.getFormMetadata(req):
-      if name:
-        if mapping.getFormMetadata(req).hasMetadata(name):
-          md = mapping.getFormMetadata(req).getMetadata(name)
-        else:
-          md = mapping.getFormMetadata(req)
-      else:
-        md = mapping.getFormMetadata(req)
-      while md and not md.hasRenderer(type):
-        md = md.parent
-      if md:
-        renderer = md.getRenderer(type)
+    md = form
+    if name and form.hasMetadata(name):
+      md = form.getMetadata(name)
+    while md and not md.hasRenderer(type):
+      md = md.parent
+    if md:
+      renderer = md.getRenderer(type)
     if renderer is None:
       renderer = self.renderers[type]
     return renderer
@@ -5,12 +5,45 @@
 
 """Render collections of fields (forms and fieldgroups)."""
 
+import weakref
 from types import *
 from pywebmvc.framework import htmlutil, metadata
+from pywebmvc.framework.util import PyWebMvcObject, overrides
 from pywebmvc.framework.core import ActionError, PyWebMvcException
 from pywebmvc.framework.metadata import FieldMetadata, MetadataGroup
 from __init__ import Renderer
 
+class FieldRenderInfo(PyWebMvcObject):
+  """The facts needed to render a field which only depend on its metadata,
+     and so do not change from one request to the next. These are worked out
+     once per field by L{MetadataRenderer.getFieldRenderInfo}. When the
+     metadata class decides the display or type of a field per request (by
+     overriding C{getDisplay} or C{getType}) the corresponding fact is left
+     as C{None} and computed on each request as before."""
+  __slots__ = ("tabIndex", "cssClass", "maxlength", "attributes", "display",
+               "widgetType")
+  def __init__(self, renderer, form, fmd):
+    try:
+      #str:ok
+      self.tabIndex = str(form.tabIndexTable.lookup(fmd.id))
+    except KeyError:
+      self.tabIndex = None
+    self.cssClass = fmd.cssClass
+    self.maxlength = fmd.maxlength
+    #str:notok -- but kwargs usage requires this
+    self.attributes = [(str(key), unicode(value))
+                       for key, value in fmd.attributes.items()]
+    self.display = None
+    if not overrides(fmd, FieldMetadata, "getDisplay"):
+      self.display = fmd.getDisplay(None, None)
+    self.widgetType = None
+    if not overrides(fmd, FieldMetadata, "getType"):
+      try:
+        self.widgetType = renderer.getWidgetType(fmd, fmd.getType())
+      except ValueError:
+        pass #raised again when the widget is rendered
+
+
 class MetadataRenderer(Renderer):
   """Abstract Base class providing utilites which render based on
      configuration metadata.
@@ -20,15 +53,33 @@ class MetadataRenderer(Renderer):
       return mapping.getFormMetadata(request).getMetadata(metadata)
     else:
       return metadata
+  def getFieldRenderInfo(self, request, mapping, name):
+    """returns the L{FieldRenderInfo} for the field C{name} of the current
+       form, or C{None} if the mapping has no form. The info is built on first
+       use and kept for as long as the field metadata exists. Like the render
+       plans, it is built again once metadata has changed: call
+       C{metadataChanged()} on the form after modifying the metadata of a
+       field while requests are being rendered."""
+    form = mapping.getFormMetadata(request)
+    if not form:
+      return None
+    fmd = form.getFieldMetadata(name)
+    cache = self.__dict__.get("fieldRenderInfo")
+    if cache is None:
+      cache = self.fieldRenderInfo = weakref.WeakKeyDictionary()
+    entry = cache.get(fmd)
+    if entry is None or entry[0] != metadata.rendererGeneration:
+      entry = cache[fmd] = (metadata.rendererGeneration,
+                            FieldRenderInfo(self, form, fmd))
+    return entry[1]
   def getAttributes(self, request, mapping, name, attributes):
     """sets any attributes from the config file which are not explicitly
        set already"""
     if mapping.getFormMetadata(request).hasFieldMetadata(name):
-      fmd = mapping.getFormMetadata(request).getFieldMetadata(name)
-      for key in fmd.attributes.keys():
+      info = self.getFieldRenderInfo(request, mapping, name)
+      for key, value in info.attributes:
         if not attributes.has_key(key):
-          #str:notok -- but kwargs usage requires this
-          attributes[str(key)] = unicode(fmd.attributes[key])
+          attributes[key] = value
   def hasError(self,request, mapping, name, index = None):
     if hasattr(request,"errors"):
       return request.errors.hasError(name, index)
@@ -49,10 +100,21 @@ class MetadataRenderer(Renderer):
       if mapping.getFormMetadata(request).hasFieldMetadata(name):
         fmd = mapping.getFormMetadata(request).getFieldMetadata(name)
         tmd = fmd.getType(request, mapping)
-        if hasattr(fmd.validate, "getValueLabelList"):
-          options += fmd.validate.getValueLabelList(request)
-        if hasattr(tmd.validate, "getValueLabelList"):
-          options += tmd.validate.getValueLabelList(request)
+        sources = []
+        validators = []
+        for validator in (fmd.validate, tmd.validate):
+          if hasattr(validator, "getValueLabelList"):
+            sources.append(validator.getValueLabelList(request))
+            validators.append(validator)
+        if len(sources) == 1:
+          #a copy of the list of the validator, which renderers may modify,
+          #and the validator, so that the renderers can keep the markup of
+          #its options even when the list is generated again for each request
+          options = list(sources[0])
+          attributes["optionsSource"] = validators[0]
+        else:
+          for source in sources:
+            options += source
         attributes["options"] = options
   def getDisplayValue(request, mapping, name, value, options = None):
     """for enumerated types: converts the value to a corresponding label"""
@@ -69,53 +131,40 @@ class MetadataRenderer(Renderer):
         if (option["value"] == value):
           displayValue = request.bundle[option["label"]]
     return displayValue
+  WIDGET_TYPES = {
+    Renderer.TYPE_SELECT : (Renderer.TYPE_SELECT, Renderer.TYPE_SELECT_LIST),
+    Renderer.TYPE_RADIO : (Renderer.TYPE_RADIO, Renderer.TYPE_RADIO_LIST),
+    Renderer.TYPE_TEXT : (Renderer.TYPE_TEXT, Renderer.TYPE_TEXT_LIST),
+    Renderer.TYPE_TEXT_AREA : (Renderer.TYPE_TEXT_AREA, None),
+    Renderer.TYPE_PASSWORD : (Renderer.TYPE_PASSWORD,
+                              Renderer.TYPE_PASSWORD_LIST),
+    Renderer.TYPE_CHECKBOX : (Renderer.TYPE_CHECKBOX, None),
+    Renderer.TYPE_SUBMIT : (Renderer.TYPE_SUBMIT, Renderer.TYPE_SUBMIT_LIST),
+    Renderer.TYPE_FILE : (Renderer.TYPE_FILE, Renderer.TYPE_FILE_LIST),
+  }
+  """Maps the input of a type to the widget renderer types used for single
+     and list fields. Inputs which are not listed are used as the renderer
+     type directly."""
+  def getWidgetType(self, fmd, typeMetadata):
+    """Returns the renderer type of the widget for the field C{fmd} having
+       the type C{typeMetadata}"""
+    input = typeMetadata.input
+    if not self.WIDGET_TYPES.has_key(input):
+      return input
+    singleType, listType = self.WIDGET_TYPES[input]
+    if not fmd.list:
+      return singleType
+    if input == Renderer.TYPE_TEXT_AREA:
+      raise ValueError("Lists of text areas are not implemented")
+    elif input == Renderer.TYPE_CHECKBOX:
+      raise ValueError("Lists of type checkbox are not allowed - use radio")
+    return listType
   def getWidgetRenderer(self, request, mapping, name, display = None):
     """Returns the correct widget renderer for the field"""
-    fmd = mapping.getFormMetadata(request).getFieldMetadata(name)
-    display = self.getDisplay(request,mapping,name,display)
-    type = None
-    if fmd.getType(request, mapping).input == Renderer.TYPE_SELECT:
-      if fmd.list:
-        type = Renderer.TYPE_SELECT_LIST
-      else:
-        type = Renderer.TYPE_SELECT
-    elif fmd.getType(request, mapping).input == Renderer.TYPE_RADIO:
-      if fmd.list:
-        type = Renderer.TYPE_RADIO_LIST
-      else:
-        type = Renderer.TYPE_RADIO
-    elif fmd.getType(request, mapping).input == Renderer.TYPE_TEXT:
-      if fmd.list:
-        type = Renderer.TYPE_TEXT_LIST
-      else:
-        type = Renderer.TYPE_TEXT
-    elif fmd.getType(request, mapping).input == Renderer.TYPE_TEXT_AREA:
-      if fmd.list:
-        raise ValueError("Lists of text areas are not implemented")
-      else:
-        type = Renderer.TYPE_TEXT_AREA
-    elif fmd.getType(request, mapping).input == Renderer.TYPE_PASSWORD:
-      if fmd.list:
-        type = Renderer.TYPE_PASSWORD_LIST
-      else:
-        type = Renderer.TYPE_PASSWORD
-    elif fmd.getType(request, mapping).input == Renderer.TYPE_CHECKBOX:
-      if fmd.list:
-        raise ValueError("Lists of type checkbox are not allowed - use radio")
-      else:
-        type = Renderer.TYPE_CHECKBOX
-    elif fmd.getType(request, mapping).input == Renderer.TYPE_SUBMIT:
-      if fmd.list:
-        type = Renderer.TYPE_SUBMIT_LIST
-      else:
-        type = Renderer.TYPE_SUBMIT
-    elif fmd.getType(request, mapping).input == Renderer.TYPE_FILE:
-      if fmd.list:
-        type = Renderer.TYPE_FILE_LIST
-      else:
-        type = Renderer.TYPE_FILE
-    else:
-      type = fmd.getType(request, mapping).input
+    type = self.getFieldRenderInfo(request, mapping, name).widgetType
+    if type is None:
+      fmd = mapping.getFormMetadata(request).getFieldMetadata(name)
+      type = self.getWidgetType(fmd, fmd.getType(request, mapping))
     return self.getRenderer(request,mapping, type, name)
   def instruction(self, request, mapping, name, widgetDisplay = None):
     instructionRenderer = self.getRenderer(request,mapping,self.TYPE_INSTRUCTION,name)
@@ -131,8 +180,11 @@ class MetadataRenderer(Renderer):
        along with the tag -- useful for javascript event handlers etc."""
     display = self.getDisplay(request, mapping, name, display)
     kwargs["display"] = display
-    #str:ok
-    kwargs["tabindex"] = str(mapping.getFormMetadata(request).tabIndexTable.lookup(name))
+    tabIndex = self.getFieldRenderInfo(request, mapping, name).tabIndex
+    if tabIndex is None:
+      #str:ok
+      tabIndex = str(mapping.getFormMetadata(request).tabIndexTable.lookup(name))
+    kwargs["tabindex"] = tabIndex
     cssClass = self.getCssClass(request, mapping, name, cssClass)
     if kwargs.has_key("index"):
       index = kwargs["index"]
@@ -215,25 +267,26 @@ class MetadataRenderer(Renderer):
     return value
   def getCssClass(self, request, mapping, name, cssClass):
     if not cssClass:
-      if mapping.getFormMetadata(request):
-        cssClass = mapping.getFormMetadata(request).getFieldMetadata(name).cssClass
+      info = self.getFieldRenderInfo(request, mapping, name)
+      if info:
+        cssClass = info.cssClass
       else:
         cssClass = ""
     return cssClass
   def getMaxLength(self, request, mapping, name, attributes):
     if not attributes.has_key("maxlength"):
-      if mapping.getFormMetadata(request):
-        fmd = mapping.getFormMetadata(request).getFieldMetadata(name)
-      else:
-        fmd = None
-      if fmd and fmd.maxlength:
-        attributes["maxlength"] = fmd.maxlength
+      info = self.getFieldRenderInfo(request, mapping, name)
+      if info and info.maxlength:
+        attributes["maxlength"] = info.maxlength
   def getDisplay(self, request, mapping, name, display = None):
     if display == None:
-      if mapping.getFormMetadata(request):
+      info = self.getFieldRenderInfo(request, mapping, name)
+      if info is None:
+        display = metadata.DISPLAY_NORMAL
+      elif info.display is None:
         display = mapping.getFormMetadata(request).getFieldMetadata(name).getDisplay(request, mapping)
       else:
-        display = metadata.DISPLAY_NORMAL
+        display = info.display
     return display
 
 class FieldGroupListRenderer(MetadataRenderer):
@@ -247,19 +300,73 @@ class FieldGroupRenderer(MetadataRenderer):
              """+self.errors(request,mapping,name)+"""
              </div>"""
     return ""
-  def renderFields(self, request, mapping, metadataGroup = None,**kwargs):
-    fields = ""
+  def getRenderPlan(self, request, mapping, metadataGroup):
+    """Returns the render plan for C{metadataGroup}: a list of steps, one per
+       field or sub-group in order, each called with
+       C{(request, mapping, kwargs)}. The plan is compiled on first use by
+       L{compileField} and L{compileFieldGroup} and kept for as long as the
+       metadata group exists. It is recompiled once metadata has changed:
+       when metadata is added to a group or a renderer set on metadata, or
+       when C{metadataChanged()} is called on a group after replacing or
+       reordering its children (see
+       L{rendererGeneration<pywebmvc.framework.metadata.rendererGeneration>})."""
+    plans = self.__dict__.get("renderPlans")
+    if plans is None:
+      plans = self.renderPlans = weakref.WeakKeyDictionary()
+    plan = plans.get(metadataGroup)
+    if plan is None or plan[0] != metadata.rendererGeneration:
+      steps = []
+      for id in metadataGroup.order:
+        child = metadataGroup[id]
+        if isinstance(child, FieldMetadata):
+          steps.append(self.compileField(child))
+        elif isinstance(child, MetadataGroup):
+          steps.append(self.compileFieldGroup(child))
+      plan = plans[metadataGroup] = (metadata.rendererGeneration, steps)
+    return plan[1]
+  def compileField(self, metadata):
+    """Returns the render plan step for the field C{metadata}. Unless a
+       subclass overrides L{renderField}, the static markup surrounding the
+       field is joined here once instead of on every request."""
+    if overrides(self, FieldGroupRenderer, "renderField"):
+      def renderFieldStep(request, mapping, kwargs):
+        return self.renderField(request, mapping, metadata, **kwargs)
+      return renderFieldStep
+    return self.compileFieldMarkup(metadata.id)
+  def compileFieldGroup(self, metadata):
+    """Returns the render plan step for the field group C{metadata}."""
+    def renderFieldGroupStep(request, mapping, kwargs):
+      return self.renderFieldGroup(request, mapping, metadata, **kwargs)
+    return renderFieldGroupStep
+  def compileFieldMarkup(self, name):
+    """Returns a step which renders the field C{name} in the default
+       C{<div>} based layout. Only the label, instruction, widget and errors
+       are rendered per request."""
+    start = '<div id="%s_field" class="pyWebMvcField">\n' \
+            '              <div class="pyWebMvcLabel">\n' \
+            '              ' % name
+    newline = '\n              '
+    middle = '\n              </div><div class="pyWebMvcWidget">\n' \
+             '              '
+    end = '\n              </div>\n              </div>'
+    def renderFieldStep(request, mapping, kwargs):
+      return "".join((start,
+                      self.label(request, mapping, name), newline,
+                      self.instruction(request, mapping, name), middle,
+                      self.widget(request, mapping, name, **kwargs), newline,
+                      self.renderErrors(request, mapping, name), end))
+    return renderFieldStep
+  def generateFields(self, request, mapping, metadataGroup = None,**kwargs):
+    """returns a generator of the rendered fields and field groups of
+       C{metadataGroup} (the form by default)."""
     if metadataGroup is None:
       metadataGroup = mapping.getFormMetadata(request)
     if metadataGroup is None:
-      return ""
-    for id in metadataGroup.order:
-      metadata = metadataGroup[id]
-      if isinstance(metadata, FieldMetadata):
-        fields += self.renderField(request, mapping, metadata,**kwargs)
-      elif isinstance(metadata, MetadataGroup):
-        fields += self.renderFieldGroup(request, mapping, metadata,**kwargs)
-    return fields
+      return
+    for step in self.getRenderPlan(request, mapping, metadataGroup):
+      yield step(request, mapping, kwargs)
+  def renderFields(self, request, mapping, metadataGroup = None,**kwargs):
+    return "".join(self.generateFields(request, mapping, metadataGroup, **kwargs))
   def renderFieldGroup(self, request, mapping, metadata,**kwargs):
     metadata = self.checkMetadata(request, mapping, metadata)
     if metadata.list:
@@ -269,15 +376,7 @@ class FieldGroupRenderer(MetadataRenderer):
     return groupRenderer.render(request,mapping,metadata,**kwargs)
   def renderField(self, request, mapping, metadata, **kwargs):
     metadata = self.checkMetadata(request, mapping, metadata)
-    return """<div id=\""""+metadata.id+"""_field" class="pyWebMvcField">
-              <div class="pyWebMvcLabel">
-              """ + self.label(request, mapping, metadata.id) + """
-              """ + self.instruction(request, mapping, metadata.id) + """
-              </div><div class="pyWebMvcWidget">
-              """ + self.widget(request, mapping, metadata.id, **kwargs) + """
-              """ + self.renderErrors(request, mapping, metadata.id) + """
-              </div>
-              </div>"""
+    return self.compileFieldMarkup(metadata.id)(request, mapping, kwargs)
   def renderStart(self, request, mapping, metadata):
     if metadata.getLabel(request,mapping):
       legend = """<legend>%s</legend>""" % request.bundle[metadata.getLabel(request,mapping)]
@@ -323,22 +422,22 @@ class FormRenderer(FieldGroupRenderer):
     action = self.getAction(request, mapping, action)
     onSubmit = self.getOnSubmit(request, mapping)
     id = self.getFormId(request,mapping)
-    form = "<form"
+    form = htmlutil.HtmlBuffer("<form")
     if id:
-      form += ' id="%s"' % id
+      form.write(' id="%s"' % id)
     if action:
-      form += ' action="%s"' % action
+      form.write(' action="%s"' % action)
     if method:
-      form += ' method="%s"' % method
+      form.write(' method="%s"' % method)
     if type:
-      form += ' enctype="%s"' % type
+      form.write(' enctype="%s"' % type)
     if onSubmit:
-      form += ' onsubmit="%s"' % onSubmit
-    form += ">"
+      form.write(' onsubmit="%s"' % onSubmit)
+    form.write(">")
     #Some browsers (IE,Mozilla) will modify the value of this field to send
     #the charset of the submitted data
-    form += '<input type="hidden" name="_charset_">'
-    return form
+    form.write('<input type="hidden" name="_charset_">')
+    return form.getvalue()
   def renderEnd(self,request,mapping):
     return "</form>"
   def renderFocus(self,request, mapping, fieldId = None):
@@ -381,12 +480,11 @@ class TableFieldGroupRenderer(FieldGroupRenderer):
   def renderEnd(self, request, mapping,metadata):
     return "</tbody>"
   def errors(self, request, mapping, name, colspan = 2):
-    row = ""
     if self.hasError(request, mapping, name):
-      row += '<tr class="pyWebMvcErrorRow"><td colspan="%i">' % (colspan)
-      row += super(TableFieldGroupRenderer,self).errors(request, mapping, name)
-      row += '</td></tr>'
-    return row
+      return "".join(('<tr class="pyWebMvcErrorRow"><td colspan="%i">' % (colspan),
+                      super(TableFieldGroupRenderer,self).errors(request, mapping, name),
+                      '</td></tr>'))
+    return ""
   def renderField(self, request, mapping, fieldMetadata, widths = None,**kwargs):
     fieldMetadata = self.checkMetadata(request, mapping, fieldMetadata)
     name = fieldMetadata.id
@@ -410,45 +508,46 @@ class TableFieldGroupRenderer(FieldGroupRenderer):
     if fieldMetadata.hasAttribute("orient"):
       rowOrientation = fieldMetadata.getAttribute("orient")
       assert rowOrientation in ("horizontal","vertical")
+    row = htmlutil.HtmlBuffer()
     if typeMetadata.input == "checkbox":
-      row = '<tr class="'+rowClass+'"><td valign="top" colspan="2"'
+      row.write('<tr class="'+rowClass+'"><td valign="top" colspan="2"')
       if widths:
         width = 0
         if widths[0]: width += widths[0]
         if widths[1]: width += widths[1]
-        row += ' width="%i"' % (width)
-      row += '>'
-      row += "<table style=\"margin:0; padding:0; margin-left:-2px\"> <tr> <td style=\"vertical-align: top;margin:0; margin-top: -2px; padding:0\">"
-      row += self.widget(request, mapping, fieldMetadata.id, **kwargs)
-      row += "</td><td style=\"vertical-align: top;margin:0; padding:0; padding-top:2px;\">"
-      row += self.label(request, mapping, fieldMetadata.id, required=required, widgetDisplay=display, style="cursor: pointer")
-      row += "</td><td style=\"vertical-align: top;margin:0; padding:0; padding-left:3px;\">"
-      row += self.instruction(request, mapping, fieldMetadata.id, widgetDisplay=display)
-      row += "</td></tr></table>"
-      row += "</td></tr>"
+        row.write(' width="%i"' % (width))
+      row.write('>')
+      row.write("<table style=\"margin:0; padding:0; margin-left:-2px\"> <tr> <td style=\"vertical-align: top;margin:0; margin-top: -2px; padding:0\">")
+      row.write(self.widget(request, mapping, fieldMetadata.id, **kwargs))
+      row.write("</td><td style=\"vertical-align: top;margin:0; padding:0; padding-top:2px;\">")
+      row.write(self.label(request, mapping, fieldMetadata.id, required=required, widgetDisplay=display, style="cursor: pointer"))
+      row.write("</td><td style=\"vertical-align: top;margin:0; padding:0; padding-left:3px;\">")
+      row.write(self.instruction(request, mapping, fieldMetadata.id, widgetDisplay=display))
+      row.write("</td></tr></table>")
+      row.write("</td></tr>")
     elif rowOrientation == "horizontal":
-      row = '<tr class="'+rowClass+'">'
-      row += '<td valign="top"'
+      row.write('<tr class="'+rowClass+'">')
+      row.write('<td valign="top"')
       if widths and widths[0]:
-        row += ' width="%i"' % (widths[0])
-      row += '>'
-      row += self.label(request, mapping, fieldMetadata.id, required=required, widgetDisplay=display)
-      row += '</td><td valign="top"'
+        row.write(' width="%i"' % (widths[0]))
+      row.write('>')
+      row.write(self.label(request, mapping, fieldMetadata.id, required=required, widgetDisplay=display))
+      row.write('</td><td valign="top"')
       if widths and widths[1]:
-        row += ' width="%i"' % (widths[1])
-      row += '>'
-      row += """<table style="margin:0; padding:0;"> <tr>
-      <td style="margin:0; padding:0;"> """
-      row += self.widget(request, mapping, fieldMetadata.id, **kwargs)
-      row += "</td>"
+        row.write(' width="%i"' % (widths[1]))
+      row.write('>')
+      row.write("""<table style="margin:0; padding:0;"> <tr>
+      <td style="margin:0; padding:0;"> """)
+      row.write(self.widget(request, mapping, fieldMetadata.id, **kwargs))
+      row.write("</td>")
       instr = self.instruction(request, mapping, fieldMetadata.id, widgetDisplay=display)
       if not instr:
         instr = "&nbsp;"
-      row += '<td style="margin:0; padding:0;" valign="top">%s</td>' % (instr)
-      row += "</td></tr></table></td></tr>"
+      row.write('<td style="margin:0; padding:0;" valign="top">%s</td>' % (instr))
+      row.write("</td></tr></table></td></tr>")
     elif rowOrientation == "vertical":
       instr = self.instruction(request, mapping, fieldMetadata.id, widgetDisplay=display)
-      row = """
+      row.write("""
       <tr class="%(rowClass)s"><td colspan="3" %(width)s>
       <div class="pyWebMvcLabel">%(label)s</div>
       <div class="pyWebMvcWidget">%(widget)s</div>
@@ -460,9 +559,9 @@ class TableFieldGroupRenderer(FieldGroupRenderer):
         "label" : self.label(request, mapping, fieldMetadata.id, required=required, widgetDisplay=display),
         "widget":self.widget(request, mapping, fieldMetadata.id, **kwargs),
         "instr" : instr and instr or "&nbsp;",
-      }
-    row += self.errors(request, mapping, fieldMetadata.id)
-    return row
+      })
+    row.write(self.errors(request, mapping, fieldMetadata.id))
+    return row.getvalue()
 
 class TableFormRenderer(FormRenderer,TableFieldGroupRenderer):
   def renderStart(self, request, mapping, action = None, method = None):
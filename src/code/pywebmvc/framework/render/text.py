@@ -65,11 +65,13 @@ class ErrorsRenderer(Renderer):
   def render(self,request, mapping, name, errors, *args, **kwargs):
     errorRenderer = self.getRenderer(request,mapping, Renderer.TYPE_ERROR, name)
     if len(errors) > 1:
-      errStr = '<ul class="pyWebMvcErrors">'
+      errStr = htmlutil.HtmlBuffer('<ul class="pyWebMvcErrors">')
       for err in errors:
-        errStr += '<li>'+errorRenderer.render(request,mapping,name,err)+'</li>'
-      errStr += '</ul>'
-      return errStr
+        errStr.write('<li>')
+        errStr.write(errorRenderer.render(request,mapping,name,err))
+        errStr.write('</li>')
+      errStr.write('</ul>')
+      return errStr.getvalue()
     else:
       for err in errors:
         return '<span class="pyWebMvcError">'+errorRenderer.render(request,mapping,name,err)+'</span>'
@@ -86,17 +88,17 @@ class ReadOnlyListRenderer(Renderer):
   def render(self, request, mapping, name, values, cssClass,
                *args,**kwargs):
     first = True
-    html = ""
+    html = htmlutil.HtmlBuffer()
     readOnlyRenderer = self.getRenderer(request,mapping,self.TYPE_READ_ONLY, name)
     for v in values:
       if not first:
-        html += self.separator
+        html.write(self.separator)
       else:
         first = False
-      html += self.elementStart
-      html += readOnlyRenderer.render(request, mapping, name, v, cssClass)
-      html += self.elementEnd
-    return html
+      html.write(self.elementStart)
+      html.write(readOnlyRenderer.render(request, mapping, name, v, cssClass))
+      html.write(self.elementEnd)
+    return html.getvalue()
 
 class ReadOnlyCommaListRenderer(ReadOnlyListRenderer):
   def __init__(self, readOnlyRenderer = None):
@@ -104,16 +104,18 @@ class OptionsListRenderer(ListRenderer):
     options = kwargs["options"]
     del kwargs["options"]
     elementRenderer = self.getRenderer(request,mapping, self.type, name)
-    html = ""
+    html = htmlutil.HtmlBuffer()
     first = True
     for o in options:
       if first:
         first = False
       else:
-        html += self.separator
-      html += self.before + elementRenderer.render(request, mapping, name,
-              o["value"], cssClass, request.bundle[o["label"]], **kwargs) + self.after
-    return html
+        html.write(self.separator)
+      html.write(self.before)
+      html.write(elementRenderer.render(request, mapping, name, o["value"],
+                 cssClass, request.bundle[o["label"]], **kwargs))
+      html.write(self.after)
+    return html.getvalue()
 
 
 class SubmitRenderer(WidgetRenderer):
@@ -144,12 +146,61 @@ class SubmitListRenderer(OptionsListRenderer):
   def __init__(self, before = "", after = "", separator = ""):
     super(SubmitListRenderer,self).__init__(self.TYPE_SUBMIT,before,after,separator)
 
-class SelectRenderer(WidgetRenderer):
+def createSelectedSet(values):
+  """returns the list of selected C{values} as a C{frozenset}, or as the list
+  itself if they can not be hashed."""
+  try:
+    return frozenset(values)
+  except TypeError:
+    return values
+
+class OptionsRenderer(WidgetRenderer):
+  """Base class of the widgets rendering a list of options. The markup of
+  the options is built once by L{buildOptionMarkup} for each list of options,
+  field and L{ResourceBundle<pywebmvc.framework.resourcebundle.ResourceBundle>}
+  and kept as long as the list holds equal options, e.g. the values of an
+  L{EnumValidator<pywebmvc.framework.validate.EnumValidator>}. The options
+  are compared with a copy kept with the markup, so a list modified in place
+  gets new markup. When the options are those of a single validator,
+  passed as the C{optionsSource} attribute by
+  L{getOptions<pywebmvc.framework.render.form.MetadataRenderer.getOptions>},
+  the markup is kept for the validator instead, and used again while it lists
+  equal options, since an
+  L{EnumGeneratorValidator<pywebmvc.framework.validate.EnumGeneratorValidator>}
+  generates a new list for each request."""
+  OPTION_MARKUP_CACHE_SIZE = 100
+  """The number of option lists whose markup is kept by each renderer."""
+  def getOptionMarkup(self, request, name, options, source = None):
+    """returns the markup L{built<buildOptionMarkup>} for C{options}, listed
+    by the validator C{source} if given."""
+    cache = getattr(self, "optionMarkup", None)
+    if cache is None:
+      cache = self.optionMarkup = {}
+    if source is None:
+      #a list reusing the id of another is told apart by its options
+      key = (id(options), request.bundle, name)
+    else:
+      key = (source, request.bundle, name)
+    snapshot = [dict(option) for option in options]
+    entry = cache.get(key)
+    if entry is None or entry[0] != snapshot:
+      if len(cache) >= self.OPTION_MARKUP_CACHE_SIZE:
+        cache.clear()
+      entry = cache[key] = (snapshot,
+                            self.buildOptionMarkup(request, name, snapshot))
+    return entry[1]
+  def buildOptionMarkup(self, request, name, options):
+    """returns the list of the markup of each of the C{options} of the field
+    C{name}, in the form used by the renderer."""
+    raise NotImplementedError
+
+class SelectRenderer(OptionsRenderer):
   def __init__(self, multiSelect=False):
     self.multiSelect = multiSelect
   def renderSelect(self,request, mapping, name, value, cssClass, readOnly, **kwargs):
     options = kwargs["options"]
     del kwargs["options"]
+    source = kwargs.pop("optionsSource", None)
     html = '<select id="%s" name="%s"' % (name, name)
     if readOnly:
       html += ' disabled'
@@ -159,15 +210,35 @@ class SelectRenderer(WidgetRenderer):
       html += ' multiple="multiple"'
     html += self.renderAttributes(kwargs)
     html += '>' 
-    for option in options:
-      html += '<option value="%s"' % (option["value"])
-      if value and (
-         (isinstance(value,ListType) and option["value"] in value) or
-         (option["value"] == value)):
-        html += ' selected="selected"'
-      html += '>%s</option>' % (request.bundle[option["label"]])
+    markup = self.getOptionMarkup(request, name, options, source)
+    if not value:
+      html += "".join([unselected for (optionValue, unselected, selected)
+                       in markup])
+    else:
+      if isinstance(value,ListType):
+        values = createSelectedSet(value)
+      else:
+        values = (value,)
+      parts = []
+      for (optionValue, unselected, selected) in markup:
+        if optionValue in values:
+          parts.append(selected)
+        else:
+          parts.append(unselected)
+      html += "".join(parts)
     html += "</select>"
     return html
+  def buildOptionMarkup(self, request, name, options):
+    """the markup of each option is the tuple of its value and of its
+    unselected and selected markup."""
+    markup = []
+    for option in options:
+      label = request.bundle[option["label"]]
+      markup.append((option["value"],
+        '<option value="%s">%s</option>' % (option["value"], label),
+        '<option value="%s" selected="selected">%s</option>' % (
+          option["value"], label)))
+    return markup
   def renderNormal(self,request, mapping, name, value, cssClass, **kwargs):
     return self.renderSelect(request, mapping, name, value, cssClass, False, **kwargs)
   def renderReadOnly(self,request, mapping, name, value, cssClass, **kwargs):
@@ -175,30 +246,49 @@ class SelectRenderer(WidgetRenderer):
   
   
 
-class RadioRenderer(WidgetRenderer):
+class RadioRenderer(OptionsRenderer):
   def __init__(self, multiSelect=False, insertBreak=False):
     self.multiSelect = multiSelect
     self.insertBreak = insertBreak
   def renderNormal(self,request, mapping, name, value, cssClass, **kwargs):
+    options = kwargs["options"]
+    del kwargs["options"]
+    source = kwargs.pop("optionsSource", None)
+    markup = self.getOptionMarkup(request, name, options, source)
+    if value is None:
+      values = ()
+    elif isinstance(value,ListType):
+      values = createSelectedSet(value)
+    else:
+      values = (unicode(value),)
+    attributes = self.renderAttributes(kwargs)
+    parts = []
+    for (optionValue, input, checkedInput, label) in markup:
+      if optionValue in values:
+        parts.append(checkedInput)
+      else:
+        parts.append(input)
+      parts.append(attributes)
+      parts.append(label)
+    return "".join(parts)
+  def buildOptionMarkup(self, request, name, options):
+    """the markup of each option is the tuple of its value, of its input
+    unchecked and checked, which are followed by the attributes of the
+    widget, and of its label."""
     if self.multiSelect:
       type = 'checkbox'
     else:
       type = 'radio'
-    html = ""
-    options = kwargs["options"]
-    del kwargs["options"]
+    markup = []
     for option in options:
-      html += '<input type="%s" id="%s" name="%s" value="%s"' % (type,
+      input = '<input type="%s" id="%s" name="%s" value="%s"' % (type,
         name, name, htmlutil.escapeAttribute(option["value"]))
-      if value is not None and (
-         (isinstance(value,ListType) and option["value"] in value) or
-         (option["value"] == unicode(value))):
-        html += ' checked="checked"'
-      html += self.renderAttributes(kwargs)
-      html += '>&nbsp;<span onclick="this.previousSibling.previousSibling.click();" style="cursor: pointer;">%s</span>' % (request.bundle[option["label"]])
+      label = '>&nbsp;<span onclick="this.previousSibling.previousSibling.click();" style="cursor: pointer;">%s</span>' % (request.bundle[option["label"]])
       if self.insertBreak:
-        html += "<br>"
-    return html
+        label += "<br>"
+      markup.append((option["value"], input, input + ' checked="checked"',
+                     label))
+    return markup
 
 class MultilineRadioRenderer(RadioRenderer):
   def __init__(self):
@@ -8,6 +8,40 @@
 import re, types, sys
 from util import PyWebMvcObject
 from properties import Properties
+from instrument import instrument
+
+parameterRegex = re.compile(r"\{(0|[1-9][0-9]*)\}")
+
+class CompiledMessage(object):
+  """A message with its terms expanded and split around its C{{N}} parameters.
+  C{text} is the expanded message with the parameters left in place and
+  C{pieces} is the same message as a list of literal strings in which the
+  parameter positions listed in C{slots} as C{(position, N)} pairs are to be
+  filled in. The text is always C{unicode}: byte strings are decoded as
+  ISO-8859-1, the encoding of properties files."""
+  __slots__ = ("text", "pieces", "slots", "hasTerms")
+  def __init__(self, text, hasTerms):
+    if isinstance(text, str):
+      text = text.decode("iso-8859-1")
+    self.text = text
+    self.hasTerms = hasTerms
+    self.pieces = parameterRegex.split(text)
+    self.slots = []
+    for position in range(1, len(self.pieces), 2):
+      self.slots.append((position, int(self.pieces[position])))
+  def format(self, args):
+    """returns the message with the parameters in C{args} substituted. Parameters
+    without a corresponding argument are left in place."""
+    if not args or not self.slots:
+      return self.text
+    pieces = self.pieces[:]
+    numArgs = len(args)
+    for (position, n) in self.slots:
+      if n < numArgs:
+        pieces[position] = unicode(args[n])
+      else:
+        pieces[position] = "{%i}" % n
+    return "".join(pieces)
 
 class ResourceBundle(PyWebMvcObject):
   """Extends a L{Properties<properties.Properties>} file to allow for
@@ -27,21 +61,28 @@ class ResourceBundle(PyWebMvcObject):
     message.goodIdea=This is a {0} {1} ${term.idea}.
 
   >>> bundle["term.foo"]
-  'Foo'
+  u'Foo'
   >>> bundle["term.modifiedIdea"]
-  '{1} idea'
+  u'{1} idea'
   >>> bundle.getMessage("message.bar","Silly")
-  'This is my Silly Foo.'
+  u'This is my Silly Foo.'
   >>> bundle.getMessage("message.badIdea","really", "bad")
-  'This is a really bad idea.'
+  u'This is a really bad idea.'
   >>> bundle.getMessage("message.fineIdea","perfectly",
   ...                   bundle.getMessage("term.modifiedIdea","fine"))
-  'This is a perfectly fine idea.'
+  u'This is a perfectly fine idea.'
   >>> bundle.getMessage("message.goodIdea","much", "better")
-  'This is a much better idea.'
+  u'This is a much better idea.'
+
+  Each message is compiled into a L{CompiledMessage} the first time it is read
+  and cached, so later reads do not repeat the term expansion or rescan the
+  message for parameters. The cache is discarded whenever properties are added
+  or set. Terms that are still unknown after expansion are resolved against
+  the parameter map of each read, as before.
   """
   def __init__(self, propertiesFile = None):
     self.props = Properties()
+    self.compiled = {}
     if propertiesFile:
       self.addPropertiesFile(propertiesFile)
   def addPropertiesFile(self, propertiesFile):
@@ -50,6 +91,13 @@ class ResourceBundle(PyWebMvcObject):
     else:
       self.props.load(propertiesFile)
     self.resolve_terms()
+    self.compiled = {}
+  def addProperties(self, values):
+    """adds the properties in the dictionary C{values}, as read from a
+    properties file by L{readprops<properties.readprops>}."""
+    self.props.update(values)
+    self.resolve_terms()
+    self.compiled = {}
   def addPropertiesFiles(self, propertiesFiles):
     for f in propertiesFiles:
       self.addPropertiesFile(f)
@@ -105,24 +153,55 @@ class ResourceBundle(PyWebMvcObject):
       except KeyError:
         pass
     return msg
+  def compile(self, key):
+    """returns the cached L{CompiledMessage} for C{key}, compiling it on first
+    use. Raises L{KeyError} when there is no such message."""
+    try:
+      return self.compiled[key]
+    except KeyError:
+      if not self.props.has_key(key):
+        raise KeyError(key)
+      text = self.replaceTerms(self.props[key])
+      message = CompiledMessage(text, self.has_term(text))
+      self.compiled[key] = message
+      return message
   def keys(self):
     return self.props.keys()
   def has_key(self, key):
     return self.props.has_key(key)
   def getItemWithMap(self, key, map = {}):
-    if self.props.has_key(key):
-      return self.replaceTerms(self.props[key],map)
-    else:
-      raise KeyError(key)
+    span = instrument.start("bundle.lookup")
+    try:
+      message = self.compile(key)
+      if map and message.hasTerms:
+        return self.replaceTerms(message.text, map)
+      else:
+        return message.text
+    finally:
+      span.stop()
   def __getitem__(self, key):
-    return self.getItemWithMap(key)
+    span = instrument.start("bundle.lookup")
+    try:
+      try:
+        return self.compiled[key].text
+      except KeyError:
+        return self.compile(key).text
+    finally:
+      span.stop()
   def __setitem__(self, key, value):
     self.props[key] = value
+    self.compiled = {}
 
   def getMessageWithMap(self, key, paramList, paramMap):
-    msg = self.getItemWithMap(key, paramMap)
-    msg = self.substituteParams(msg, paramList)
-    return msg
+    span = instrument.start("bundle.lookup")
+    try:
+      message = self.compile(key)
+      if paramMap and message.hasTerms:
+        msg = self.replaceTerms(message.text, paramMap)
+        return self.substituteParams(msg, paramList)
+      return message.format(paramList)
+    finally:
+      span.stop()
 
   def getMessage(self, key, *args, **kwargs):
     return self.getMessageWithMap(key, args, kwargs)
@@ -145,9 +224,8 @@ class ResourceBundle(PyWebMvcObject):
       #str:ok
       arrayKey = key + "." + str(count)
       if(not self.props.has_key(arrayKey)): break
-      item = self.replaceTerms(self.props[arrayKey], paramMap)
-      item = self.substituteParams(item, messageParams)
-      arrayResult.append(item)
+      arrayResult.append(self.getMessageWithMap(arrayKey, messageParams,
+                                                paramMap))
       count += 1
     return arrayResult
 
@@ -0,0 +1,134 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Lazy retrieval of the session of a request."""
+import time
+from util import PyWebMvcObject
+
+class LazySession(PyWebMvcObject):
+  """Stands in for the session of a request as C{req.session}. The session is
+  only retrieved (and locked) when it is first used, so requests that do not
+  use it neither lock it nor write it back to the session store.
+
+  C{sessionFactory} is called with the locking flag (see L{setLocking}) to
+  retrieve the session, e.g. a mod_python C{Session}. The L{LazySession}
+  provides the dictionary interface and the session methods (C{id()},
+  C{is_new()}, C{invalidate()}, ...) of the session it stands in for.
+
+  L{save} writes the session immediately, as before. The session is also
+  written by L{commit} at the end of the request if it has been modified
+  through this object since it was last saved. Values that are modified in
+  place (e.g. a list stored in the session) are not noticed: call L{save}
+  after modifying them. A session that is only read is written back when it
+  is new or when half of its timeout has passed since it was last written, to
+  keep it from expiring while it is in use.
+  """
+  TOUCH_KEY = "_pywebmvcSaved"
+  """The key under which the time the session was last written is kept. It is
+  hidden from the dictionary interface."""
+  def __init__(self, sessionFactory):
+    self.sessionFactory = sessionFactory
+    self.session = None
+    self.locking = True
+    self.dirty = False
+    self.invalidated = False
+    self.saved = None
+  def setLocking(self, locking):
+    """sets whether the session is locked for the rest of the request when it
+    is retrieved. Requests from the same browser are handled one at a time
+    while the session is locked. Has no effect once the session has been
+    retrieved."""
+    self.locking = locking
+  def isLoaded(self):
+    """returns whether the session has been retrieved."""
+    return self.session is not None
+  def getSession(self):
+    """returns the session, retrieving it on first use."""
+    if self.session is None:
+      self.session = self.sessionFactory(self.locking)
+      self.saved = self.session.get(self.TOUCH_KEY)
+    return self.session
+  def __getattr__(self, name):
+    """gives access to the rest of the interface of the session."""
+    if name.startswith("__") or name in ("session", "sessionFactory"):
+      raise AttributeError, name
+    return getattr(self.getSession(), name)
+  def __getitem__(self, key):
+    if key == self.TOUCH_KEY:
+      raise KeyError, key
+    return self.getSession()[key]
+  def __setitem__(self, key, value):
+    self.getSession()[key] = value
+    self.dirty = True
+  def __delitem__(self, key):
+    if key == self.TOUCH_KEY:
+      raise KeyError, key
+    del self.getSession()[key]
+    self.dirty = True
+  def has_key(self, key):
+    return key != self.TOUCH_KEY and self.getSession().has_key(key)
+  __contains__ = has_key
+  def get(self, key, default = None):
+    if self.has_key(key):
+      return self.getSession()[key]
+    return default
+  def setdefault(self, key, default = None):
+    if not self.has_key(key):
+      self[key] = default
+    return self.getSession()[key]
+  def pop(self, key, *args):
+    if self.has_key(key):
+      self.dirty = True
+      return self.getSession().pop(key)
+    if args:
+      return args[0]
+    raise KeyError, key
+  def keys(self):
+    return [key for key in self.getSession().keys() if key != self.TOUCH_KEY]
+  def values(self):
+    session = self.getSession()
+    return [session[key] for key in self.keys()]
+  def items(self):
+    session = self.getSession()
+    return [(key, session[key]) for key in self.keys()]
+  def __iter__(self):
+    return iter(self.keys())
+  def __len__(self):
+    return len(self.keys())
+  def update(self, values):
+    self.getSession().update(values)
+    self.dirty = True
+  def clear(self):
+    session = self.getSession()
+    for key in self.keys():
+      del session[key]
+    self.dirty = True
+  def save(self):
+    """writes the session to the session store."""
+    session = self.getSession()
+    self.saved = time.time()
+    session[self.TOUCH_KEY] = self.saved
+    session.save()
+    self.dirty = False
+  def invalidate(self):
+    """invalidates the session. It will not be written back by L{commit}."""
+    self.getSession().invalidate()
+    self.invalidated = True
+    self.dirty = False
+  def needsSave(self):
+    """returns whether L{commit} should write the session."""
+    if self.session is None or self.invalidated:
+      return False
+    if self.dirty or self.saved is None:
+      return True
+    return time.time() - self.saved > self.session.timeout() / 2
+  def commit(self):
+    """writes the session if it has been retrieved and modified, see
+    L{needsSave}. Called at the end of the request."""
+    if self.needsSave():
+      self.save()
+  def unlock(self):
+    """unlocks the session if it has been retrieved."""
+    if self.session is not None:
+      self.session.unlock()
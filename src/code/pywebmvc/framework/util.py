@@ -1,6 +1,6 @@
 """Utilities used by pywebmvc."""
 
-import weakref, inspect, types
+import weakref, inspect, types, os, re
 from copy import copy
 from UserDict import UserDict
 
@@ -57,9 +57,72 @@ class AutoReloader(object):
     def change_class(self, new_class):
         self.__class__ = new_class
 
-class PyWebMvcObject(AutoReloader):
-  """Base class for all PyWebMVC objects."""
-  pass
+AUTO_RELOAD = os.environ.get("PYWEBMVC_AUTORELOAD", "on").lower() not in \
+              ("off", "false", "no", "0")
+"""Whether L{PyWebMvcObject} tracks its instances so that they are updated when
+their class is reloaded. This is read once, at import time, from the
+C{PYWEBMVC_AUTORELOAD} environment variable and defaults to on. Production
+servers should set it to C{off} (e.g. in the environment apache is started
+with) since tracking keeps a weak reference to every object ever created."""
+
+if AUTO_RELOAD:
+  class PyWebMvcObject(AutoReloader):
+    """Base class for all PyWebMVC objects."""
+    pass
+else:
+  class PyWebMvcObject(object):
+    """Base class for all PyWebMVC objects. Instances are not tracked because
+    L{AUTO_RELOAD} is off. The empty C{__slots__} allows subclasses that
+    declare their own C{__slots__} to be created without a C{__dict__}."""
+    __slots__ = ()
+
+class SlottedObject(PyWebMvcObject):
+  """Base class for the PyWebMVC objects declaring C{__slots__} that may be
+  pickled, e.g. when they are kept in the session. Python can only pickle
+  them with protocols 0 and 1 through C{__getstate__}, which returns the
+  values of the slots declared by the class and its bases along with the
+  C{__dict__} the instance may also have."""
+  __slots__ = ()
+  def __getstate__(self):
+    state = dict(getattr(self, "__dict__", {}))
+    for cls in type(self).__mro__:
+      for name in cls.__dict__.get("__slots__", ()):
+        if hasattr(self, name):
+          state[name] = getattr(self, name)
+    return state
+  def __setstate__(self, state):
+    for (name, value) in state.items():
+      setattr(self, name, value)
+
+def overrides(obj, baseClass, methodName):
+  """Returns whether the class of C{obj} replaces the implementation of the
+  method C{methodName} found in C{baseClass}. Used to skip work that is only
+  safe when the default behavior of a method is in effect."""
+  return getattr(obj.__class__, methodName).im_func is not \
+         getattr(baseClass, methodName).im_func
+
+propertyPathRegex = re.compile(r"^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$")
+def createPropertyGetter(property):
+  """returns a function returning the value of the expression
+  C{item.<property>} for an item. Paths of attribute names such as
+  C{address.city} are read with C{getattr}, other expressions are compiled
+  once and evaluated for each item."""
+  if propertyPathRegex.match(property):
+    names = property.split(".")
+    if len(names) == 1:
+      name = names[0]
+      def getter(item):
+        return getattr(item, name)
+    else:
+      def getter(item):
+        for name in names:
+          item = getattr(item, name)
+        return item
+  else:
+    code = compile("item.%s" % property, "<property %s>" % property, "eval")
+    def getter(item):
+      return eval(code, {}, {"item" : item})
+  return getter
 
 class MultiDictValue(object):
   """Tracks the values stored for a given key in the L{MultiDict}."""
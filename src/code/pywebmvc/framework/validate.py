@@ -4,13 +4,22 @@
 #  END OF COPYRIGHT NOTICE 
 """Validation functions and utilities.
 """
-import re, types
-from core import ActionError, ActionErrors
-from util import PyWebMvcObject
+import re, time, types
+from core import ActionError, ActionErrors, \
+                 PyWebMvcInvalidConfigurationException
+from util import PyWebMvcObject, overrides
+from instrument import instrument
+
+def validateNothing(request, mapping, form, fieldName):
+  """The validation function of fields, types and forms without any
+  validation. Always returns an empty L{ActionErrors}."""
+  return ActionErrors()
 
 def createMultiValidator(*args):
   """returns a function which calls to all of the validation functions
   passed as C{args} and aggregates the errors returned."""
+  if not args:
+    return validateNothing
   def validator(request, mapping, form, fieldName):
     errors = ActionErrors()
     for f in args:
@@ -28,10 +37,14 @@ class EnumValidatorBase(PyWebMvcObject):
     assert("Override")
   def getValues(self, req):
     return map(lambda val: val["value"], self.getValueLabelList(req))
+  def getValueSet(self, req):
+    """returns the legal values as a C{frozenset}, or as a list if they can
+    not be hashed."""
+    return createValueSet(self.getValueLabelList(req))
   def __call__(self, request, mapping, form, fieldName):
     errors = ActionErrors()
     if form.has_key(fieldName) and len(form[fieldName]) > 0:
-      validValues = self.getValues(request)
+      validValues = self.getValueSet(request)
       value = form[fieldName]
       if isinstance(value, types.ListType):
         index = 0
@@ -46,33 +59,117 @@ class EnumValidatorBase(PyWebMvcObject):
     return errors
   
 
+def createValueSet(valueLabelList):
+  """returns the values of C{valueLabelList} as a C{frozenset}, or as a list
+  if they can not be hashed."""
+  values = [val["value"] for val in valueLabelList]
+  try:
+    return frozenset(values)
+  except TypeError:
+    return values
+
 class EnumValidator(EnumValidatorBase):
   """Validates that the value passed in is one of the values
   passed to the constructor."""
   def __init__(self, values, errorMsgKey):
     super(EnumValidator,self).__init__( errorMsgKey)
     self.__values = values
+    self.__valueSet = None
   def getValueLabelList(self, req):
     return self.__values
+  def getValueSet(self, req):
+    if self.__valueSet is None:
+      self.__valueSet = createValueSet(self.__values)
+    return self.__valueSet
+
+
+class EnumValuesCache(PyWebMvcObject):
+  """Base class of the caches of the values returned by the generation
+  function of an L{EnumGeneratorValidator}. This implementation does not
+  cache: the function is called each time the values are needed."""
+  def getValues(self, req, validator, generate):
+    """returns the values of C{validator} for C{req}, calling C{generate}
+    with C{req} to compute them when they are not cached."""
+    return generate(req)
+
+class RequestEnumValuesCache(EnumValuesCache):
+  """Keeps the values for the rest of the request, in the C{enumValues}
+  attribute of the request, so that validating and rendering a field call
+  its generation function once. This is the default cache."""
+  def getValues(self, req, validator, generate):
+    cache = getattr(req, "enumValues", None)
+    if cache is None:
+      cache = req.enumValues = {}
+    if not cache.has_key(validator):
+      cache[validator] = generate(req)
+    return cache[validator]
 
+class TimedEnumValuesCache(EnumValuesCache):
+  """Keeps the values for C{timeout} seconds across requests. By default the
+  same values are used for every request: when they depend on the request,
+  C{keyFunction} must return the key (e.g. the language or user) the values
+  are cached under for a request. At most C{size} values are kept: the cache
+  is emptied when it is full."""
+  def __init__(self, timeout, keyFunction = None, size = 1000):
+    self.timeout = timeout
+    self.keyFunction = keyFunction
+    self.size = size
+    self.entries = {}
+  def getValues(self, req, validator, generate):
+    key = validator
+    if self.keyFunction:
+      key = (validator, self.keyFunction(req))
+    now = time.time()
+    entry = self.entries.get(key)
+    if entry is None or entry[0] <= now:
+      if len(self.entries) >= self.size:
+        self.entries.clear()
+      entry = self.entries[key] = (now + self.timeout, generate(req))
+    return entry[1]
+
+def createEnumValuesCache(spec):
+  """creates the L{EnumValuesCache} for the C{cache} attribute of an
+  C{enumgenerator} validation: C{none}, C{request} (the default) or a number
+  of seconds."""
+  if not spec or spec == "request":
+    return RequestEnumValuesCache()
+  elif spec == "none":
+    return EnumValuesCache()
+  try:
+    return TimedEnumValuesCache(float(spec))
+  except ValueError:
+    raise PyWebMvcInvalidConfigurationException, \
+      "enumgenerator cache '%s' is not supported" % spec
 
 class EnumGeneratorValidator(EnumValidatorBase):
   """Validates that the value passed in is one of the values
-  returned by the C{generationFunction}."""
-  def __init__(self, generationFunction, errorMsgKey):
+  returned by the C{generationFunction}. The values are kept in the
+  L{EnumValuesCache} C{cache}, by default for the duration of the
+  request."""
+  def __init__(self, generationFunction, errorMsgKey, cache = None):
     super(EnumGeneratorValidator,self).__init__(errorMsgKey)
     self.generator = generationFunction
+    if cache is None:
+      cache = RequestEnumValuesCache()
+    self.cache = cache
+  def generateValues(self, req):
+    """returns the values generated for C{req} and their L{createValueSet}."""
+    valueLabelList = self.generator(req)
+    return (valueLabelList, createValueSet(valueLabelList))
   def getValueLabelList(self, req):
-    return self.generator(req)
+    return self.cache.getValues(req, self, self.generateValues)[0]
+  def getValueSet(self, req):
+    return self.cache.getValues(req, self, self.generateValues)[1]
 
 
 def createEnumValidator(values, errorMsgKey):
   """Creates an L{EnumValidator}."""
   return EnumValidator(values, errorMsgKey)
 
-def createEnumGeneratorValidator(generationFunction, errorMsgKey):
+def createEnumGeneratorValidator(generationFunction, errorMsgKey,
+                                 cache = None):
   """Creates an L{EnumGeneratorValidator}."""
-  return EnumGeneratorValidator(generationFunction, errorMsgKey)
+  return EnumGeneratorValidator(generationFunction, errorMsgKey, cache)
 
 def createRegexValidator(regexStr, errorMsgKey):
   """Creates a validation function that validate the value matches the supplied
@@ -203,76 +300,139 @@ def requiredError(req, mapping, fieldName, fieldMetadata):
 
 def validateRequired(req, mapping, value, fieldName,  fieldMetadata):
   """validates the field to ensure required values are provided."""
-  errors = ActionErrors()
   if fieldMetadata.isRequired(req, mapping):
-    if isinstance(value, types.ListType):
-      if not value:
-        e = requiredError(req,mapping,fieldName,fieldMetadata)
-        e.index = 0
-        errors.add(e)
-      else:
-        index = 0
-        for v in value:
-          if fieldMetadata.getType(req, mapping).input == "file":
-            try:
-              if not v.file.read(1):
-                e = requiredError(req, mapping, fieldName,fieldMetadata)
-                e.index = index
-                errors.add(e)
-            finally:
-              v.file.seek(0)
-          elif not v:
-            e = requiredError(req, mapping, fieldName,fieldMetadata)
-            e.index = index
-            errors.add(e)
-          index += 1
-    elif fieldMetadata.getType(req, mapping).input == "checkbox":
-      if not req.form.has_key(fieldName+"__onpage"):
-        e = requiredError(req, mapping, fieldName,fieldMetadata)
-        e.index = 0
-        errors.add(e)
-    if fieldMetadata.getType(req, mapping).input == "file":
-      try:
-        if not value.file.read(1):
+    return validateRequiredInput(req, mapping, value, fieldName, fieldMetadata,
+                                 fieldMetadata.getType(req, mapping).input)
+  return ActionErrors()
+
+def validateRequiredInput(req, mapping, value, fieldName, fieldMetadata,
+                          input):
+  """validates that a value is provided for the required field C{fieldName}
+  having the input type C{input}."""
+  errors = ActionErrors()
+  if isinstance(value, types.ListType):
+    if not value:
+      e = requiredError(req,mapping,fieldName,fieldMetadata)
+      e.index = 0
+      errors.add(e)
+    else:
+      index = 0
+      for v in value:
+        if input == "file":
+          try:
+            if not v.file.read(1):
+              e = requiredError(req, mapping, fieldName,fieldMetadata)
+              e.index = index
+              errors.add(e)
+          finally:
+            v.file.seek(0)
+        elif not v:
           e = requiredError(req, mapping, fieldName,fieldMetadata)
+          e.index = index
           errors.add(e)
-      finally:
-        value.file.seek(0)
-    elif not value:
+        index += 1
+  elif input == "checkbox":
+    if not req.form.has_key(fieldName+"__onpage"):
       e = requiredError(req, mapping, fieldName,fieldMetadata)
       e.index = 0
       errors.add(e)
+  if input == "file" and not isinstance(value, types.ListType):
+    try:
+      if not value.file.read(1):
+        e = requiredError(req, mapping, fieldName,fieldMetadata)
+        errors.add(e)
+    finally:
+      value.file.seek(0)
+  elif not value:
+    e = requiredError(req, mapping, fieldName,fieldMetadata)
+    e.index = 0
+    errors.add(e)
   return errors
 
+def compileFieldValidation(fieldMetadata):
+  """returns a function validating the field C{fieldMetadata} as
+  L{validateForm} does. The function takes the request, mapping, form and
+  the L{ActionErrors} to add the errors to and returns whether the field has
+  errors. The input type of the field and its type's validation are looked
+  up once here unless the class of C{fieldMetadata} overrides C{getType},
+  and validations which never fail are skipped. Whether the field is
+  required, its default value and whether it is a list are read on each
+  call, so they can be changed at any time."""
+  from metadata import FieldMetadata
+  fieldName = fieldMetadata.id
+  requiredOverridden = overrides(fieldMetadata, FieldMetadata, "isRequired")
+  typeOverridden = overrides(fieldMetadata, FieldMetadata, "getType")
+  if typeOverridden:
+    input = None
+    typeValidate = None
+  else:
+    input = fieldMetadata.getType().input
+    typeValidate = fieldMetadata.getType().validate
+    if typeValidate is validateNothing:
+      typeValidate = False
+  def validateField(req, mapping, form, errors):
+    value = None
+    if form.has_key(fieldName):
+      value = form[fieldName]
+    if requiredOverridden:
+      required = fieldMetadata.isRequired(req, mapping)
+    else:
+      required = fieldMetadata.required
+    if required:
+      if typeOverridden:
+        fieldInput = fieldMetadata.getType(req, mapping).input
+      else:
+        fieldInput = input
+      reqErrors = validateRequiredInput(req, mapping, value, fieldName,
+                                        fieldMetadata, fieldInput)
+      if reqErrors:
+        defaultValue = fieldMetadata.defaultValue
+        if not defaultValue:
+          errors.addAll(reqErrors)
+        elif fieldMetadata.list:
+          form[fieldName] = [defaultValue]
+        else:
+          form[fieldName] = defaultValue
+        return True
+    if typeValidate is None:
+      fieldErrors = fieldMetadata.getType(req, mapping).validate(req, mapping,
+                                                                form, fieldName)
+    elif typeValidate:
+      fieldErrors = typeValidate(req, mapping, form, fieldName)
+    else:
+      fieldErrors = None
+    if not fieldErrors and fieldMetadata.validate is not validateNothing:
+      fieldErrors = fieldMetadata.validate(req, mapping, form, fieldName)
+    if fieldErrors:
+      errors.addAll(fieldErrors)
+      return True
+    return False
+  return validateField
+
+def compileValidation(formMetadata):
+  """returns the validation program of C{formMetadata}: a tuple of the
+  L{compileFieldValidation} functions of its fields in the order they are
+  validated. See L{FormMetadata.getValidationProgram<metadata>}."""
+  return tuple([compileFieldValidation(formMetadata.getFieldMetadata(name))
+                for name in formMetadata.getFieldNames()])
+
 def validateForm(req, mapping):
   """Validates the entire form and returns an L{ActionErrors} object with the
   results. If no error is found, the C{ActionErrors} object is empty.  Fields
   are validated before the form-level validation is performed. Form-level
   validation is only performed when all fields are valid."""
-  errors = ActionErrors()
-  hasFieldErrors = False
-  for fieldName in mapping.getFormMetadata(req).getFieldNames():
-    value = None
-    if req.form.has_key(fieldName):
-      value = req.form[fieldName]
-    fieldMetadata = mapping.getFormMetadata(req).getFieldMetadata(fieldName)
-    reqErrors = validateRequired(req, mapping, value, fieldName,  fieldMetadata)
-    if reqErrors:
-      hasFieldErrors = True
-    if reqErrors and fieldMetadata.defaultValue:
-      if fieldMetadata.list:
-        req.form[fieldName] = [fieldMetadata.defaultValue]
-      else:
-        req.form[fieldName] = fieldMetadata.defaultValue
-    else:
-      errors.addAll(reqErrors)
-    if not reqErrors:
-      fieldErrors = fieldMetadata.getType(req, mapping).validate(req, mapping, req.form, fieldName)
-      if not fieldErrors:
-        fieldErrors = fieldMetadata.validate(req, mapping, req.form, fieldName)
-      if fieldErrors:
+  span = instrument.start("validate")
+  try:
+    formMetadata = mapping.getFormMetadata(req)
+    form = req.form
+    errors = ActionErrors()
+    hasFieldErrors = False
+    for validateField in formMetadata.getValidationProgram():
+      if validateField(req, mapping, form, errors):
         hasFieldErrors = True
-      errors.addAll(fieldErrors)
-  if not hasFieldErrors:
-    errors.addAll(mapping.getFormMetadata(req).validate(req, mapping, req.form, ActionError.GLOBAL))
-  return errors
+    if not hasFieldErrors:
+      errors.addAll(formMetadata.validate(req, mapping, form,
+                                          ActionError.GLOBAL))
+    return errors
+  finally:
+    span.stop()
@@ -0,0 +1,628 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""WSGI integration for pywebmvc.
+
+The same configuration, actions and pages that run under mod_python can be
+served by any WSGI server (threaded or multi-process) with
+L{WsgiApplication}::
+
+  from pywebmvc.framework.wsgi import WsgiApplication
+  application = WsgiApplication({
+    "pyWebMvcConfig" : "/home/foo/myapp/config.xml",
+    "pyWebMvcExtension" : "ptz",
+  })
+
+The options are the ones otherwise given with C{PythonOption} in the apache
+configuration. Each request is presented to the framework as a
+L{WsgiRequest}, which provides the part of the mod_python request API used by
+pywebmvc.
+"""
+import os, re, sys, time, cgi, threading, binascii, hmac, Cookie, cPickle
+from BaseHTTPServer import BaseHTTPRequestHandler
+from types import *
+from util import PyWebMvcObject
+from handler import ActionHandlerBase
+try:
+  import fcntl
+except ImportError:
+  #no locking across processes
+  fcntl = None
+
+OK = 0
+DONE = -2
+HTTP_MOVED_TEMPORARILY = 302
+
+class ServerReturn(Exception):
+  """The WSGI counterpart of mod_python's C{SERVER_RETURN}: raised to end the
+  request with the http status C{status}, or with the status already set on
+  the request if it is L{DONE}."""
+  def __init__(self, status):
+    Exception.__init__(self, status)
+    self.status = status
+
+def sendRedirect(req, path):
+  """sends a temporary redirect to C{path} and ends the request. The WSGI
+  counterpart of L{apache.sendRedirect}."""
+  if req.headersSent():
+    raise IOError, "Redirect after headers have been sent."
+  #str:ok
+  req.headers_out["Location"] = str(path)
+  req.status = HTTP_MOVED_TEMPORARILY
+  raise ServerReturn(DONE)
+
+class Table(PyWebMvcObject):
+  """A case-insensitive mapping of http headers which may hold several values
+  for a name, like the mod_python table."""
+  def __init__(self):
+    self.headers = []
+  def __find(self, name):
+    name = name.lower()
+    return [i for i in range(len(self.headers))
+            if self.headers[i][0].lower() == name]
+  def add(self, name, value):
+    """adds a value for C{name} without replacing the existing ones."""
+    self.headers.append((name, value))
+  def __setitem__(self, name, value):
+    del self[name]
+    self.add(name, value)
+  def __getitem__(self, name):
+    found = self.__find(name)
+    if not found:
+      raise KeyError, name
+    return self.headers[found[0]][1]
+  def __delitem__(self, name):
+    found = self.__find(name)
+    found.reverse()
+    for i in found:
+      del self.headers[i]
+  def has_key(self, name):
+    return len(self.__find(name)) > 0
+  __contains__ = has_key
+  def get(self, name, default = None):
+    if self.has_key(name):
+      return self[name]
+    return default
+  def keys(self):
+    return [name for (name, value) in self.headers]
+  def items(self):
+    return self.headers[:]
+
+class FieldStorage(PyWebMvcObject):
+  """The form data of a WSGI request. Provides the same dictionary style
+  interface as the mod_python L{FieldStorage<apache.FieldStorage>}: values are
+  decoded with the charset of the form, fields with several values are
+  returned as lists and fields can be set and deleted. Uploaded files are
+  returned as the C{cgi} field, which has C{file} and C{filename} attributes.
+  The posted values of a field are only decoded when it is first read, so a
+  field that can not be decoded only fails the lookups of that field.
+  """
+  def __init__(self, req = None, keep_blank_values=0, strict_parsing=0, defaultCharset = None, initialValues = None):
+    if defaultCharset:
+      self.defaultCharset = defaultCharset
+    elif req:
+      self.defaultCharset = req.charset
+    else:
+      self.defaultCharset = "utf-8"
+    self.values = {}
+    self.decoded = {}
+    self.names = []
+    self.postedCharset = None
+    if req is not None:
+      self.read(req, keep_blank_values, strict_parsing)
+    if initialValues and hasattr(initialValues, "keys"):
+      for key in initialValues.keys():
+        self[key] = initialValues[key]
+    elif initialValues:
+      for (key, value) in initialValues:
+        self[key] = value
+    self.original = (self.copyValues(), self.names[:])
+  def read(self, req, keep_blank_values, strict_parsing):
+    """parses the query string and the body of the request."""
+    environ = req.environ.copy()
+    if environ.get("REQUEST_METHOD", "GET") != "POST":
+      #the body is not read and cgi takes the query string from the environ
+      environ["REQUEST_METHOD"] = "GET"
+    form = cgi.FieldStorage(fp=environ.get("wsgi.input"), environ=environ,
+                            keep_blank_values=keep_blank_values,
+                            strict_parsing=strict_parsing)
+    items = form.list or []
+    for item in items:
+      if item.name == "_charset_":
+        self.postedCharset = item.value
+    for item in items:
+      if item.name == "_charset_":
+        continue
+      if item.filename:
+        self.__add(item.name, item)
+      else:
+        self.__add(item.name, item.value)
+  def copyValues(self):
+    values = {}
+    for key in self.values.keys():
+      values[key] = self.values[key][:]
+    return values
+  def __add(self, key, value):
+    """adds C{value}, a posted byte string, a decoded value or an uploaded
+    file, to the values of the field C{key}."""
+    if not self.values.has_key(key):
+      self.values[key] = []
+      self.names.append(key)
+    self.values[key].append(value)
+    if self.decoded.has_key(key):
+      del self.decoded[key]
+  def __delitem__(self, key):
+    if key == "_charset_":
+      self.postedCharset = None
+      self.decoded = {}
+    elif self.values.has_key(key):
+      del self.values[key]
+      self.names.remove(key)
+      if self.decoded.has_key(key):
+        del self.decoded[key]
+  def __setitem__(self, key, value):
+    """Dictionary style index setting."""
+    del self[key]
+    if isinstance(value, NoneType):
+      return
+    if isinstance(value, StringTypes):
+      self.__add(key, self.decode(self.encode(value)))
+    elif isinstance(value, ListType) or isinstance(value, TupleType):
+      for v in value:
+        if isinstance(v, StringTypes):
+          self.__add(key, self.decode(self.encode(v)))
+    else:
+      raise TypeError, "invalid type for set: strings or sequences of strings"
+  def getCharset(self):
+    if self.postedCharset:
+      return self.postedCharset
+    return self.defaultCharset
+  def decode(self, value):
+    if not isinstance(value,StringTypes):
+      value = unicode(value)
+    value = value.decode(self.getCharset())
+    return value
+  def encode(self, value):
+    if not isinstance(value,StringTypes):
+      value = unicode(value)
+    value = value.encode(self.getCharset())
+    return value
+  def __getitem__(self, key):
+    """Dictionary style indexing."""
+    try:
+      found = self.decoded[key]
+    except KeyError:
+      found = []
+      for value in self.values[key]:
+        if isinstance(value, str):
+          value = self.decode(value)
+        found.append(value)
+      self.decoded[key] = found
+    if len(found) == 1:
+      return found[0]
+    else:
+      return found[:]
+  def get(self, key, default = None):
+    if self.has_key(key):
+      return self[key]
+    return default
+  def has_key(self, key):
+    """Dictionary style membership test."""
+    if key == "_charset_":
+      return self.postedCharset is not None
+    return self.values.has_key(key)
+  __contains__ = has_key
+  def keys(self):
+    """Dictionary style keys() method."""
+    return self.names[:]
+  def __len__(self):
+    return len(self.names)
+  def __unicode__(self):
+    result = u""
+    for key in self.keys():
+      result += u"%s=%s," % (key, self[key])
+    return result
+  def __str__(self):
+    return unicode(self).encode("utf-8")
+  def reset(self):
+    (values, names) = self.original
+    self.values = values
+    self.decoded = {}
+    self.names = names
+    self.original = (self.copyValues(), self.names[:])
+
+class MemorySessionStore(PyWebMvcObject):
+  """Keeps the sessions in the memory of the process. Use this store with a
+  threaded server (or a single process); the processes of a multi-process
+  server do not see each other's sessions, use L{FileSessionStore} instead.
+  The values of a session are pickled when it is saved, as they would be by
+  mod_python."""
+  def __init__(self, purgeInterval = 300):
+    self.sessions = {}
+    self.locks = {}
+    self.mutex = threading.Lock()
+    self.purgeInterval = purgeInterval
+    self.lastPurge = time.time()
+  def lock(self, id):
+    self.mutex.acquire()
+    try:
+      #the lock of an id and the number of requests holding or waiting for
+      #it, which is forgotten once there are none
+      entry = self.locks.get(id)
+      if entry is None:
+        entry = self.locks[id] = [threading.Lock(), 0]
+      entry[1] += 1
+    finally:
+      self.mutex.release()
+    entry[0].acquire()
+  def unlock(self, id):
+    self.mutex.acquire()
+    try:
+      entry = self.locks.get(id)
+      if entry:
+        entry[1] -= 1
+        if not entry[1]:
+          del self.locks[id]
+    finally:
+      self.mutex.release()
+    if entry:
+      entry[0].release()
+  def load(self, id, timeout):
+    """returns the values saved for session C{id} or C{None} if there is no
+    such session or it has not been accessed for C{timeout} seconds."""
+    self.mutex.acquire()
+    try:
+      if not self.sessions.has_key(id):
+        return None
+      (accessed, data) = self.sessions[id]
+      if accessed + timeout < time.time():
+        del self.sessions[id]
+        return None
+      self.sessions[id] = (time.time(), data)
+    finally:
+      self.mutex.release()
+    return cPickle.loads(data)
+  def save(self, id, values, timeout):
+    data = cPickle.dumps(values, 2)
+    self.mutex.acquire()
+    try:
+      self.sessions[id] = (time.time(), data)
+      if self.lastPurge + self.purgeInterval < time.time():
+        self.purge(timeout)
+    finally:
+      self.mutex.release()
+  def delete(self, id):
+    self.mutex.acquire()
+    try:
+      if self.sessions.has_key(id):
+        del self.sessions[id]
+    finally:
+      self.mutex.release()
+  def purge(self, timeout):
+    """removes the expired sessions. Called with the mutex held."""
+    now = time.time()
+    self.lastPurge = now
+    for id in self.sessions.keys():
+      if self.sessions[id][0] + timeout < now:
+        del self.sessions[id]
+
+class FileSessionStore(MemorySessionStore):
+  """Keeps each session in a file of the directory C{directory} so that it is
+  shared by all the processes of a multi-process server. Sessions are locked
+  across processes with C{fcntl} where it is available."""
+  def __init__(self, directory, purgeInterval = 300):
+    super(FileSessionStore, self).__init__(purgeInterval)
+    self.directory = directory
+    self.lockFiles = {}
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+  def getFileName(self, id):
+    return os.path.join(self.directory, "pysid-%s" % id)
+  def lock(self, id):
+    super(FileSessionStore, self).lock(id)
+    if fcntl:
+      lockFile = open(self.getFileName(id) + ".lock", "a")
+      fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+      self.lockFiles[id] = lockFile
+  def unlock(self, id):
+    lockFile = self.lockFiles.pop(id, None)
+    if lockFile:
+      fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+      lockFile.close()
+    super(FileSessionStore, self).unlock(id)
+  def load(self, id, timeout):
+    fileName = self.getFileName(id)
+    try:
+      if os.path.getmtime(fileName) + timeout < time.time():
+        self.delete(id)
+        return None
+      file = open(fileName, "rb")
+      try:
+        values = cPickle.load(file)
+      finally:
+        file.close()
+    except (IOError, OSError, EOFError):
+      return None
+    os.utime(fileName, None)
+    return values
+  def save(self, id, values, timeout):
+    fileName = self.getFileName(id)
+    tempName = "%s.%i.%s" % (fileName, os.getpid(),
+                             threading.currentThread().getName())
+    file = open(tempName, "wb")
+    try:
+      cPickle.dump(values, file, 2)
+    finally:
+      file.close()
+    os.rename(tempName, fileName)
+    if self.lastPurge + self.purgeInterval < time.time():
+      self.purge(timeout)
+  def delete(self, id):
+    for fileName in (self.getFileName(id), self.getFileName(id) + ".lock"):
+      try:
+        os.remove(fileName)
+      except OSError:
+        pass
+  def purge(self, timeout):
+    """removes the expired sessions, then the lock files that are older than
+    C{timeout} and have no session left, unless they are locked."""
+    now = time.time()
+    self.lastPurge = now
+    names = os.listdir(self.directory)
+    for name in names:
+      if name.startswith("pysid-") and not name.endswith(".lock"):
+        fileName = os.path.join(self.directory, name)
+        try:
+          if os.path.getmtime(fileName) + timeout < now:
+            os.remove(fileName)
+        except OSError:
+          pass
+    for name in names:
+      if name.startswith("pysid-") and name.endswith(".lock"):
+        fileName = os.path.join(self.directory, name)
+        try:
+          if os.path.exists(fileName[:-len(".lock")]) or \
+             os.path.getmtime(fileName) + timeout >= now:
+            continue
+          self.removeLockFile(fileName)
+        except (IOError, OSError):
+          pass
+  def removeLockFile(self, fileName):
+    """removes the lock file C{fileName} if no process holds its lock."""
+    if fcntl:
+      lockFile = open(fileName, "a")
+      try:
+        try:
+          fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+          return
+        os.remove(fileName)
+      finally:
+        lockFile.close()
+    else:
+      os.remove(fileName)
+
+class Session(dict):
+  """The session of a WSGI request, with the part of the mod_python
+  C{Session} API used by pywebmvc. The session id is kept in the C{pysid}
+  cookie, signed with C{secret} if one is given. Unless C{lock} is false, the
+  session is locked when it is created and stays locked until L{unlock} is
+  called at the end of the request."""
+  COOKIE_NAME = "pysid"
+  ID_REGEX = re.compile(r"^[0-9a-f]{32}$")
+  """The form of the session ids created by L{__init__}. Ids read from the
+  cookie in any other form are ignored."""
+  def __init__(self, req, store, secret = None, timeout = 1800, lock = True):
+    dict.__init__(self)
+    self.store = store
+    self.secret = secret
+    self.sessionTimeout = timeout
+    self.locking = lock
+    self.locked = False
+    self.new = False
+    self.sessionId = self.readCookie(req)
+    if self.sessionId:
+      self.lock()
+      values = store.load(self.sessionId, timeout)
+      if values is None:
+        self.unlock()
+        self.sessionId = None
+      else:
+        self.update(values)
+    if not self.sessionId:
+      self.sessionId = binascii.hexlify(os.urandom(16))
+      self.new = True
+      self.lock()
+      self.writeCookie(req)
+  def sign(self, value):
+    return hmac.new(self.secret, value).hexdigest()
+  def readCookie(self, req):
+    if not req.headers_in.has_key("Cookie"):
+      return None
+    cookie = Cookie.SimpleCookie()
+    try:
+      cookie.load(req.headers_in["Cookie"])
+    except Cookie.CookieError:
+      return None
+    if not cookie.has_key(self.COOKIE_NAME):
+      return None
+    value = cookie[self.COOKIE_NAME].value
+    if self.secret:
+      (signature, value) = (value[:32], value[32:])
+      if signature != self.sign(value):
+        return None
+    if not self.ID_REGEX.match(value):
+      return None
+    return value
+  def writeCookie(self, req):
+    value = self.sessionId
+    if self.secret:
+      value = self.sign(value) + value
+    req.headers_out.add("Set-Cookie", "%s=%s; path=/" % (self.COOKIE_NAME, value))
+  def id(self):
+    return self.sessionId
+  def is_new(self):
+    return self.new
+  def timeout(self):
+    return self.sessionTimeout
+  def save(self):
+    self.store.save(self.sessionId, dict(self), self.sessionTimeout)
+  def delete(self):
+    self.store.delete(self.sessionId)
+  def invalidate(self):
+    self.delete()
+    self.clear()
+  def lock(self):
+    if self.locking and not self.locked:
+      self.store.lock(self.sessionId)
+      self.locked = True
+  def unlock(self):
+    if self.locked:
+      self.locked = False
+      self.store.unlock(self.sessionId)
+
+class WsgiRequest(PyWebMvcObject):
+  """Presents a WSGI request to pywebmvc through the part of the mod_python
+  request API the framework uses. The handler adds C{form}, C{session},
+  C{bundle}, C{locale} and C{charset} as it does to a mod_python request.
+  The response is started by L{send_http_header} (or the first L{write})
+  with the C{status}, C{content_type}, C{headers_out} and
+  C{err_headers_out} set at that time."""
+  def __init__(self, environ, startResponse, options = None):
+    self.environ = environ
+    self.startResponse = startResponse
+    if options is None:
+      options = {}
+    self.options = options
+    self.method = environ.get("REQUEST_METHOD", "GET")
+    self.uri = environ.get("SCRIPT_NAME", "") + environ.get("PATH_INFO", "")
+    self.args = environ.get("QUERY_STRING", "")
+    #the port is kept with the host name as there is no parsed_uri
+    self.hostname = self.getHost(environ)
+    self.parsed_uri = None
+    self.headers_in = Table()
+    for key in environ.keys():
+      if key.startswith("HTTP_"):
+        self.headers_in[key[5:].replace("_", "-").title()] = environ[key]
+      elif key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+        self.headers_in[key.replace("_", "-").title()] = environ[key]
+    self.headers_out = Table()
+    self.err_headers_out = Table()
+    self.content_type = None
+    self.status = 200
+    self.subprocess_env = {}
+    self.responseWrite = None
+  def getHost(self, environ):
+    if environ.get("HTTP_HOST"):
+      return environ["HTTP_HOST"]
+    host = environ.get("SERVER_NAME", "localhost")
+    port = environ.get("SERVER_PORT", "80")
+    if (environ.get("wsgi.url_scheme"), port) not in (("http", "80"),
+                                                     ("https", "443")):
+      host += ":" + port
+    return host
+  def get_options(self):
+    return self.options
+  def add_common_vars(self):
+    for key in ("REMOTE_ADDR", "REMOTE_HOST", "SERVER_NAME", "SERVER_PORT",
+                "SERVER_PROTOCOL", "REQUEST_METHOD", "QUERY_STRING"):
+      if self.environ.has_key(key):
+        self.subprocess_env[key] = self.environ[key]
+    if self.environ.get("wsgi.url_scheme") == "https":
+      self.subprocess_env["HTTPS"] = "on"
+  def log_error(self, message, level = None):
+    errors = self.environ.get("wsgi.errors", sys.stderr)
+    errors.write("%s\n" % message)
+  def set_content_length(self, length):
+    #str:ok
+    self.headers_out["Content-Length"] = str(length)
+  def headersSent(self):
+    return self.responseWrite is not None
+  def getStatusLine(self):
+    reason = BaseHTTPRequestHandler.responses.get(self.status, ("Unknown",))[0]
+    return "%i %s" % (self.status, reason)
+  def getResponseHeaders(self):
+    headers = []
+    if self.content_type:
+      headers.append(("Content-Type", self.content_type))
+    for (name, value) in self.headers_out.items():
+      #str:ok
+      headers.append((str(name), str(value)))
+    for (name, value) in self.err_headers_out.items():
+      value = str(value)
+      if "\n" in value:
+        #can't be sent as a header, e.g. the traceback of an error
+        self.log_error("%s: %s" % (name, value))
+      else:
+        #str:ok
+        headers.append((str(name), value))
+    return headers
+  def send_http_header(self):
+    if self.responseWrite is None:
+      self.responseWrite = self.startResponse(self.getStatusLine(),
+                                              self.getResponseHeaders())
+  def write(self, data):
+    self.send_http_header()
+    if data:
+      self.responseWrite(data)
+  def finish(self, status):
+    """ends the response for a request handled with the status C{status}
+    and returns the rest of the response body."""
+    if status in (None, OK, DONE) or self.headersSent():
+      self.send_http_header()
+      return []
+    self.status = status
+    body = "<html><body><h1>%s</h1></body></html>" % self.getStatusLine()
+    self.content_type = "text/html"
+    self.set_content_length(len(body))
+    self.send_http_header()
+    return [body]
+
+class WsgiActionHandler(ActionHandlerBase):
+  """Passes control for a L{WsgiRequest} to a PyWebMVC
+  L{Action<core.Action>}. Sessions are kept in C{sessionStore}, a
+  L{MemorySessionStore} by default."""
+  def __init__(self, sessionStore = None):
+    super(WsgiActionHandler, self).__init__()
+    if sessionStore is None:
+      sessionStore = MemorySessionStore()
+    self.sessionStore = sessionStore
+  def createForm(self, req):
+    return FieldStorage(req,1,False)
+  def createSession(self, req, secret, timeout, lock = True):
+    return Session(req, self.sessionStore, secret, timeout, lock)
+  def sendRedirect(self, req, path):
+    sendRedirect(req, path)
+  def abort(self, req, status):
+    raise ServerReturn(status)
+  def isServerReturn(self, e):
+    return isinstance(e, ServerReturn)
+  def __call__(self, req):
+    result = self.handleRequest(req)
+    self.cleanupRequest(req)
+    return result
+
+class WsgiApplication(PyWebMvcObject):
+  """A WSGI application serving a pywebmvc configuration. C{options} holds
+  the settings otherwise given with C{PythonOption} (C{pyWebMvcConfig} is
+  required) and C{handler} is the L{WsgiActionHandler} (or subclass) that
+  handles the requests."""
+  def __init__(self, options, handler = None):
+    self.options = options
+    if handler is None:
+      handler = WsgiActionHandler()
+    self.handler = handler
+  def createRequest(self, environ, startResponse):
+    return WsgiRequest(environ, startResponse, self.options)
+  def __call__(self, environ, startResponse):
+    req = self.createRequest(environ, startResponse)
+    try:
+      try:
+        status = self.handler(req)
+      except ServerReturn, e:
+        status = e.status
+    finally:
+      if hasattr(req, "session"):
+        req.session.unlock()
+    return req.finish(status)
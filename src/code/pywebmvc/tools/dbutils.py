@@ -1,4 +1,6 @@
-from pywebmvc.framework.util import PyWebMvcObject
+import operator
+from pywebmvc.framework.util import PyWebMvcObject, overrides, \
+                                   createPropertyGetter
 from types import StringTypes
 
 def sqlstrescape(aStr):
@@ -7,9 +9,88 @@ def sqlstrescape(aStr):
   aStr = aStr.replace("\"","\\\"")
   return aStr
 
+DEFAULT_PLACEHOLDER = "?"
+"""The placeholder used by L{SearchCriteria.sqlWithParams} by default."""
+PLACEHOLDERS = {
+  "qmark" : "?",
+  "format" : "%s",
+}
+"""The placeholder of each DB-API C{paramstyle} supported. The named styles
+(C{named}, C{pyformat}) take their parameters as a mapping and are not
+supported."""
+
+def getPlaceholder(dbModule):
+  """returns the placeholder of the DB-API module C{dbModule}. Raises
+  C{ValueError} if its C{paramstyle} is not supported."""
+  if not PLACEHOLDERS.has_key(dbModule.paramstyle):
+    raise ValueError, "unsupported DB-API paramstyle '%s'" % \
+      dbModule.paramstyle
+  return PLACEHOLDERS[dbModule.paramstyle]
+
+def getBucketSize(size):
+  """returns the number of placeholders used for a list of C{size} values:
+  the next power of two, so lists of similar sizes share a statement."""
+  bucket = 1
+  while bucket < size:
+    bucket *= 2
+  return bucket
+
 class SearchCriteria(PyWebMvcObject):
+  """Base class of the search criteria. Subclasses test python objects by
+  returning a predicate function from L{compile} (or by overriding
+  L{accepts}) and generate SQL with C{sql}. The predicate is compiled on first
+  use, so a criteria should not be modified once it has been used."""
+  predicate = None
   def accepts(self, obj):
     """tests the python object to see if it meets the search criteria"""
+    return self.getPredicate()(obj)
+  def compile(self):
+    """returns a function taking a python object and returning whether it
+    meets the search criteria."""
+    raise NotImplementedError
+  def getPredicate(self):
+    """returns the function L{compile}d for the criteria, compiling it on
+    first use. For subclasses which override L{accepts} instead of L{compile}
+    this is C{accepts} itself."""
+    if self.predicate is None:
+      if overrides(self, SearchCriteria, "accepts"):
+        self.predicate = self.accepts
+      else:
+        self.predicate = self.compile()
+    return self.predicate
+  def filter(self, iterable):
+    """returns a list of the objects in C{iterable} which meet the search
+    criteria, in order."""
+    predicate = self.getPredicate()
+    return [obj for obj in iterable if predicate(obj)]
+  def sqlWithParams(self, columnMap, placeholder = DEFAULT_PLACEHOLDER):
+    """returns an SQL fragment for performing the search with a
+    C{placeholder} in place of each value, and the tuple of the values, to be
+    passed to the C{execute} method of a DB-API cursor. Searches for
+    different values then share the same SQL, so the database can reuse the
+    statement."""
+    params = []
+    sql = self.sqlTemplate(columnMap, placeholder)
+    self.collectParams(params)
+    return (sql, tuple(params))
+  def sqlTemplate(self, columnMap, placeholder):
+    """returns the SQL fragment of L{sqlWithParams}. Criteria which do not
+    implement it have their values in the SQL returned by C{sql}."""
+    return self.sql(columnMap)
+  def collectParams(self, params):
+    """appends the values of the placeholders of L{sqlTemplate} to the list
+    C{params}."""
+  def getShape(self):
+    """returns a hashable value which is the same for all the criteria having
+    the same L{sqlTemplate}, or C{None} if the template depends on the
+    values."""
+    return None
+  def getCacheKey(self):
+    """returns a hashable value which is the same for all the criteria
+    meeting the same objects, e.g. to cache the number of rows meeting them,
+    or C{None} if it is not known. The operands of C{AND} and C{OR} and the
+    values of C{IN} are sorted so that their order does not matter."""
+    return None
   def __str__(self):
     """returns an SQL fragment for performing the search"""
     raise NotYetImplemented()
@@ -26,17 +107,30 @@ class BasicSearchCriteria(SearchCriteria):
     self.property = property
     self.operator = operator
     self.value = value
-  def accepts(self, obj):
-    pyOp = self.operator
-    if pyOp == BasicSearchCriteria.OP_EQUAL:
-      pyOp = "=="
-    if pyOp == self.OP_NOT_EQUAL:
-      pyOp = "!="
-    if pyOp == self.OP_LIKE:
-      toEval = "unicode(obj.%s).lower().find(%s) != -1" % (self.property, repr(unicode(self.value.replace("%", "")).lower()))
+  OPERATORS = {
+    OP_EQUAL : operator.eq,
+    OP_NOT_EQUAL : operator.ne,
+    OP_LESS_THAN : operator.lt,
+    OP_GREATER_THAN : operator.gt,
+    OP_LESS_THAN_OR_EQUAL : operator.le,
+    OP_GREATER_THAN_OR_EQUAL : operator.ge,
+  }
+  """The python function of each operator. Values are compared as
+  unicode."""
+  def compile(self):
+    getter = createPropertyGetter(self.property)
+    if self.operator == self.OP_LIKE:
+      needle = unicode(self.value.replace("%", "")).lower()
+      def predicate(obj):
+        return needle in unicode(getter(obj)).lower()
     else:
-      toEval = "unicode(obj.%s) %s %s" % (self.property, pyOp, repr(unicode(self.value)))
-    return eval(toEval)
+      if not self.OPERATORS.has_key(self.operator):
+        raise ValueError, "unsupported operator '%s'" % self.operator
+      function = self.OPERATORS[self.operator]
+      value = unicode(self.value)
+      def predicate(obj):
+        return function(unicode(getter(obj)), value)
+    return predicate
   def sql(self,columnMap):
     value = self.value
     if isinstance(value,StringTypes):
@@ -44,60 +138,213 @@ class BasicSearchCriteria(SearchCriteria):
     else:
       value = repr(value)
     return "(%s %s %s)" % (columnMap[self.property], self.operator, value)
+  def sqlTemplate(self, columnMap, placeholder):
+    return "(%s %s %s)" % (columnMap[self.property], self.operator,
+                           placeholder)
+  def collectParams(self, params):
+    params.append(self.value)
+  def getShape(self):
+    return ("basic", self.property, self.operator)
+  def getCacheKey(self):
+    return ("basic", self.property, self.operator, self.value)
 
 
 class InSearchCriteria(SearchCriteria):
   def __init__(self, property, valueList):
     self.property = property
     self.valueList = valueList
-  def accepts(self, obj):
-    return True
+  def compile(self):
+    getter = createPropertyGetter(self.property)
+    values = frozenset([unicode(value) for value in self.valueList])
+    def predicate(obj):
+      return unicode(getter(obj)) in values
+    return predicate
   def sql(self,columnMap):
     return "(%s in (%s))" % (columnMap[self.property], ",".join(map(lambda x: isinstance(x, StringTypes) and "'%s'" % (sqlstrescape(x)) or repr(x), self.valueList)))
+  def sqlTemplate(self, columnMap, placeholder):
+    """returns the SQL with the L{number of placeholders<getBucketSize>} for
+    the values, or a condition which is always false when there are none."""
+    if not self.valueList:
+      return "(1 = 0)"
+    return "(%s in (%s))" % (columnMap[self.property],
+      ",".join([placeholder] * getBucketSize(len(self.valueList))))
+  def collectParams(self, params):
+    """appends the values, repeating the last one to fill the bucket."""
+    if self.valueList:
+      params.extend(self.valueList)
+      params.extend([self.valueList[-1]] *
+                    (getBucketSize(len(self.valueList)) - len(self.valueList)))
+  def getShape(self):
+    return ("in", self.property, len(self.valueList) and
+                                 getBucketSize(len(self.valueList)))
+  def getCacheKey(self):
+    values = list(frozenset(self.valueList))
+    values.sort()
+    return ("in", self.property, tuple(values))
+
+
+def getCompositeShape(name, *criteria):
+  """returns the shape of the criteria named C{name} combining C{criteria},
+  or C{None} if the shape of any of them is not known."""
+  shapes = [name]
+  for c in criteria:
+    shape = c.getShape()
+    if shape is None:
+      return None
+    shapes.append(shape)
+  return tuple(shapes)
 
+def getCompositeCacheKey(name, composite, *criteria):
+  """returns the cache key of the criteria C{composite} named C{name}
+  combining C{criteria} in any order, or C{None} if the key of any of them is
+  not known. Nested criteria of the same class are flattened, so that
+  C{(a AND b) AND c} and C{a AND (c AND b)} have the same key."""
+  keys = []
+  for c in criteria:
+    key = c.getCacheKey()
+    if key is None:
+      return None
+    if c.__class__ is composite.__class__:
+      keys.extend(key[1:])
+    else:
+      keys.append(key)
+  keys.sort()
+  return (name,) + tuple(keys)
 
 class AndSearchCriteria(SearchCriteria):
   SQL_AND = "AND"
   def __init__(self, criteria1, criteria2):
     self.criteria1 = criteria1
     self.criteria2 = criteria2
-  def accepts(self, obj):
-    return self.criteria1.accepts(obj) and self.criteria2.accepts(obj)
+  def compile(self):
+    predicate1 = self.criteria1.getPredicate()
+    predicate2 = self.criteria2.getPredicate()
+    def predicate(obj):
+      return predicate1(obj) and predicate2(obj)
+    return predicate
   def sql(self,columnMap):
     return "(%s %s %s)" % (self.criteria1.sql(columnMap), AndSearchCriteria.SQL_AND, self.criteria2.sql(columnMap))
+  def sqlTemplate(self, columnMap, placeholder):
+    return "(%s %s %s)" % (self.criteria1.sqlTemplate(columnMap, placeholder),
+                           AndSearchCriteria.SQL_AND,
+                           self.criteria2.sqlTemplate(columnMap, placeholder))
+  def collectParams(self, params):
+    self.criteria1.collectParams(params)
+    self.criteria2.collectParams(params)
+  def getShape(self):
+    return getCompositeShape("and", self.criteria1, self.criteria2)
+  def getCacheKey(self):
+    return getCompositeCacheKey("and", self, self.criteria1, self.criteria2)
 
 class OrSearchCriteria(SearchCriteria):
   SQL_OR = "OR"
   def __init__(self, criteria1, criteria2):
     self.criteria1 = criteria1
     self.criteria2 = criteria2
-  def accepts(self, obj):
-    return self.criteria1.accepts(obj) or self.criteria2.accepts(obj)
+  def compile(self):
+    predicate1 = self.criteria1.getPredicate()
+    predicate2 = self.criteria2.getPredicate()
+    def predicate(obj):
+      return predicate1(obj) or predicate2(obj)
+    return predicate
   def sql(self,columnMap):
     return "(%s %s %s)" % (self.criteria1.sql(columnMap), OrSearchCriteria.SQL_OR, self.criteria2.sql(columnMap))
+  def sqlTemplate(self, columnMap, placeholder):
+    return "(%s %s %s)" % (self.criteria1.sqlTemplate(columnMap, placeholder),
+                           OrSearchCriteria.SQL_OR,
+                           self.criteria2.sqlTemplate(columnMap, placeholder))
+  def collectParams(self, params):
+    self.criteria1.collectParams(params)
+    self.criteria2.collectParams(params)
+  def getShape(self):
+    return getCompositeShape("or", self.criteria1, self.criteria2)
+  def getCacheKey(self):
+    return getCompositeCacheKey("or", self, self.criteria1, self.criteria2)
 
 class NotSearchCriteria(SearchCriteria):
   SQL_NOT = "NOT"
   def __init__(self, criteria1):
     self.criteria1 = criteria1
-  def accepts(self, obj):
-    return self.criteria1.accepts(obj)
+  def compile(self):
+    predicate1 = self.criteria1.getPredicate()
+    def predicate(obj):
+      return not predicate1(obj)
+    return predicate
   def sql(self,columnMap):
     return "(%s %s)" % (NotSearchCriteria.SQL_NOT, self.criteria1.sql(columnMap))
+  def sqlTemplate(self, columnMap, placeholder):
+    return "(%s %s)" % (NotSearchCriteria.SQL_NOT,
+                        self.criteria1.sqlTemplate(columnMap, placeholder))
+  def collectParams(self, params):
+    self.criteria1.collectParams(params)
+  def getShape(self):
+    return getCompositeShape("not", self.criteria1)
+  def getCacheKey(self):
+    key = self.criteria1.getCacheKey()
+    if key is None:
+      return None
+    return ("not", key)
 
 class NotNullCriteria(SearchCriteria):
   def __init__(self, property):
     self.property = property
-  def accepts(self, obj):
-    return True
+  def compile(self):
+    getter = createPropertyGetter(self.property)
+    def predicate(obj):
+      return getter(obj) is not None
+    return predicate
   def sql(self,columnMap):
     return "(%s is NOT NULL)" % (columnMap[self.property])
+  def getShape(self):
+    return ("notnull", self.property)
+  def getCacheKey(self):
+    return self.getShape()
 
 class NullCriteria(SearchCriteria):
   def __init__(self, property):
     self.property = property
-  def accepts(self, obj):
-    return True
+  def compile(self):
+    getter = createPropertyGetter(self.property)
+    def predicate(obj):
+      return getter(obj) is None
+    return predicate
   def sql(self,columnMap):
     return "(%s is NULL)" % (columnMap[self.property])
+  def getShape(self):
+    return ("null", self.property)
+  def getCacheKey(self):
+    return self.getShape()
+
 
+class StatementCache(PyWebMvcObject):
+  """Keeps the SQL statements built from search criteria for the columns
+  C{columnMap}, by statement template and L{shape<SearchCriteria.getShape>}
+  of the criteria, so the SQL of a search is only built the first time a
+  criteria of its shape is used. At most C{size} statements are kept."""
+  def __init__(self, columnMap, placeholder = DEFAULT_PLACEHOLDER, size = 200):
+    self.columnMap = columnMap
+    self.placeholder = placeholder
+    self.size = size
+    self.statements = {}
+  def getStatement(self, template, criteria):
+    """returns the statement C{template % where}, C{where} being the
+    L{SQL template<SearchCriteria.sqlTemplate>} of C{criteria} (or a true
+    condition if C{criteria} is C{None}), and the tuple of its parameters.
+    """
+    if criteria is None:
+      return (template % "(1 = 1)", ())
+    key = criteria.getShape()
+    if key is None:
+      (where, params) = criteria.sqlWithParams(self.columnMap,
+                                               self.placeholder)
+      return (template % where, params)
+    key = (template, key)
+    statement = self.statements.get(key)
+    if statement is None:
+      if len(self.statements) >= self.size:
+        self.statements.clear()
+      statement = self.statements[key] = template % \
+        criteria.sqlTemplate(self.columnMap, self.placeholder)
+    params = []
+    criteria.collectParams(params)
+    return (statement, tuple(params))
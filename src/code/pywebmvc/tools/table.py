@@ -1,18 +1,113 @@
-import math
-from pywebmvc.framework.util import PyWebMvcObject
+import math, heapq, itertools, base64, binascii, types, time
+from pywebmvc.framework.util import PyWebMvcObject, overrides, \
+                                   createPropertyGetter
 from pywebmvc.framework import htmlutil
+from pywebmvc.tools.dbutils import StatementCache, DEFAULT_PLACEHOLDER, \
+                                   BasicSearchCriteria, AndSearchCriteria, \
+                                   OrSearchCriteria
+
+class CountCache(PyWebMvcObject):
+  """Keeps the list sizes of L{Pager}s across requests, so that paging
+  through a list does not count its rows again on each page. A count is
+  exact for C{timeout} seconds, then used as an approximate count (shown as
+  "about N") for C{staleTimeout} more seconds, after which the rows are
+  counted again. At most C{size} counts are kept.
+
+  The cache is per process: a module level instance is shared by the
+  requests served by the process. The application calls L{invalidate} (or
+  L{expire}) when it changes the rows listed by a pager. The cache is not
+  locked: the requests of other threads may add or clear counts while they
+  run, which at worst counts rows once more."""
+  def __init__(self, timeout, staleTimeout = 0, size = 1000):
+    self.timeout = timeout
+    self.staleTimeout = staleTimeout
+    self.size = size
+    self.entries = {}
+  def getCount(self, key, count):
+    """returns the count cached under C{key}, calling C{count} to compute it
+    when it is not cached or is too old, and whether the count is
+    approximate."""
+    now = time.time()
+    entry = self.entries.get(key)
+    if entry is not None:
+      (countedAt, size) = entry
+      if now < countedAt + self.timeout:
+        return (size, False)
+      elif now < countedAt + self.timeout + self.staleTimeout:
+        return (size, True)
+    if len(self.entries) >= self.size:
+      self.entries.clear()
+    size = count()
+    self.entries[key] = (now, size)
+    return (size, False)
+  def getKeys(self, pagerClass):
+    """returns the keys of the counts of C{pagerClass} and its subclasses, or
+    of all the counts if C{None}."""
+    if pagerClass is None:
+      return self.entries.keys()
+    return [key for key in self.entries.keys()
+            if issubclass(key[0], pagerClass)]
+  def invalidate(self, pagerClass = None):
+    """removes the counts of C{pagerClass} (all of them if C{None}): the
+    rows are counted again on the next request."""
+    for key in self.getKeys(pagerClass):
+      self.entries.pop(key, None)
+  def expire(self, pagerClass = None):
+    """makes the counts of C{pagerClass} (all of them if C{None})
+    approximate, so that they are still used for C{staleTimeout} seconds
+    but shown as approximate."""
+    countedAt = time.time() - self.timeout
+    for key in self.getKeys(pagerClass):
+      entry = self.entries.get(key)
+      if entry is not None and entry[0] > countedAt:
+        self.entries[key] = (countedAt, entry[1])
 
 class Pager(PyWebMvcObject):
   def getListSize(self,req):
     """This method must be overridden by the sub class"""
     return 0
+  def getCountCache(self, req):
+    """returns the L{CountCache} keeping the list size across requests, or
+    C{None} (the default) to count the rows on each request."""
+    return None
+  def getCountKey(self, req):
+    """returns a hashable value identifying the rows listed for C{req} in the
+    L{CountCache}, or C{None} if the list size should not be cached. The
+    default is C{None}."""
+    return None
   def __getListSize(self, req):
     attrName = "pagerListSizeFor" + self.__class__.__name__   # because we can have more than 1 pager per page
     if hasattr(req, attrName):
       return getattr(req, attrName)
-    size = self.getListSize(req)
+    cache = self.getCountCache(req)
+    key = None
+    if cache is not None:
+      key = self.getCountKey(req)
+    if key is None:
+      size = self.getListSize(req)
+    else:
+      (size, approximate) = cache.getCount((self.__class__, key),
+                                           lambda: self.getListSize(req))
+      if approximate:
+        setattr(req, "pagerListSizeApproximateFor" + self.__class__.__name__,
+                True)
     setattr(req, attrName, size)
     return size
+  def isListSizeApproximate(self, req):
+    """returns whether the list size is an approximate count read from the
+    L{CountCache}."""
+    self.__getListSize(req)
+    return getattr(req,
+                   "pagerListSizeApproximateFor" + self.__class__.__name__,
+                   False)
+  def formatListSize(self, req, size):
+    """returns the list size C{size} displayed in the pager summary."""
+    if self.isListSizeApproximate(req):
+      #str:ok
+      return req.bundle.getMessage(
+        "pywebmvc.tools.pager.message.approximateCount", str(size))
+    #str:ok
+    return str(size)
   def getStartIndex(self,req):
     """returns the inclusive start index"""
     startIndex = self.getCurrentPage(req)*self.__getCurrentPageSize(req)
@@ -32,24 +127,37 @@ class Pager(PyWebMvcObject):
       numPages = int(math.ceil(float(size)/pageSize))
       if numPages == 0:
         return 0
-      return min(numPages - 1, int(req.form[self.getPageParamName()]))
+      return min(numPages - 1, self.parsePageParam(req)[0])
     else:
       return 0
+  def parsePageParam(self, req):
+    """returns the page number, the direction (C{"a"}fter or C{"b"}efore)
+    and the encoded key of the page parameter C{page~direction~key} (see
+    L{getPageParamValue}). The direction and key are C{None} for a plain page
+    number."""
+    parts = req.form[self.getPageParamName()].split("~")
+    if len(parts) == 3:
+      return (int(parts[0]), parts[1], parts[2])
+    return (int(parts[0]), None, None)
+  def getPageParamValue(self, req, page):
+    """returns the value of the page parameter of the links to C{page}. By
+    default the page number, which selects the rows by their offset."""
+    #str:ok
+    return str(page)
   def getTypeString(self,req):
     return req.bundle["term.items"]
   def getPagerSummary(self,req):
     html = '<span class="pagerstatus">'
     size = self.__getListSize(req) 
     if size < self.__getCurrentPageSize(req):
-      #str:ok
-      html += req.bundle.getMessage("pywebmvc.tools.pager.message.allShown", str(size), self.getTypeString(req))
+      html += req.bundle.getMessage("pywebmvc.tools.pager.message.allShown", self.formatListSize(req, size), self.getTypeString(req))
     else:
       #str:ok
       start = str(self.getStartIndex(req) + 1)
       #str:ok
       end = str(self.getEndIndex(req))
       #str:ok
-      html += req.bundle.getMessage("pywebmvc.tools.pager.message.rangeShown", start, end, str(size), self.getTypeString(req))
+      html += req.bundle.getMessage("pywebmvc.tools.pager.message.rangeShown", start, end, self.formatListSize(req, size), self.getTypeString(req))
 
     size = self.__getListSize(req)
     pageSize = self.__getCurrentPageSize(req)
@@ -68,34 +176,34 @@ class Pager(PyWebMvcObject):
     pageSize = self.__getCurrentPageSize(req)
     curPage = self.getCurrentPage(req)
     numPages = int(math.ceil(float(size)/pageSize))
-    html = ""
+    html = htmlutil.HtmlBuffer()
     paramString = ""
     parameters = self.getPageParams(req,exclude=[self.getPageParamName()])
     if parameters:
       paramString = "&"+htmlutil.getParameterString(parameters)
     if size > pageSize: 
-      html += '<div class="pager">'
+      html.write('<div class="pager">')
       if curPage > 1:
-        html += '<a href="?%s=0%s">&lt;&lt;</a>&nbsp;' % (self.getPageParamName(), paramString)
+        html.write('<a href="?%s=%s%s">&lt;&lt;</a>&nbsp;' % (self.getPageParamName(), self.getPageParamValue(req, 0), paramString))
       if curPage > 0:
-        html += '<a href="?%s=%i%s">&lt;</a>&nbsp;' % (self.getPageParamName(), curPage - 1, paramString)
+        html.write('<a href="?%s=%s%s">&lt;</a>&nbsp;' % (self.getPageParamName(), self.getPageParamValue(req, curPage - 1), paramString))
       startPage = max(0,curPage -5)
       stopPage = min(max(curPage + 5, 10), numPages)
       if startPage > 0:
-        html += "...&nbsp;"
+        html.write("...&nbsp;")
       for i in range(startPage,stopPage):
         if i == curPage:
-          html += '<span class="curPage">%i</span>&nbsp;' % (i+1)
+          html.write('<span class="curPage">%i</span>&nbsp;' % (i+1))
         else:
-          html += '<a href="?%s=%i%s">%i</a>&nbsp;' % (self.getPageParamName(), i,paramString,i+1)
+          html.write('<a href="?%s=%s%s">%i</a>&nbsp;' % (self.getPageParamName(), self.getPageParamValue(req, i),paramString,i+1))
       if stopPage < numPages - 1:
-        html += "...&nbsp;"
+        html.write("...&nbsp;")
       if curPage < numPages - 1:
-        html += '<a href="?%s=%i%s">&gt;</a>&nbsp;' % (self.getPageParamName(), curPage + 1, paramString)
+        html.write('<a href="?%s=%s%s">&gt;</a>&nbsp;' % (self.getPageParamName(), self.getPageParamValue(req, curPage + 1), paramString))
       if curPage < numPages - 2:
-        html += '<a href="?%s=%i%s">&gt;&gt;</a>&nbsp;' % (self.getPageParamName(), numPages - 1, paramString)
-      html += '</div>'
-    return html
+        html.write('<a href="?%s=%s%s">&gt;&gt;</a>&nbsp;' % (self.getPageParamName(), self.getPageParamValue(req, numPages - 1), paramString))
+      html.write('</div>')
+    return html.getvalue()
   def getPageSizeSelector(self, req):
     html = """ <select id="%s" onChange="submitPageSizeChangeRequest('%s', '%s');">\n""" % (self.getPageSizeAttrName(), self.getPageSizeAttrName(), self.getPageParamName())
     for size in self.getPageSizeList():
@@ -144,8 +252,304 @@ class Column:
     self.align=align
     self.sortable=sortable
     self.style=style
+    self.getter=None
+    self.getterProperty=None
+  def getValue(self, item):
+    """returns the value of the property of C{item} shown in the column, or
+    "" if it does not have the property. The property getter is built on first
+    use (see L{createPropertyGetter}) and again if C{property} changes."""
+    if self.getterProperty != self.property:
+      self.getter = createPropertyGetter(self.property)
+      self.getterProperty = self.property
+    try:
+      return self.getter(item)
+    except AttributeError:
+      return ""
+
+class DataSource(PyWebMvcObject):
+  """The rows of a L{Table}. A table returning a data source from
+  L{Table.getDataSource} only retrieves the rows of the page it displays."""
+  def count(self, criteria):
+    """returns the number of rows meeting the
+    L{SearchCriteria<pywebmvc.tools.dbutils.SearchCriteria>} C{criteria}
+    (all the rows if C{None})."""
+    raise NotImplementedError
+  def fetch(self, criteria, sortColumn, order, offset, limit):
+    """returns the list of at most C{limit} rows (all of them if C{None})
+    meeting C{criteria}, starting at the row C{offset}, when sorted on the
+    L{Column} C{sortColumn} (if any) in the C{order} C{"asc"} or
+    C{"desc"}."""
+    raise NotImplementedError
+  def getKey(self, row, sortColumn):
+    """returns the key of C{row} for L{fetchAfter}: the tuple of its value
+    for C{sortColumn} (C{None} if not sorted) and of its unique id, or
+    C{None} if the data source does not support keyset paging."""
+    return None
+  def fetchAfter(self, criteria, sortColumn, order, key, limit,
+                 before = False):
+    """returns the list of at most C{limit} rows meeting C{criteria} which
+    follow the row with the L{key<getKey>} C{key} in the order of
+    L{fetch}, or the rows which precede it if C{before} is true, without
+    reading the rows of the pages in between."""
+    raise NotImplementedError
+
+def getDecoratedRows(rows, sortColumn, keyGetter):
+  """returns an iterator of the tuples C{(value, id, index, row)} which sort
+  C{rows} in the order of L{ListDataSource.fetch}."""
+  if sortColumn is None:
+    getValue = lambda row: None
+  else:
+    getValue = sortColumn.getValue
+  #the index keeps the sort stable and the rows from being compared
+  if keyGetter is None:
+    return ((getValue(row), index, index, row)
+            for (index, row) in enumerate(rows))
+  return ((getValue(row), keyGetter(row), index, row)
+          for (index, row) in enumerate(rows))
+
+class ListDataSource(DataSource):
+  """A data source for the python objects in a list. C{items} is the list or
+  a function returning it. Only the rows of the page requested are sorted,
+  with C{heapq}. Keyset paging requires the property C{keyProperty}
+  identifying each object, which also orders the objects having the same
+  value in the sort column."""
+  def __init__(self, items, keyProperty = None):
+    self.items = items
+    self.keyProperty = keyProperty
+    self.keyGetter = None
+    if keyProperty:
+      self.keyGetter = createPropertyGetter(keyProperty)
+  def getList(self):
+    if callable(self.items):
+      return self.items()
+    return self.items
+  def iterate(self, criteria):
+    """returns an iterator of the rows meeting C{criteria}."""
+    items = self.getList()
+    if criteria is None:
+      return iter(items)
+    return itertools.ifilter(criteria.getPredicate(), items)
+  def count(self, criteria):
+    if criteria is None:
+      return len(self.getList())
+    count = 0
+    for item in self.iterate(criteria):
+      count += 1
+    return count
+  def fetch(self, criteria, sortColumn, order, offset, limit):
+    items = self.iterate(criteria)
+    if limit is None:
+      stop = None
+    else:
+      stop = offset + limit
+    if sortColumn is None and self.keyGetter is None:
+      return list(itertools.islice(items, offset, stop))
+    decorated = getDecoratedRows(items, sortColumn, self.keyGetter)
+    if stop is None:
+      decorated = list(decorated)
+      decorated.sort()
+      if order == "desc":
+        decorated.reverse()
+      decorated = decorated[offset:]
+    elif order == "desc":
+      decorated = heapq.nlargest(stop, decorated)[offset:]
+    else:
+      decorated = heapq.nsmallest(stop, decorated)[offset:]
+    return [item for (value, id, index, item) in decorated]
+  def getKey(self, row, sortColumn):
+    if self.keyGetter is None:
+      return None
+    if sortColumn is None:
+      return (None, self.keyGetter(row))
+    return (sortColumn.getValue(row), self.keyGetter(row))
+  def fetchAfter(self, criteria, sortColumn, order, key, limit,
+                 before = False):
+    decorated = getDecoratedRows(self.iterate(criteria), sortColumn,
+                                 self.keyGetter)
+    key = tuple(key)
+    if (order == "desc") == before:
+      decorated = [item for item in decorated if item[:2] > key]
+      decorated = heapq.nsmallest(limit, decorated)
+    else:
+      decorated = [item for item in decorated if item[:2] < key]
+      decorated = heapq.nlargest(limit, decorated)
+    if before:
+      decorated.reverse()
+    return [item for (value, id, index, item) in decorated]
+
+class Row(PyWebMvcObject):
+  """A row read by a L{DbApiDataSource}, having an attribute for each
+  property of the data source."""
+  def __init__(self, values):
+    self.__dict__.update(values)
+
+class DbApiDataSource(DataSource):
+  """A data source for the rows of the database table C{table}, read through
+  the DB-API connection C{connection}. C{columnMap} maps the properties of
+  the rows (and of the L{Column}s and search criteria) to the columns of the
+  table, and C{placeholder} is the
+  L{placeholder<pywebmvc.tools.dbutils.getPlaceholder>} of the database
+  module. The page is selected with C{LIMIT} and C{OFFSET}, or with the key
+  of the last row of the previous page for keyset paging, which requires the
+  property C{keyProperty} of the unique key of the table. Keyset paging does
+  not support C{NULL} values in the sort column."""
+  ORDERS = {"asc" : "ASC", "desc" : "DESC"}
+  def __init__(self, connection, table, columnMap,
+               placeholder = DEFAULT_PLACEHOLDER, keyProperty = None):
+    self.connection = connection
+    self.table = table
+    self.columnMap = columnMap
+    self.placeholder = placeholder
+    self.keyProperty = keyProperty
+    self.properties = columnMap.keys()
+    self.columns = ", ".join([columnMap[property]
+                              for property in self.properties])
+    self.statements = StatementCache(columnMap, placeholder)
+  def getConnection(self):
+    return self.connection
+  def execute(self, template, criteria, params = ()):
+    """executes the statement built from C{template} and C{criteria} by the
+    L{StatementCache<pywebmvc.tools.dbutils.StatementCache>} with the
+    additional parameters C{params} and returns the cursor."""
+    (statement, criteriaParams) = self.statements.getStatement(template,
+                                                               criteria)
+    cursor = self.getConnection().cursor()
+    cursor.execute(statement, criteriaParams + tuple(params))
+    return cursor
+  def createItem(self, row):
+    """returns the object for the database row C{row}, by default a
+    L{Row}."""
+    return Row(zip(self.properties, row))
+  def count(self, criteria):
+    cursor = self.execute("SELECT COUNT(*) FROM %s WHERE %%s" % self.table,
+                          criteria)
+    try:
+      return int(cursor.fetchone()[0])
+    finally:
+      cursor.close()
+  def getOrderBy(self, sortColumn, order):
+    order = self.ORDERS.get(order, "ASC")
+    columns = []
+    if sortColumn is not None:
+      columns.append("%s %s" % (self.columnMap[sortColumn.property], order))
+    if self.keyProperty:
+      columns.append("%s %s" % (self.columnMap[self.keyProperty], order))
+    if not columns:
+      return ""
+    return " ORDER BY " + ", ".join(columns)
+  def fetch(self, criteria, sortColumn, order, offset, limit):
+    template = "SELECT %s FROM %s WHERE %%s%s" % (self.columns, self.table,
+      self.getOrderBy(sortColumn, order))
+    params = []
+    if limit is not None:
+      #escaped for the template, which is formatted with the criteria
+      placeholder = self.placeholder.replace("%", "%%")
+      template += " LIMIT %s OFFSET %s" % (placeholder, placeholder)
+      params = [limit, offset]
+    elif offset:
+      #there is no standard OFFSET without LIMIT
+      return self.fetch(criteria, sortColumn, order, offset,
+                        self.count(criteria))
+    cursor = self.execute(template, criteria, params)
+    try:
+      return [self.createItem(row) for row in cursor.fetchall()]
+    finally:
+      cursor.close()
+  def getKey(self, row, sortColumn):
+    if not self.keyProperty:
+      return None
+    if sortColumn is None:
+      return (None, getattr(row, self.keyProperty))
+    return (sortColumn.getValue(row), getattr(row, self.keyProperty))
+  def getSeekCriteria(self, sortColumn, key, greater):
+    """returns the criteria of the rows after the L{key<getKey>} C{key}
+    when sorted on C{sortColumn} and the key in ascending order if
+    C{greater}, in descending order otherwise."""
+    if greater:
+      operator = BasicSearchCriteria.OP_GREATER_THAN
+    else:
+      operator = BasicSearchCriteria.OP_LESS_THAN
+    (value, id) = key
+    criteria = BasicSearchCriteria(self.keyProperty, operator, id)
+    if sortColumn is not None:
+      criteria = OrSearchCriteria(
+        BasicSearchCriteria(sortColumn.property, operator, value),
+        AndSearchCriteria(BasicSearchCriteria(sortColumn.property,
+          BasicSearchCriteria.OP_EQUAL, value), criteria))
+    return criteria
+  def fetchAfter(self, criteria, sortColumn, order, key, limit,
+                 before = False):
+    greater = (order == "desc") == before
+    if greater:
+      seekOrder = "asc"
+    else:
+      seekOrder = "desc"
+    seekCriteria = self.getSeekCriteria(sortColumn, key, greater)
+    if criteria is not None:
+      seekCriteria = AndSearchCriteria(criteria, seekCriteria)
+    rows = self.fetch(seekCriteria, sortColumn, seekOrder, 0, limit)
+    if before:
+      rows.reverse()
+    return rows
+
+def encodeKey(key):
+  """encodes the tuple C{key} of strings, numbers and C{None}s in a string
+  which can be used in a url. Raises C{ValueError} for other values."""
+  values = []
+  for value in key:
+    if value is None:
+      values.append("n")
+    elif isinstance(value, types.BooleanType):
+      values.append("b%i" % value)
+    elif isinstance(value, (types.IntType, types.LongType)):
+      values.append("i%i" % value)
+    elif isinstance(value, types.FloatType):
+      values.append("f%r" % value)
+    elif isinstance(value, types.UnicodeType):
+      values.append("u" + value.encode("utf-8"))
+    elif isinstance(value, types.StringType):
+      values.append("s" + value)
+    else:
+      raise ValueError, "can not encode %r" % (value,)
+  return base64.urlsafe_b64encode("\0".join(values))
+
+def decodeKey(data):
+  """decodes a key encoded by L{encodeKey}. Raises C{ValueError} if C{data}
+  is not a valid key."""
+  try:
+    data = base64.urlsafe_b64decode(str(data))
+  except (TypeError, binascii.Error), e:
+    raise ValueError, str(e)
+  key = []
+  for value in data.split("\0"):
+    tag = value[:1]
+    if value == "n":
+      key.append(None)
+    elif tag == "b":
+      key.append(bool(int(value[1:])))
+    elif tag == "i":
+      key.append(int(value[1:]))
+    elif tag == "f":
+      key.append(float(value[1:]))
+    elif tag == "u":
+      try:
+        key.append(value[1:].decode("utf-8"))
+      except UnicodeError, e:
+        raise ValueError, str(e)
+    elif tag == "s":
+      key.append(value[1:])
+    else:
+      raise ValueError, "invalid key"
+  return tuple(key)
 
 class Table(Pager):
+  PAGING_OFFSET = "offset"
+  """Pages are selected by the offset of their first row."""
+  PAGING_KEYSET = "keyset"
+  """The links to the next and previous pages give the key of the last (or
+  first) row of the current page, so that the L{DataSource} seeks to the page
+  instead of skipping the rows before it. The other pages are still selected
+  by offset."""
   def __init__(self, klass, rowHighlighting=True):
     self.klass = klass
     self.rowHighlighting = rowHighlighting
@@ -178,6 +582,104 @@ class Table(Pager):
     return []
   def getParamNames(self):
     return [self.getOrderByParam(), self.getSortOrderParam(), self.getPageParamName()] + self.getForeignParams()
+  def getDataSource(self, req):
+    """returns the L{DataSource} of the rows of the table. The default
+    L{getListSize} and L{getItems} use it. Subclasses which override those
+    methods instead need not implement it."""
+    return None
+  def getSearchCriteria(self, req):
+    """returns the search criteria of the rows listed from the
+    L{DataSource}, or C{None} to list all of them."""
+    return None
+  def getCountKey(self, req):
+    """returns the L{cache key<pywebmvc.tools.dbutils.SearchCriteria.getCacheKey>}
+    of the L{search criteria<getSearchCriteria>}. Subclasses listing rows
+    which depend on more than the criteria (e.g. the user) should add it to
+    the key."""
+    criteria = self.getSearchCriteria(req)
+    if criteria is None:
+      return ()
+    return criteria.getCacheKey()
+  def getListSize(self, req):
+    dataSource = self.getDataSource(req)
+    if dataSource is None:
+      return 0
+    return dataSource.count(self.getSearchCriteria(req))
+  def getPagingMode(self, req):
+    """returns L{PAGING_OFFSET} or L{PAGING_KEYSET}. Keyset paging requires
+    a L{DataSource} supporting L{DataSource.fetchAfter}."""
+    return self.PAGING_OFFSET
+  def getItems(self, req, sortColumn, sortOrder, startIndex, endIndex):
+    """returns the rows from C{startIndex} (inclusive) to C{endIndex}
+    (exclusive) when sorted on C{sortColumn} in C{sortOrder}."""
+    dataSource = self.getDataSource(req)
+    if dataSource is None:
+      return []
+    criteria = self.getSearchCriteria(req)
+    if self.getPagingMode(req) != self.PAGING_KEYSET:
+      return dataSource.fetch(criteria, sortColumn, sortOrder, startIndex,
+                              endIndex - startIndex)
+    pageKey = self.getPageKey(req, sortColumn, sortOrder)
+    if pageKey is None:
+      items = dataSource.fetch(criteria, sortColumn, sortOrder, startIndex,
+                               endIndex - startIndex)
+    else:
+      (direction, key) = pageKey
+      items = dataSource.fetchAfter(criteria, sortColumn, sortOrder, key,
+                                    endIndex - startIndex, direction == "b")
+    keys = None
+    if items:
+      try:
+        keys = (self.encodePageKey(dataSource, items[0], sortColumn,
+                                   sortOrder),
+                self.encodePageKey(dataSource, items[-1], sortColumn,
+                                   sortOrder))
+      except ValueError:
+        pass
+    setattr(req, "pagerKeysFor" + self.__class__.__name__, keys)
+    return items
+  def encodePageKey(self, dataSource, row, sortColumn, sortOrder):
+    """returns the key of C{row} given in the page parameter: the sort column
+    and order followed by the L{key<DataSource.getKey>} of the row, encoded
+    with L{encodeKey}. Raises C{ValueError} if the key can not be encoded."""
+    key = dataSource.getKey(row, sortColumn)
+    if key is None:
+      raise ValueError, "the data source does not support keyset paging"
+    if sortColumn is None:
+      return encodeKey((None, sortOrder) + tuple(key))
+    return encodeKey((sortColumn.id, sortOrder) + tuple(key))
+  def getPageKey(self, req, sortColumn, sortOrder):
+    """returns the direction and the L{DataSource} key given by the page
+    parameter, or C{None} if the page is selected by offset or the key is not
+    for C{sortColumn} and C{sortOrder}."""
+    if not req.form.has_key(self.getPageParamName()):
+      return None
+    (page, direction, data) = self.parsePageParam(req)
+    if data is None or direction not in ("a", "b"):
+      return None
+    try:
+      key = decodeKey(data)
+    except ValueError:
+      return None
+    if sortColumn is None:
+      columnId = None
+    else:
+      columnId = sortColumn.id
+    if len(key) != 4 or key[:2] != (columnId, sortOrder):
+      return None
+    return (direction, key[2:])
+  def getPageParamValue(self, req, page):
+    """in L{PAGING_KEYSET} mode, adds the key of the last row of the current
+    page to the link to the next page, and the key of its first row to the
+    link to the previous page."""
+    keys = getattr(req, "pagerKeysFor" + self.__class__.__name__, None)
+    if keys:
+      current = self.getCurrentPage(req)
+      if page == current + 1:
+        return "%i~a~%s" % (page, keys[1])
+      elif page == current - 1 and page > 0:
+        return "%i~b~%s" % (page, keys[0])
+    return super(Table, self).getPageParamValue(req, page)
   def getPageParams(self,req,exclude=[]):
     params = super(Table, self).getPageParams(req,exclude)
     for paramName in [self.getOrderByParam(), self.getSortOrderParam()] + self.getForeignParams():
@@ -185,22 +687,37 @@ class Table(Pager):
         params += [(paramName, req.form[paramName])]
     return params
   def getCellValue(self, req, item, column):
-    try:
-      value = eval("item.%s" % column.property)
-    except AttributeError:
-      value = ""
+    value = column.getValue(item)
     if column.formatter:
       cellText = column.formatter(req, item, value)
     else:
       cellText = unicode(value)
     return cellText
   def getTable(self, req):
-    return """\n\n<div class="pyWebMvcWholeTable">\n""" + self.displayHeaderArea(req) +  self.displayTableContents(req) + self.getPager(req) + "\n</div>\n"
+    return "".join(self.generateTable(req))
+  def generateTable(self, req):
+    """returns a generator of the fragments of L{getTable}, one per row of the
+    table, so a page can send the table while it is rendered (see
+    L{pywebmvc.framework.core.HtmlPage.generateBody}). Subclasses which
+    override L{getTable} should not be rendered with this method."""
+    yield """\n\n<div class="pyWebMvcWholeTable">\n"""
+    yield self.displayHeaderArea(req)
+    if overrides(self, Table, "displayTableContents"):
+      yield self.displayTableContents(req)
+    else:
+      for fragment in self.generateTableContents(req):
+        yield fragment
+    yield self.getPager(req)
+    yield "\n</div>\n"
   def displayHeaderArea(self, req):
     return '<div class="pagersummary">'+self.getPagerSummary(req)+'</div>'
   def displayTableContents(self, req):
-    list = '<table class="%s" cellspacing="0" border="0" cellpadding="0">' % (self.klass)
-    list += '<thead><tr>'
+    return "".join(self.generateTableContents(req))
+  def generateTableContents(self, req):
+    """returns a generator of the fragments of L{displayTableContents}: the
+    table head, each row and the end of the table."""
+    head = htmlutil.HtmlBuffer('<table class="%s" cellspacing="0" border="0" cellpadding="0">' % (self.klass))
+    head.write('<thead><tr>')
     columns = self.getColumns(req)
     sortCol = self.getSortColumn(req,columns)
     if sortCol:
@@ -208,14 +725,14 @@ class Table(Pager):
     else:
       sortOrder = None
     for column in columns:
-      th = '<th'
+      head.write('<th')
       if column.width:
-        th += ' width="%s"' % (column.width)
+        head.write(' width="%s"' % (column.width))
       if sortCol and column.id == sortCol.id:
-        th += ' class="selected"'
+        head.write(' class="selected"')
       if column.style:
-        th += ' style="%s"' % (column.style)
-      th += '>'
+        head.write(' style="%s"' % (column.style))
+      head.write('>')
       if sortCol and column.id == sortCol.id:
         if sortOrder == "asc":
           dir = "desc"
@@ -228,34 +745,33 @@ class Table(Pager):
         params = self.getPageParams(req, exclude=[self.getSortOrderParam(), self.getOrderByParam()])
         params += [(self.getSortOrderParam(), dir), (self.getOrderByParam(), column.id)]
         paramStr = htmlutil.getParameterString(params)
-        th += '<div class="sorted">%s</div>' % (req.bundle[column.label])
-        th += '<a href="?%s" class="%s"><span>%s</span>&nbsp;</a>' % (paramStr, klass, msg)
+        head.write('<div class="sorted">%s</div>' % (req.bundle[column.label]))
+        head.write('<a href="?%s" class="%s"><span>%s</span>&nbsp;</a>' % (paramStr, klass, msg))
       else:
         params = self.getPageParams(req, exclude=[self.getSortOrderParam(), self.getOrderByParam()])
         params += [(self.getOrderByParam(), column.id)]
         paramStr = htmlutil.getParameterString(params)
         if column.sortable:
-          th += '<a href="?%s" class="sortable">%s</a>' % (
-            paramStr, req.bundle[column.label])
+          head.write('<a href="?%s" class="sortable">%s</a>' % (
+            paramStr, req.bundle[column.label]))
         else:
-          th += req.bundle[column.label]
-      th += '</th>'
-      list += th
-    list += '</tr></thead>'
-    list += '<tbody>'
+          head.write(req.bundle[column.label])
+      head.write('</th>')
+    head.write('</tr></thead>')
+    head.write('<tbody>')
+    yield head.getvalue()
     index = 0
     items = self.getItems(req,sortCol,sortOrder,self.getStartIndex(req),self.getEndIndex(req))
     if items:
       for item in items:
-        list += self._generateCellRow(req, index, item, columns)
+        yield self._generateCellRow(req, index, item, columns)
         index += 1
     else:
-      list += '<tr><td colspan="%i">%s</td></tr>' % (
+      yield '<tr><td colspan="%i">%s</td></tr>' % (
         len(columns),
         req.bundle.getMessage("pywebmvc.tools.table.message.emptyList", self.getTypeString(req)))
-    list += self.bottomOfTableHook(req)
-    list += '</tbody></table>'
-    return list
+    yield self.bottomOfTableHook(req)
+    yield '</tbody></table>'
   def getCellRowEventHandlers(self, req, index, item, rowClass):
     if self.rowHighlighting:
       handlers = {"onmouseover" : "this.className = 'hovered'",
@@ -265,24 +781,29 @@ class Table(Pager):
     return handlers
   def _generateCellRow(self, req, index, item, columns):
     rowClass = self.getRowClass(req, index, item)
-    tr = """<tr class="%s\"""" % (rowClass)
+    tr = ["""<tr class="%s\"""" % (rowClass)]
     handlers = self.getCellRowEventHandlers(req, index, item, rowClass)
     for key in handlers.keys():
-      tr += """ %s="%s\"""" % (key, handlers[key])
-    tr += ">"
+      tr.append(""" %s="%s\"""" % (key, handlers[key]))
+    tr.append(">")
+    cellMarkup = overrides(self, Table, "getCellMarkup")
     for column in columns:
       cellText = self.getCellValue(req, item, column)
       if column.maxlength:
         cellText = self.doTruncate(cellText, column.maxlength)
       attrs = ""
-      if column.align:
-        attrs = ' style="text-align: %s;"' % column.align
       if column.style:
         attrs = ' style="%s"' % (column.style)
-      (markupStart, markupEnd) = self.getCellMarkup(req, item, column)
-      tr += '<td%s>%s%s%s</td>' % (attrs, markupStart, cellText, markupEnd)
-    tr += '</tr>'
-    return tr
+      elif column.align:
+        attrs = ' style="text-align: %s;"' % column.align
+      if cellMarkup:
+        (markupStart, markupEnd) = self.getCellMarkup(req, item, column)
+        tr.append('<td%s>%s%s%s</td>' % (attrs, markupStart, cellText,
+                                         markupEnd))
+      else:
+        tr.append('<td%s>%s</td>' % (attrs, cellText))
+    tr.append('</tr>')
+    return "".join(tr)
   def bottomOfTableHook(self, req):
     return ""
   def doTruncate(self, cellText, length):
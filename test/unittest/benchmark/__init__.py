@@ -0,0 +1,6 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Micro-benchmarks for pywebmvc hot paths. Each module can be run as a
+script (see C{make bench})."""
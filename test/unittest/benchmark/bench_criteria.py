@@ -0,0 +1,58 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Compares filtering objects with a compiled search criteria tree
+(L{SearchCriteria.filter<pywebmvc.tools.dbutils.SearchCriteria.filter>})
+with building and evaluating python source for each object and criterion,
+as C{accepts} did before the criteria were compiled."""
+
+ITEMS = 1000
+NUMBER = 20
+
+class Item(object):
+  def __init__(self, i):
+    self.name = "name%i" % i
+    self.city = ("Paris", "Lyon", "Nice")[i % 3]
+    self.age = i % 90
+
+def evalAccepts(criteria, obj):
+  """the evaluation of the criteria before they were compiled."""
+  from pywebmvc.tools.dbutils import BasicSearchCriteria, AndSearchCriteria, \
+                                     OrSearchCriteria
+  if isinstance(criteria, AndSearchCriteria):
+    return evalAccepts(criteria.criteria1, obj) and \
+           evalAccepts(criteria.criteria2, obj)
+  if isinstance(criteria, OrSearchCriteria):
+    return evalAccepts(criteria.criteria1, obj) or \
+           evalAccepts(criteria.criteria2, obj)
+  pyOp = criteria.operator
+  if pyOp == BasicSearchCriteria.OP_EQUAL:
+    pyOp = "=="
+  if pyOp == BasicSearchCriteria.OP_LIKE:
+    toEval = "unicode(obj.%s).lower().find(%s) != -1" % (criteria.property,
+      repr(unicode(criteria.value.replace("%", "")).lower()))
+  else:
+    toEval = "unicode(obj.%s) %s %s" % (criteria.property, pyOp,
+                                        repr(unicode(criteria.value)))
+  return eval(toEval)
+
+def run():
+  from pywebmvc.tools.dbutils import BasicSearchCriteria as Basic, \
+                                     AndSearchCriteria, OrSearchCriteria
+  from benchutils import timeit, report
+  items = [Item(i) for i in xrange(ITEMS)]
+  criteria = AndSearchCriteria(
+    Basic("name", Basic.OP_LIKE, "%ME1%"),
+    OrSearchCriteria(Basic("city", Basic.OP_EQUAL, "Paris"),
+                     Basic("age", Basic.OP_GREATER_THAN, "50")))
+  assert criteria.filter(items) == \
+         [item for item in items if evalAccepts(criteria, item)]
+  report("eval per object (%i objects)" % ITEMS,
+         timeit(lambda: [item for item in items if evalAccepts(criteria, item)],
+                NUMBER))
+  report("SearchCriteria.filter (%i objects)" % ITEMS,
+         timeit(lambda: criteria.filter(items), NUMBER))
+
+if __name__ == "__main__":
+  run()
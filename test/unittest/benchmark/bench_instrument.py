@@ -0,0 +1,47 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Measures the cost of the L{instrument<pywebmvc.framework.instrument>} on
+L{getMessage<pywebmvc.framework.resourcebundle.ResourceBundle.getMessage>},
+the most frequent span: without a request being timed, in a request that is
+not sampled and in a sampled request, compared with the lookup it times."""
+import StringIO
+
+NUMBER = 100000
+
+def run():
+  from pywebmvc.framework.resourcebundle import ResourceBundle
+  from pywebmvc.framework.instrument import Instrument, HistogramSink
+  from pywebmvc.framework import instrument as instrumentModule
+  from benchutils import timeit, report
+  bundle = ResourceBundle(StringIO.StringIO("hello=Hello {0}.\n"))
+  def uninstrumented(key = "hello", *args, **kwargs):
+    #getMessage before it was timed
+    message = bundle.compile(key)
+    if kwargs and message.hasTerms:
+      return bundle.substituteParams(bundle.replaceTerms(message.text, kwargs),
+                                     args)
+    return message.format(args)
+  def lookup():
+    bundle.getMessage("hello", "world")
+  assert uninstrumented("hello", "world") == bundle.getMessage("hello", "world")
+  report("uninstrumented lookup",
+         timeit(lambda: uninstrumented("hello", "world"), NUMBER))
+  report("lookup outside a request", timeit(lookup, NUMBER))
+  instrument = instrumentModule.instrument
+  instrument.addSink(HistogramSink())
+  try:
+    instrument.sampleRate = 0
+    instrument.begin("/page")
+    report("lookup in a request not sampled", timeit(lookup, NUMBER))
+    instrument.end()
+    instrument.sampleRate = 1
+    instrument.begin("/page")
+    report("lookup in a sampled request", timeit(lookup, NUMBER))
+    instrument.end()
+  finally:
+    instrument.sinks = []
+
+if __name__ == "__main__":
+  run()
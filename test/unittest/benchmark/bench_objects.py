@@ -0,0 +1,43 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Compares the cost of creating per-request framework objects with instance
+tracking on (the default) and off (C{PYWEBMVC_AUTORELOAD=off}). Each mode is
+run in its own interpreter because the base class is chosen at import time."""
+import os, sys
+
+NUMBER = 100000
+
+def run():
+  from pywebmvc.framework import util
+  from pywebmvc.framework.core import ActionError, ActionErrors, \
+                                      ActionForward, AppendQueryForward
+  from benchutils import timeit, report
+  mode = util.AUTO_RELOAD and "tracking" or "no tracking"
+  forward = ActionForward(None)
+  report("ActionError() [%s]" % mode,
+         timeit(lambda: ActionError("field", "message"), NUMBER))
+  report("ActionErrors() [%s]" % mode,
+         timeit(lambda: ActionErrors(), NUMBER))
+  report("AppendQueryForward() [%s]" % mode,
+         timeit(lambda: AppendQueryForward(None, forward, "a=b"), NUMBER))
+  error = ActionError("field", "message")
+  if hasattr(sys, "getsizeof"):
+    size = sys.getsizeof(error)
+    if hasattr(error, "__dict__"):
+      size += sys.getsizeof(error.__dict__)
+    print "%-50s %10i bytes" % ("ActionError size [%s]" % mode, size)
+  if util.AUTO_RELOAD:
+    print "%-50s %10i" % ("ActionError refs retained [%s]" % mode,
+                          len(ActionError.__instance_refs__))
+
+if __name__ == "__main__":
+  if len(sys.argv) > 1 and sys.argv[1] == "run":
+    run()
+  else:
+    for setting in ("on", "off"):
+      os.environ["PYWEBMVC_AUTORELOAD"] = setting
+      sys.stdout.flush()
+      os.spawnv(os.P_WAIT, sys.executable,
+                [sys.executable, os.path.abspath(__file__), "run"])
@@ -0,0 +1,103 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Compares building markup by concatenating each fragment to the markup
+written so far with writing the fragments to an
+L{HtmlBuffer<pywebmvc.framework.htmlutil.HtmlBuffer>} joined once, for a
+table of 1000 rows and for a form of 500 text fields, both with unicode
+values."""
+
+ROWS = 1000
+FIELDS = 500
+NUMBER = 20
+
+class Bundle(object):
+  def __getitem__(self, key):
+    return u"Label"
+  def getMessage(self, key, *args):
+    return u" ".join(args)
+
+class Request(object):
+  def __init__(self):
+    self.form = {}
+    self.bundle = Bundle()
+    self.session = {}
+
+class Item(object):
+  def __init__(self, i):
+    self.name = u"Na\xefve %i" % i
+    self.city = u"Z\xfcrich"
+    self.number = i
+
+class Mapping(object):
+  def __init__(self, rendererFactory):
+    self.rendererFactory = rendererFactory
+
+class RendererFactory(object):
+  def __init__(self, renderer):
+    self.renderer = renderer
+  def getRenderer(self, type, req, mapping, name):
+    return self.renderer
+
+def concatenate(fragments):
+  """the concatenation the buffer replaced."""
+  html = u""
+  for fragment in fragments:
+    html += fragment
+  return html
+
+def renderListConcatenated(request, mapping, name, values, cssClass):
+  """the L{MutableListRenderer} before it wrote to a buffer."""
+  index = 0
+  html = ""
+  elementRenderer = mapping.rendererFactory.getRenderer(None, request,
+                                                        mapping, name)
+  for v in values:
+    html += '<div style="white-space: nowrap">'
+    html += elementRenderer.render(request, mapping, name, v, cssClass)
+    html += '<span>'
+    if len(values) > 1:
+      html += '<button type="button" dontSubmit="true" onclick="delRow(this, event)">-</button>'
+    if index + 1 == len(values):
+      html += '<button type="button" dontSubmit="true" onclick="addRow(this, event)">+</button>'
+    html += "</span></div>"
+    index += 1
+  return html
+
+def run():
+  from pywebmvc.tools.table import Table, Column, ListDataSource
+  from pywebmvc.framework.render import MutableListRenderer
+  from pywebmvc.framework.render.widget import TextInputRenderer
+  from benchutils import timeit, report
+  items = [Item(i) for i in xrange(ROWS)]
+  class BenchTable(Table):
+    def getDataSource(self, req):
+      return ListDataSource(items)
+    def getColumns(self, req):
+      return [Column("name", "label.name", "name", primary = True),
+              Column("city", "label.city", "city"),
+              Column("number", "label.number", "number")]
+  table = BenchTable("list")
+  req = Request()
+  req.pageSizeForBenchTable = ROWS
+  assert concatenate(table.generateTable(req)) == table.getTable(req)
+  report("+= table (%i rows)" % ROWS,
+         timeit(lambda: concatenate(table.generateTable(req)), NUMBER))
+  report("Table.getTable (%i rows)" % ROWS,
+         timeit(lambda: table.getTable(req), NUMBER))
+
+  mapping = Mapping(RendererFactory(TextInputRenderer()))
+  renderer = MutableListRenderer(None)
+  values = [u"Gr\xfc\xdfe %i" % i for i in xrange(FIELDS)]
+  assert renderListConcatenated(req, mapping, "field", values, None) == \
+         renderer.render(req, mapping, "field", values, None)
+  report("+= text fields (%i fields)" % FIELDS,
+         timeit(lambda: renderListConcatenated(req, mapping, "field", values,
+                                               None), NUMBER))
+  report("MutableListRenderer (%i fields)" % FIELDS,
+         timeit(lambda: renderer.render(req, mapping, "field", values, None),
+                NUMBER))
+
+if __name__ == "__main__":
+  run()
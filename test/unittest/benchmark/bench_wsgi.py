@@ -0,0 +1,87 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Load test of the WSGI adapter. Serves a small configuration with a threaded
+C{wsgiref} server and requests a page from several client threads at once,
+each keeping its own session. Reports the throughput and the latency for each
+number of concurrent clients. Run from the top of the source tree, like the
+unit tests, so that the test configuration is found."""
+import time, threading, httplib
+
+REQUESTS = 200
+CONCURRENCY = (1, 4, 16)
+
+def startServer(application):
+  from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+  from SocketServer import ThreadingMixIn
+  class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+  class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+      pass
+  server = ThreadingWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+  server.set_app(application)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.setDaemon(True)
+  thread.start()
+  return server.server_address[1]
+
+def client(port, count, latencies, failures):
+  cookie = None
+  connection = httplib.HTTPConnection("127.0.0.1", port)
+  for i in xrange(count):
+    headers = {}
+    if cookie:
+      headers["Cookie"] = cookie
+    start = time.time()
+    connection.request("GET", "/stubbed.tst", headers = headers)
+    response = connection.getresponse()
+    response.read()
+    latencies.append(time.time() - start)
+    if response.status != 200:
+      failures.append(response.status)
+    if response.getheader("Set-Cookie"):
+      cookie = response.getheader("Set-Cookie").split(";")[0]
+    if response.getheader("Connection", "").lower() == "close" or \
+       response.version < 11:
+      connection.close()
+      connection = httplib.HTTPConnection("127.0.0.1", port)
+  connection.close()
+
+def run(port, concurrency):
+  latencies = []
+  failures = []
+  threads = []
+  start = time.time()
+  for i in range(concurrency):
+    thread = threading.Thread(target=client, args=(
+      port, REQUESTS / concurrency, latencies, failures))
+    thread.start()
+    threads.append(thread)
+  for thread in threads:
+    thread.join()
+  elapsed = time.time() - start
+  latencies.sort()
+  mean = sum(latencies) / len(latencies)
+  p95 = latencies[int(len(latencies) * 0.95) - 1]
+  print "%-30s %8.1f req/s %8.2f ms mean %8.2f ms p95 %4i failed" % (
+    "GET /stubbed.tst [%i clients]" % concurrency,
+    len(latencies) / elapsed, mean * 1000, p95 * 1000, len(failures))
+
+def main():
+  try:
+    import wsgiref
+  except ImportError:
+    print "wsgiref is not available (python 2.5 or later), skipping."
+    return
+  from pywebmvc.framework.wsgi import WsgiApplication
+  port = startServer(WsgiApplication({
+    "pyWebMvcConfig" : "test/data/config.xml",
+    "pyWebMvcExtension" : "tst"
+  }))
+  for concurrency in CONCURRENCY:
+    run(port, concurrency)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,17 @@
+#  START OF COPYRIGHT NOTICE
+#  Copyright (c) 2004-2005. Teneros, Inc.
+#  All Rights Reserved.
+#  END OF COPYRIGHT NOTICE 
+"""Timing helpers shared by the benchmark scripts."""
+import time
+
+def timeit(func, number):
+  """returns the average number of seconds a call to C{func} takes over
+  C{number} calls."""
+  start = time.time()
+  for i in xrange(number):
+    func()
+  return (time.time() - start) / number
+
+def report(name, seconds):
+  print "%-50s %10.2f usec" % (name, seconds * 1000000)
@@ -8,6 +8,16 @@ from test_core import suite as coreSuite
 from test_util import suite as utilSuite
 from test_formutils import suite as formutilsSuite
 from test_properties import suite as propertiesSuite
+from test_resourcebundle import suite as resourcebundleSuite
+from test_wsgi import suite as wsgiSuite
+from test_apache import suite as apacheSuite
+from test_session import suite as sessionSuite
+from test_configcache import suite as configcacheSuite
+from test_metadata import suite as metadataSuite
+from test_validate import suite as validateSuite
+from test_widget import suite as widgetSuite
+from test_form import suite as formSuite
+from test_instrument import suite as instrumentSuite
 
 loader = unittest.TestLoader()
 suite = unittest.TestSuite()
@@ -15,6 +25,16 @@ suite.addTest(coreSuite)
 suite.addTest(utilSuite)
 suite.addTest(formutilsSuite)
 suite.addTest(propertiesSuite)
+suite.addTest(resourcebundleSuite)
+suite.addTest(wsgiSuite)
+suite.addTest(apacheSuite)
+suite.addTest(sessionSuite)
+suite.addTest(configcacheSuite)
+suite.addTest(metadataSuite)
+suite.addTest(validateSuite)
+suite.addTest(widgetSuite)
+suite.addTest(formSuite)
+suite.addTest(instrumentSuite)
 
 if __name__ == "__main__":
   runner = unittest.TextTestRunner()
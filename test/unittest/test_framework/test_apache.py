@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import unittest, StringIO
+try:
+  from pywebmvc.framework import apache
+except ImportError:
+  #mod_python is not installed
+  apache = None
+
+from pywebmvc.unittest.testutils import *
+
+
+def createField(name, value):
+  return apache.Field(name, StringIO.StringIO(value), "text/plain", {}, None,
+                      {})
+
+class TestFieldStorage(PyWebMvcTestCase):
+  def getForm(self, *fields):
+    form = apache.FieldStorage(defaultCharset = "utf-8")
+    form.list = [createField(name, value) for (name, value) in fields]
+    form.original_list = form.list[:]
+    return form
+  def testLookup(self):
+    form = self.getForm(("one", "1"), ("two", "2"), ("two", "\xc3\xa9"))
+    self.assertEqual(form.keys(), ["one", "two"])
+    self.assertEqual(form["one"], u"1")
+    self.assertEqual(form["two"], [u"2", u"é"])
+    self.assertFalse(form.has_key("three"))
+    self.assertRaises(KeyError, form.__getitem__, "three")
+  def testUndecodableField(self):
+    form = self.getForm(("name", "ok"), ("junk", "\xff\xfe"))
+    self.assertEqual(form["name"], u"ok")
+    self.assertTrue(form.has_key("name"))
+    self.assertTrue(form.has_key("junk"))
+    self.assertEqual(form.keys(), ["name", "junk"])
+    self.assertRaises(UnicodeDecodeError, form.__getitem__, "junk")
+  def testSetItem(self):
+    form = self.getForm(("one", "1"))
+    self.assertEqual(form["one"], u"1")
+    form["one"] = u"é"
+    self.assertEqual(form["one"], u"é")
+    form["two"] = [u"2", "3"]
+    self.assertEqual(form["two"], [u"2", u"3"])
+    form["three"] = (u"3",)
+    self.assertEqual(form["three"], u"3")
+    self.assertEqual(form.keys(), ["one", "two", "three"])
+    self.assertRaises(TypeError, form.__setitem__, "four", 4)
+  def testDelItem(self):
+    form = self.getForm(("one", "1"), ("two", "2"), ("one", "3"))
+    self.assertEqual(form["one"], [u"1", u"3"])
+    del form["one"]
+    self.assertFalse(form.has_key("one"))
+    self.assertEqual(form.keys(), ["two"])
+    self.assertEqual([item.name for item in form.list], ["two"])
+    form["one"] = "4"
+    self.assertEqual(form["one"], u"4")
+  def testReset(self):
+    form = self.getForm(("one", "1"))
+    form["one"] = "2"
+    form["two"] = "2"
+    form.reset()
+    self.assertEqual(form.keys(), ["one"])
+    self.assertEqual(form["one"], u"1")
+  def testListReplaced(self):
+    form = self.getForm(("one", "1"))
+    self.assertEqual(form["one"], u"1")
+    form.list = [createField("one", "2"), createField("two", "3")]
+    self.assertEqual(form["one"], u"2")
+    self.assertEqual(form.keys(), ["one", "two"])
+    form.list.append(createField("three", "4"))
+    self.assertEqual(form["three"], u"4")
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+if apache:
+  suite.addTest(loader.loadTestsFromTestCase(TestFieldStorage))
@@ -0,0 +1,161 @@
+import unittest, os, shutil, tempfile, threading, time, types, weakref
+from xml.dom import Node
+
+from pywebmvc.framework.configcache import *
+from pywebmvc.framework.parser import readConfigFromFile
+from pywebmvc.unittest.testutils import *
+
+
+class TestConfigCache(PyWebMvcTestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.propertiesFile = os.path.join(self.directory, "Messages.properties")
+    self.writeFile(self.propertiesFile, "message.hello=Hello {0}.\n")
+    config = open("test/data/config.xml").read()
+    config = config.replace("<mvc-config>", """<mvc-config>
+  <resources>
+    <resource-bundle locale="en">
+      <properties path="%s"/>
+    </resource-bundle>
+  </resources>""" % self.propertiesFile)
+    self.configFile = os.path.join(self.directory, "config.xml")
+    self.writeFile(self.configFile, config)
+    self.cacheFile = os.path.join(self.directory, "config.cache")
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+  def writeFile(self, path, data):
+    file = open(path, "w")
+    file.write(data)
+    file.close()
+  def readConfig(self):
+    return readConfigFromFile(self.configFile, None, "tst", self.cacheFile)
+  def assertConfig(self, config, message):
+    mapping = config.getActionMappingByPath("/stubbed")
+    self.assertEqual(mapping.id, "stubbed")
+    forwards = mapping.forwards.keys()
+    forwards.sort()
+    self.assertEqual(forwards, ["simple", "success"])
+    self.assertEqual(config.getTypeMetadata("integer").input, "text")
+    self.assertEqual(config.bundleManager.getBundle("en").getMessage(
+      "message.hello", "world"), message)
+  def testCache(self):
+    self.assertEqual(loadConfigSource(self.configFile, self.cacheFile), None)
+    self.assertConfig(self.readConfig(), "Hello world.")
+    source = loadConfigSource(self.configFile, self.cacheFile)
+    self.assertTrue(source.cached)
+    files = source.files.keys()
+    files.sort()
+    self.assertEqual(files, [self.propertiesFile, self.configFile])
+    self.assertEqual(source.document.getElementsByTagName("action")[0]
+                     .getAttribute("path"), "/stubbed")
+    self.assertConfig(self.readConfig(), "Hello world.")
+  def testStaleProperties(self):
+    self.readConfig()
+    self.writeFile(self.propertiesFile, "message.hello=Hi {0}!\n")
+    self.assertEqual(loadConfigSource(self.configFile, self.cacheFile), None)
+    self.assertConfig(self.readConfig(), "Hi world!")
+    self.assertTrue(loadConfigSource(self.configFile, self.cacheFile).cached)
+  def testTouchedFile(self):
+    self.readConfig()
+    later = time.time() + 10
+    os.utime(self.configFile, (later, later))
+    self.assertTrue(loadConfigSource(self.configFile, self.cacheFile).cached)
+  def testConcurrentSave(self):
+    self.readConfig()
+    source = loadConfigSource(self.configFile, self.cacheFile)
+    errors = []
+    def save():
+      try:
+        for i in range(20):
+          source.save(self.cacheFile)
+      except Exception, e:
+        errors.append(e)
+    threads = [threading.Thread(target = save) for i in range(4)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(errors, [])
+    self.assertEqual(os.listdir(self.directory).count("config.cache"), 1)
+    self.assertEqual(len(os.listdir(self.directory)), 3)
+    self.assertTrue(loadConfigSource(self.configFile, self.cacheFile).cached)
+  def testCorruptCache(self):
+    self.writeFile(self.cacheFile, "not a cache")
+    self.assertEqual(loadConfigSource(self.configFile, self.cacheFile), None)
+    self.assertConfig(self.readConfig(), "Hello world.")
+
+def describe(value, seen):
+  """returns a string describing the objects reachable from C{value}, used to
+  compare configurations."""
+  if isinstance(value, (types.StringTypes, int, long, float, bool,
+                        types.NoneType)):
+    return repr(value)
+  if isinstance(value, (types.FunctionType, types.MethodType, type,
+                        types.ClassType)):
+    return value.__name__
+  if isinstance(value, (weakref.ProxyType, weakref.ReferenceType)):
+    return "<weakref>"
+  if hasattr(value, "pattern"):
+    return value.pattern
+  if seen.has_key(id(value)):
+    return "<%s>" % type(value).__name__
+  seen[id(value)] = value
+  if isinstance(value, dict):
+    keys = value.keys()
+    keys.sort()
+    return "{%s}" % ",".join(["%s:%s" % (describe(key, seen),
+                                         describe(value[key], seen))
+                              for key in keys])
+  if isinstance(value, (list, tuple)):
+    return "[%s]" % ",".join([describe(item, seen) for item in value])
+  state = dict(getattr(value, "__dict__", {}))
+  for cls in type(value).__mro__:
+    slots = cls.__dict__.get("__slots__", ())
+    if isinstance(slots, types.StringTypes):
+      slots = (slots,)
+    for name in slots:
+      if name not in ("__dict__", "__weakref__") and hasattr(value, name):
+        state[name] = getattr(value, name)
+  return type(value).__name__ + describe(state, seen)
+
+class TestSaxParser(PyWebMvcTestCase):
+  def testDocument(self):
+    directory = tempfile.mkdtemp()
+    try:
+      configFile = os.path.join(directory, "config.xml")
+      file = open(configFile, "w")
+      file.write("""<?xml version="1.0"?>
+<!-- comment -->
+<mvc-config a="x &amp; y">
+  <value>a &lt; b</value>
+  <value><![CDATA[x < y]]></value>
+  <value>pre<![CDATA[cd]]>post</value>
+  <value><!--c-->after<?pi data?></value>
+  <empty/>
+</mvc-config>
+""")
+      file.close()
+      minidomDocument = parseMinidom(configFile)
+      saxDocument = parseSax(configFile)
+      self.assertEqual(nodeToTuple(saxDocument), nodeToTuple(minidomDocument))
+      values = saxDocument.getElementsByTagName("value")
+      self.assertEqual(len(values), 4)
+      self.assertEqual(values[1].firstChild.nodeType, Node.CDATA_SECTION_NODE)
+      self.assertEqual(saxDocument.getElementsByTagName("mvc-config")[0]
+                       .getAttribute("a"), u"x & y")
+    finally:
+      shutil.rmtree(directory)
+  def testConfiguration(self):
+    minidomConfig = readConfigFromFile("test/data/config.xml", None, "tst",
+                                       None, "minidom")
+    saxConfig = readConfigFromFile("test/data/config.xml", None, "tst",
+                                   None, "sax")
+    self.assertEqual(describe(saxConfig, {}), describe(minidomConfig, {}))
+  def testUnknownParser(self):
+    self.assertRaises(ValueError, readConfigFromFile, "test/data/config.xml",
+                      None, "tst", None, "dom4j")
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestConfigCache))
+suite.addTest(loader.loadTestsFromTestCase(TestSaxParser))
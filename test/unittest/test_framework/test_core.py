@@ -1,4 +1,4 @@
-import unittest, os, warnings, pmock
+import unittest, os, warnings, pmock, cPickle
 
 from pywebmvc.framework.core import *
 from pywebmvc.framework import metadata
@@ -105,6 +105,37 @@ class TestActionMapping(PyWebMvcTestCase):
     self.config.extension = "ptz"
     self.assertEqual(self.path+".ptz",self.actionMapping.getUrl())
 
+class TestPyWebMvcConfiguration(PyWebMvcTestCase):
+  def setUp(self):
+    self.config = PyWebMvcConfiguration(None, "ptz")
+  def addMapping(self, id, path):
+    mapping = ActionMapping(id, path, Dummy, self.config)
+    self.config.addActionMapping(mapping)
+    return mapping
+  def testGetActionMappingByPath(self):
+    first = self.addMapping("first", "/first")
+    second = self.addMapping("second", "/path/to/second")
+    self.assertEqual(self.config.getActionMappingByPath("/first"), first)
+    self.assertEqual(self.config.getActionMappingByPath("/path/to/second"),
+                     second)
+  def testActionNotFound(self):
+    self.addMapping("first", "/first")
+    exceptionRaised = False
+    try:
+      self.config.getActionMappingByPath("/first/")
+    except ActionNotFoundException:
+      exceptionRaised = True
+    self.assertTrue(exceptionRaised)
+  def testDuplicatePath(self):
+    self.addMapping("first", "/first")
+    exceptionRaised = False
+    try:
+      self.addMapping("second", "/first")
+    except PyWebMvcInvalidConfigurationException:
+      exceptionRaised = True
+    self.assertTrue(exceptionRaised)
+    self.assertEqual(self.config.getActionMappingByPath("/first").id, "first")
+
 class TestActionErrors(PyWebMvcTestCase):
   def setUp(self):
     self.errors = ActionErrors()
@@ -131,6 +162,53 @@ class TestActionErrors(PyWebMvcTestCase):
     self.assertTrue(not self.errors.hasError("nosuchkey"))
     self.assertTrue(not self.errors.hasError(key3, index3 + 1))
     self.assertEqual(len(self.errors.getErrors(key2)), 2)
+  def testIndexes(self):
+    errors = ActionErrors()
+    errors.add(ActionError("list", "a"))
+    errors.add(ActionError("list", "b", 1))
+    for error in errors:
+      if error.index is None:
+        error.index = 0
+    self.errors.addAll(errors)
+    self.assertTrue(self.errors.hasError("list", 0))
+    self.assertTrue(not self.errors.hasError("list", -1))
+    self.errors.add(ActionError("list", "c"))
+    self.errors.add(ActionError("list", "d", 1))
+    self.assertEqual([e.message for e in self.errors.getErrors("list")],
+                     ["a", "b", "c", "d"])
+    self.assertEqual([e.message for e in self.errors.getErrors("list", 1)],
+                     ["b", "d"])
+    self.assertEqual([e.message for e in self.errors.getErrors("list", -1)],
+                     ["c"])
+    self.errors.getErrors("list").pop()
+    self.assertEqual(len(self.errors.getErrors("list")), 4)
+    self.errors.removeAll()
+    self.assertTrue(not self.errors.hasError("list"))
+    self.assertEqual(self.errors.getErrors("list", 1), [])
+
+class TestPickling(PyWebMvcTestCase):
+  def roundTrips(self, value):
+    return [cPickle.loads(cPickle.dumps(value, protocol))
+            for protocol in (0, 1, 2)]
+  def testActionErrors(self):
+    errors = ActionErrors()
+    errors.add(ActionError("name", "error.required"))
+    errors.add(ActionError("list", "error.digits", 1))
+    self.assertTrue(errors.hasError("name"))
+    for copy in self.roundTrips(errors):
+      self.assertEqual([(e.key, e.message, e.index) for e in copy],
+                       [("name", "error.required", None),
+                        ("list", "error.digits", 1)])
+      self.assertEqual(copy.errorsByKey, None)
+      self.assertTrue(copy.hasError("list", 1))
+      copy.add(ActionError("name", "error.length"))
+      self.assertEqual(len(copy.getErrors("name")), 2)
+  def testForwards(self):
+    for copy in self.roundTrips(ExternalForward(None, "http://localhost/")):
+      self.assertTrue(isinstance(copy, ExternalForward))
+      self.assertEqual(copy.getUrl(), "http://localhost/")
+      self.assertTrue(copy.redirect)
+      self.assertEqual(copy.mapping, None)
 
 class ConcreteDispatchAction(DispatchAction):
   def concrete(self, req, mapping):
@@ -162,12 +240,103 @@ class TestDefaultPage(HtmlPageTestCase):
     html = self.page.render(self.request, self.mapping)
     self.validateHtml(html)
 
+class RecordingRequest(Dummy):
+  def __init__(self, options):
+    self.options = options
+    self.charset = "utf-8"
+    self.headers_out = {}
+    self.contentLength = None
+    self.written = []
+    self.logged = []
+  def get_options(self):
+    return self.options
+  def set_content_length(self, length):
+    self.contentLength = length
+  def send_http_header(self):
+    self.writtenBeforeHeader = len(self.written)
+  def write(self, data):
+    self.written.append(data)
+  def log_error(self, message):
+    self.logged.append(message)
+
+class RowsPage(HtmlPage):
+  rows = 100
+  def getBase(self, req, mapping):
+    return None
+  def generateBody(self, req, mapping):
+    yield self.getBodyStart(req, mapping)
+    for i in range(self.rows):
+      yield u"<p>row %i \u00e9</p>" % i
+    yield self.getBodyEnd(req, mapping)
+
+class LargePage(HtmlPage):
+  def getBase(self, req, mapping):
+    return None
+  def getBodyStart(self, req, mapping):
+    return "<body>" + "<p>row</p>" * 10000
+
+class TestPageStreaming(PyWebMvcTestCase):
+  def setUp(self):
+    self.page = RowsPage()
+  def testBufferedPage(self):
+    req = RecordingRequest({})
+    self.page(req, None)
+    self.assertEqual(req.writtenBeforeHeader, 0)
+    self.assertEqual(len(req.written), 1)
+    self.assertEqual(req.written[0], self.page.render(req, None))
+    self.assertEqual(req.contentLength, len(req.written[0]))
+  def testStreamedPage(self):
+    req = RecordingRequest({"pyWebMvcBufferSize" : "256"})
+    self.page(req, None)
+    self.assertTrue(len(req.written) > 1)
+    self.assertEqual("".join(req.written), self.page.render(req, None))
+    self.assertEqual(req.contentLength, None)
+  def testStreamingOptIn(self):
+    req = RecordingRequest({})
+    page = LargePage()
+    page(req, None)
+    self.assertEqual(req.written, [page.render(req, None)])
+    self.assertEqual(req.contentLength, len(req.written[0]))
+    req = RecordingRequest({})
+    page = RowsPage()
+    page.rows = 5000
+    page(req, None)
+    self.assertTrue(len(req.written) > 1)
+    self.assertEqual(req.contentLength, None)
+    req = RecordingRequest({"pyWebMvcBufferSize" : "256"})
+    LargePage()(req, None)
+    self.assertTrue(len(req.written) > 1)
+  def testErrorAfterHeaders(self):
+    class FailingPage(RowsPage):
+      def generateBody(self, req, mapping):
+        for fragment in RowsPage.generateBody(self, req, mapping):
+          yield fragment
+        raise ValueError("lost the database")
+    req = RecordingRequest({"pyWebMvcBufferSize" : "256"})
+    FailingPage()(req, None)
+    self.assertTrue(len(req.written) > 1)
+    self.assertEqual(len(req.logged), 1)
+    self.assertTrue("lost the database" in req.logged[0])
+    req = RecordingRequest({})
+    self.assertRaises(ValueError, FailingPage(), req, None)
+    self.assertEqual(req.written, [])
+  def testRenderOverride(self):
+    class RenderedPage(RowsPage):
+      def render(self, req, mapping):
+        return "rendered"
+    req = RecordingRequest({"pyWebMvcBufferSize" : "1"})
+    RenderedPage()(req, None)
+    self.assertEqual(req.written, ["rendered"])
+
 loader = unittest.TestLoader()
 suite = unittest.TestSuite()
 suite.addTest(loader.loadTestsFromTestCase(TestExceptions))
 suite.addTest(loader.loadTestsFromTestCase(TestErrorHandler))
 suite.addTest(loader.loadTestsFromTestCase(TestActionMapping))
+suite.addTest(loader.loadTestsFromTestCase(TestPyWebMvcConfiguration))
 suite.addTest(loader.loadTestsFromTestCase(TestActionErrors))
+suite.addTest(loader.loadTestsFromTestCase(TestPickling))
 suite.addTest(loader.loadTestsFromTestCase(TestDispatchAction))
 suite.addTest(loader.loadTestsFromTestCase(TestDefaultPage))
+suite.addTest(loader.loadTestsFromTestCase(TestPageStreaming))
 
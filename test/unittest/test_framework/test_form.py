@@ -0,0 +1,147 @@
+import unittest, StringIO
+
+from pywebmvc.framework.metadata import *
+from pywebmvc.framework.render import Renderer
+from pywebmvc.framework.render.factory import RendererFactory
+from pywebmvc.framework.render.form import *
+from pywebmvc.framework.resourcebundle import ResourceBundle
+from pywebmvc.framework.util import TabIndexTable
+from pywebmvc.framework.validate import createEnumValidator
+from pywebmvc.unittest.testutils import *
+
+
+class Request(object):
+  def __init__(self, form, bundle):
+    self.form = form
+    self.bundle = bundle
+
+class Mapping(object):
+  def __init__(self, form):
+    self.form = form
+    self.rendererFactory = RendererFactory()
+  def getFormMetadata(self, req):
+    return self.form
+
+TEXT = TypeMetadata("text", "text", 20, None)
+
+def createField(form, id):
+  form.tabIndexTable.add(id)
+  return FieldMetadata(id, None, False, None, None, TEXT, "label." + id,
+                       None, False)
+
+def renderFieldMarkup(renderer, req, mapping, metadata, **kwargs):
+  """the default field markup, as renderField wrote it before it was
+  compiled."""
+  return """<div id=\""""+metadata.id+"""_field" class="pyWebMvcField">
+              <div class="pyWebMvcLabel">
+              """ + renderer.label(req, mapping, metadata.id) + """
+              """ + renderer.instruction(req, mapping, metadata.id) + """
+              </div><div class="pyWebMvcWidget">
+              """ + renderer.widget(req, mapping, metadata.id, **kwargs) + """
+              """ + renderer.renderErrors(req, mapping, metadata.id) + """
+              </div>
+              </div>"""
+
+def renderUncompiled(renderer, req, mapping, metadataGroup, **kwargs):
+  """renders the children of C{metadataGroup} one by one without a render
+  plan."""
+  fields = ""
+  for id in metadataGroup.order:
+    metadata = metadataGroup[id]
+    if isinstance(metadata, FieldMetadata):
+      fields += renderer.renderField(req, mapping, metadata, **kwargs)
+    elif isinstance(metadata, MetadataGroup):
+      fields += renderer.renderFieldGroup(req, mapping, metadata, **kwargs)
+  return fields
+
+class BracketRenderer(FieldGroupRenderer):
+  def renderField(self, request, mapping, metadata, **kwargs):
+    return "[%s:%s]" % (metadata.id,
+                        self.widget(request, mapping, metadata.id, **kwargs))
+
+class TestRenderPlan(PyWebMvcTestCase):
+  def setUp(self):
+    self.form = FormMetadata("form", None, TabIndexTable())
+    self.form.addMetadata(createField(self.form, "name"))
+    self.address = MetadataGroup("address", "address")
+    self.address.addMetadata(createField(self.form, "street"))
+    self.address.addMetadata(createField(self.form, "city"))
+    self.form.addMetadata(self.address)
+    self.mapping = Mapping(self.form)
+    self.req = Request({"name" : u"Ann", "city" : u"Oslo"},
+      ResourceBundle(StringIO.StringIO(
+        "label.name=Name\nlabel.street=Street\nlabel.city=City\n")))
+  def testDefaultMarkup(self):
+    renderer = FieldGroupRenderer()
+    expected = renderFieldMarkup(renderer, self.req, self.mapping,
+                                 self.form["name"], onclick = "f()")
+    self.assertEqual(renderer.renderField(self.req, self.mapping, "name",
+                                          onclick = "f()"), expected)
+    self.assertEqual(renderer.renderFields(self.req, self.mapping,
+                                           onclick = "f()"),
+                     renderUncompiled(renderer, self.req, self.mapping,
+                                      self.form, onclick = "f()"))
+    self.assertEqual(renderer.renderFields(self.req, self.mapping,
+                                           self.address),
+                     renderFieldMarkup(renderer, self.req, self.mapping,
+                                       self.address["street"]) +
+                     renderFieldMarkup(renderer, self.req, self.mapping,
+                                       self.address["city"]))
+  def testOverriddenRenderField(self):
+    renderer = BracketRenderer()
+    rendered = renderer.renderFields(self.req, self.mapping, self.address)
+    self.assertEqual(rendered, renderUncompiled(renderer, self.req,
+                                                self.mapping, self.address))
+    self.assertTrue(rendered.startswith("[street:"))
+    self.assertEqual(renderer.renderFields(self.req, self.mapping),
+                     renderUncompiled(renderer, self.req, self.mapping,
+                                      self.form))
+  def testRecompile(self):
+    renderer = BracketRenderer()
+    plan = renderer.getRenderPlan(self.req, self.mapping, self.address)
+    self.assertTrue(renderer.getRenderPlan(self.req, self.mapping,
+                                           self.address) is plan)
+    self.address.order.reverse()
+    self.address.metadataChanged()
+    rendered = renderer.renderFields(self.req, self.mapping, self.address)
+    self.assertTrue(rendered.startswith("[city:"))
+    self.assertEqual(rendered, renderUncompiled(renderer, self.req,
+                                                self.mapping, self.address))
+    self.address.addMetadata(createField(self.form, "zip"))
+    self.assertEqual(renderer.renderFields(self.req, self.mapping,
+                                           self.address),
+                     renderUncompiled(renderer, self.req, self.mapping,
+                                      self.address))
+    self.assertEqual(len(renderer.getRenderPlan(self.req, self.mapping,
+                                                self.address)), 3)
+  def testChangedFieldMetadata(self):
+    renderer = FieldGroupRenderer()
+    rendered = renderer.renderFields(self.req, self.mapping, self.address)
+    self.assertFalse('class="street"' in rendered)
+    street = self.address["street"]
+    street.cssClass = "street"
+    street._maxlength = 5
+    street.attributes["placeholder"] = "Street"
+    self.form.metadataChanged()
+    rendered = renderer.renderFields(self.req, self.mapping, self.address)
+    self.assertTrue('class="street"' in rendered)
+    self.assertTrue('maxlength="5"' in rendered)
+    self.assertTrue('placeholder="Street"' in rendered)
+    self.assertEqual(rendered, renderUncompiled(renderer, self.req,
+                                                self.mapping, self.address))
+  def testOptions(self):
+    values = [{"value" : "no", "label" : "country.no"}]
+    validator = createEnumValidator(values, "error")
+    self.address["city"].validate = validator
+    attributes = {}
+    FieldGroupRenderer().getOptions(self.req, self.mapping, "city", attributes)
+    self.assertEqual(attributes["options"], values)
+    self.assertFalse(attributes["options"] is values)
+    self.assertTrue(attributes["optionsSource"] is validator)
+    attributes["options"].append({"value" : "se", "label" : "country.se"})
+    self.assertEqual(validator.getValueLabelList(self.req), values)
+    self.assertEqual(len(values), 1)
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestRenderPlan))
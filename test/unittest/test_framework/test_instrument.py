@@ -0,0 +1,107 @@
+import unittest, os, tempfile, StringIO
+
+from pywebmvc.framework import instrument as instrumentModule
+from pywebmvc.framework.instrument import *
+from pywebmvc.framework.resourcebundle import ResourceBundle
+from pywebmvc.unittest.testutils import *
+
+
+class RecordingSink(Sink):
+  def __init__(self):
+    self.reports = []
+  def report(self, name, timings, sampleRate):
+    self.reports.append((name, timings, sampleRate))
+
+class TestInstrument(PyWebMvcTestCase):
+  def setUp(self):
+    self.sink = RecordingSink()
+    self.instrument = Instrument([self.sink])
+  def testSpans(self):
+    self.instrument.begin("/page")
+    self.assertTrue(self.instrument.isSampled())
+    for i in range(3):
+      self.instrument.start("lookup").stop()
+    self.instrument.start("action").stop()
+    self.instrument.end()
+    self.assertFalse(self.instrument.isSampled())
+    (name, timings, sampleRate) = self.sink.reports[0]
+    self.assertEqual(name, "/page")
+    self.assertEqual(sampleRate, 1.0)
+    names = timings.keys()
+    names.sort()
+    self.assertEqual(names, ["action", "lookup", "request"])
+    self.assertEqual(timings["lookup"][0], 3)
+    self.assertTrue(timings["request"][1] >= timings["action"][1])
+  def testOutsideRequest(self):
+    self.assertTrue(self.instrument.start("lookup") is NULL_SPAN)
+    self.instrument.end()
+    self.assertEqual(self.sink.reports, [])
+  def testSampling(self):
+    self.instrument.sampleRate = 0
+    self.instrument.begin("/page")
+    self.assertTrue(self.instrument.start("lookup") is NULL_SPAN)
+    self.instrument.end()
+    self.assertEqual(self.sink.reports, [])
+    self.instrument.sinks = []
+    self.instrument.sampleRate = 1
+    self.instrument.begin("/page")
+    self.assertFalse(self.instrument.isSampled())
+  def testBundleLookup(self):
+    bundle = ResourceBundle(StringIO.StringIO("hello=Hello {0}.\n"))
+    default = instrumentModule.instrument
+    default.addSink(self.sink)
+    try:
+      default.begin("/page")
+      self.assertEqual(bundle.getMessage("hello", "world"), u"Hello world.")
+      self.assertEqual(bundle.getItemWithMap("hello"), u"Hello {0}.")
+      self.assertEqual(bundle["hello"], u"Hello {0}.")
+      default.end()
+    finally:
+      default.sinks.remove(self.sink)
+    self.assertEqual(self.sink.reports[0][1]["bundle.lookup"][0], 3)
+
+class TestSinks(PyWebMvcTestCase):
+  def testHistogram(self):
+    sink = HistogramSink()
+    for seconds in (0.0002, 0.0002, 0.003, 0.2):
+      sink.report("/page", {"action" : [2, seconds]}, 1.0)
+    self.assertEqual(sink.getNames(), ["action"])
+    stats = sink.getStats("action")
+    self.assertEqual(stats["requests"], 4)
+    self.assertEqual(stats["count"], 8)
+    self.assertEqual(stats["max"], 0.2)
+    self.assertEqual(sum(stats["counts"]), 4)
+    self.assertEqual(sink.getPercentile("action", 50), 0.00025)
+    self.assertEqual(sink.getPercentile("action", 75), 0.005)
+    self.assertEqual(sink.getPercentile("action", 100), 0.2)
+    sink.report("/page", {"action" : [1, 60.0]}, 1.0)
+    self.assertEqual(sink.getPercentile("action", 100), 60.0)
+    sink.reset()
+    self.assertEqual(sink.getNames(), [])
+  def testLog(self):
+    lines = []
+    sink = LogSink(lines.append)
+    sink.report("/page", {"request" : [1, 0.0125], "action" : [2, 0.01]}, 1)
+    self.assertEqual(lines, ["pywebmvc timing /page action=10.000ms/2 "
+                             "request=12.500ms/1"])
+  def testStatsd(self):
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    try:
+      sink = StatsdFileSink(path)
+      sink.report("/page", {"action" : [1, 0.0125]}, 0.1)
+      sink.report("/page", {"action" : [1, 0.002]}, 1)
+      self.assertEqual(open(path).read(), "pywebmvc.action:12.500|ms|@0.1\n"
+                                          "pywebmvc.action:2.000|ms\n")
+    finally:
+      os.remove(path)
+  def testCreateSinks(self):
+    sinks = createSinks("histogram statsd:/tmp/x:y")
+    self.assertTrue(isinstance(sinks[0], HistogramSink))
+    self.assertEqual(sinks[1].path, "/tmp/x:y")
+    self.assertRaises(ValueError, createSinks, "histogram graphite")
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestInstrument))
+suite.addTest(loader.loadTestsFromTestCase(TestSinks))
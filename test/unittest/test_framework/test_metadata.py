@@ -0,0 +1,94 @@
+import unittest
+
+from pywebmvc.framework.core import PyWebMvcInvalidConfigurationException
+from pywebmvc.framework.metadata import *
+from pywebmvc.framework.render import Renderer
+from pywebmvc.framework.render.factory import RendererFactory
+from pywebmvc.framework.util import TabIndexTable
+from pywebmvc.unittest.testutils import *
+
+
+def createField(id, property = None):
+  return FieldMetadata(id, property, False, None, None, None, None, None,
+                       False)
+
+class TestMetadataGroup(PyWebMvcTestCase):
+  def setUp(self):
+    self.form = FormMetadata("form", None, TabIndexTable())
+    self.form.addMetadata(createField("name"))
+    self.address = MetadataGroup("address", "address")
+    self.address.addMetadata(createField("street"))
+    self.city = MetadataGroup("cityGroup")
+    self.city.addMetadata(createField("city"))
+    self.address.addMetadata(self.city)
+    self.form.addMetadata(self.address)
+  def testLookups(self):
+    self.assertTrue(self.form.hasMetadata("address"))
+    self.assertTrue(self.form.getMetadata("cityGroup") is self.city)
+    self.assertTrue(self.form.getFieldMetadata("city") is
+                    self.city["city"])
+    self.assertTrue(self.address.hasFieldMetadata("city"))
+    self.assertFalse(self.form.hasFieldMetadata("address"))
+    self.assertFalse(self.city.hasMetadata("street"))
+    self.assertRaises(KeyError, self.form.getFieldMetadata, "address")
+    self.assertRaises(KeyError, self.form.getMetadata, "missing")
+  def testFieldNames(self):
+    self.assertEqual(self.form.getFieldNames(), ("name", "street", "city"))
+    self.city.addMetadata(createField("zip"))
+    self.assertEqual(self.form.getFieldNames(),
+                     ("name", "street", "city", "zip"))
+    self.assertTrue(self.form.getFieldMetadata("zip") is self.city["zip"])
+  def testDuplicateField(self):
+    self.assertRaises(PyWebMvcInvalidConfigurationException,
+                      self.city.addMetadata, createField("name"))
+    self.assertRaises(PyWebMvcInvalidConfigurationException,
+                      self.form.addMetadata, createField("city"))
+
+class Mapping(object):
+  def __init__(self, form):
+    self.form = form
+  def getFormMetadata(self, req):
+    return self.form
+
+class TestRendererFactory(PyWebMvcTestCase):
+  def setUp(self):
+    self.factory = RendererFactory()
+    self.form = FormMetadata("form", None, TabIndexTable())
+    self.form.addMetadata(createField("name"))
+    self.address = MetadataGroup("address", "address")
+    self.address.addMetadata(createField("street"))
+    self.form.addMetadata(self.address)
+    self.mapping = Mapping(self.form)
+  def getRenderer(self, name = None):
+    return self.factory.getRenderer(Renderer.TYPE_TEXT, "req", self.mapping,
+                                    name)
+  def testResolution(self):
+    default = self.factory.renderers[Renderer.TYPE_TEXT]
+    self.assertTrue(self.getRenderer("street") is default)
+    self.assertTrue(self.factory.getRenderer(Renderer.TYPE_TEXT) is default)
+    groupRenderer = object()
+    self.address.setRenderer(Renderer.TYPE_TEXT, groupRenderer)
+    self.assertTrue(self.getRenderer("street") is groupRenderer)
+    self.assertTrue(self.getRenderer("address") is groupRenderer)
+    self.assertTrue(self.getRenderer("name") is default)
+    self.assertTrue(self.getRenderer("missing") is default)
+    self.assertTrue(self.getRenderer() is default)
+  def testInvalidation(self):
+    self.assertTrue(self.getRenderer("street") is
+                    self.factory.renderers[Renderer.TYPE_TEXT])
+    factoryRenderer = object()
+    self.factory.setRenderer(Renderer.TYPE_TEXT, factoryRenderer)
+    self.assertTrue(self.getRenderer("street") is factoryRenderer)
+    fieldRenderer = object()
+    self.address["street"].setRenderer(Renderer.TYPE_TEXT, fieldRenderer)
+    self.assertTrue(self.getRenderer("street") is fieldRenderer)
+    self.assertTrue(self.getRenderer("zip") is factoryRenderer)
+    groupRenderer = object()
+    self.address.setRenderer(Renderer.TYPE_TEXT, groupRenderer)
+    self.address.addMetadata(createField("zip"))
+    self.assertTrue(self.getRenderer("zip") is groupRenderer)
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestMetadataGroup))
+suite.addTest(loader.loadTestsFromTestCase(TestRendererFactory))
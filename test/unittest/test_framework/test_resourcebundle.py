@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import unittest, StringIO
+
+from pywebmvc.framework.resourcebundle import *
+from pywebmvc.unittest.testutils import *
+
+
+MESSAGES = """term.foo=Foo
+term.idea=idea
+term.modifiedIdea={1} ${term.idea}
+message.bar=This is my {0} ${term.foo}.
+message.badIdea=This is a {0} ${term.modifiedIdea}.
+message.fineIdea=This is a {0} {1}.
+message.goodIdea=This is a {0} {1} ${term.idea}.
+message.named=Hello ${name}, {0}.
+message.unicode=Caf\\u00e9 {0}
+list.0=first {0}
+list.1=second ${term.foo}
+"""
+
+class TestResourceBundle(PyWebMvcTestCase):
+  def setUp(self):
+    self.bundle = ResourceBundle(StringIO.StringIO(MESSAGES))
+  def testParameters(self):
+    self.assertEqual(self.bundle.getMessage("message.fineIdea", "perfectly",
+                                            "fine"),
+                     u"This is a perfectly fine.")
+    self.assertEqual(self.bundle.getMessage("message.fineIdea", 1),
+                     u"This is a 1 {1}.")
+    self.assertEqual(self.bundle.getMessage("message.unicode", u"à"),
+                     u"Café à")
+    self.assertRaises(KeyError, self.bundle.getMessage, "message.missing")
+  def testTerms(self):
+    self.assertEqual(self.bundle["term.modifiedIdea"], u"{1} idea")
+    self.assertEqual(self.bundle.getMessage("message.bar", "Silly"),
+                     u"This is my Silly Foo.")
+    self.assertEqual(self.bundle.getMessage("message.badIdea", "really",
+                                            "bad"),
+                     u"This is a really bad idea.")
+    self.assertEqual(self.bundle.getMessage("message.goodIdea", "much",
+                                            "better"),
+                     u"This is a much better idea.")
+    self.assertEqual(self.bundle.getMessage("message.named", "welcome",
+                                            name = u"Joe"),
+                     u"Hello Joe, welcome.")
+    self.assertEqual(self.bundle.getItemWithMap("message.named",
+                                                {"name" : u"Ann"}),
+                     u"Hello Ann, {0}.")
+    self.assertEqual(self.bundle.getItemArray("list", "one"),
+                     [u"first one", u"second Foo"])
+  def testUnicode(self):
+    for key in self.bundle.keys():
+      self.assertTrue(isinstance(self.bundle[key], unicode), key)
+      self.assertTrue(isinstance(self.bundle.getMessage(key), unicode), key)
+      self.assertTrue(isinstance(self.bundle.getMessage(key, "x"), unicode),
+                      key)
+    self.bundle["latin"] = "caf\xe9"
+    self.assertEqual(self.bundle["latin"], u"café")
+  def testCacheReset(self):
+    self.assertEqual(self.bundle["term.foo"], u"Foo")
+    self.assertEqual(self.bundle.getMessage("message.bar", "x"),
+                     u"This is my x Foo.")
+    self.bundle["term.foo"] = "Bar"
+    self.assertEqual(self.bundle["term.foo"], u"Bar")
+    self.bundle.addProperties({"message.bar" : "Now {0}."})
+    self.assertEqual(self.bundle.getMessage("message.bar", "x"), u"Now x.")
+    self.bundle.addPropertiesFile(StringIO.StringIO("term.foo=Baz\n"))
+    self.assertEqual(self.bundle["term.foo"], u"Baz")
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestResourceBundle))
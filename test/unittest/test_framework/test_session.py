@@ -0,0 +1,90 @@
+import unittest, time
+
+from pywebmvc.framework.session import *
+from pywebmvc.unittest.testutils import *
+
+
+class RecordingSession(dict):
+  def __init__(self, values = None, lock = True):
+    dict.__init__(self, values or {})
+    self.locked = lock
+    self.saves = 0
+    self.invalidated = False
+  def save(self):
+    self.saves += 1
+  def unlock(self):
+    self.locked = False
+  def timeout(self):
+    return 1800
+  def invalidate(self):
+    self.invalidated = True
+  def id(self):
+    return "sid"
+
+class TestLazySession(PyWebMvcTestCase):
+  def setUp(self):
+    self.sessions = []
+    self.stored = {}
+  def createSession(self, lock):
+    session = RecordingSession(self.stored, lock)
+    self.sessions.append(session)
+    return session
+  def testUnused(self):
+    session = LazySession(self.createSession)
+    session.commit()
+    session.unlock()
+    self.assertFalse(session.isLoaded())
+    self.assertEqual(self.sessions, [])
+  def testNewSession(self):
+    session = LazySession(self.createSession)
+    self.assertFalse(session.has_key("user"))
+    self.assertEqual(session.id(), "sid")
+    session.commit()
+    session.unlock()
+    self.assertEqual(len(self.sessions), 1)
+    self.assertEqual(self.sessions[0].saves, 1)
+    self.assertFalse(self.sessions[0].locked)
+  def testRead(self):
+    self.stored = {"user" : "joe", LazySession.TOUCH_KEY : time.time()}
+    session = LazySession(self.createSession)
+    self.assertEqual(session["user"], "joe")
+    self.assertEqual(session.keys(), ["user"])
+    self.assertEqual(len(session), 1)
+    self.assertFalse(session.has_key(LazySession.TOUCH_KEY))
+    session.commit()
+    self.assertEqual(self.sessions[0].saves, 0)
+  def testStaleRead(self):
+    self.stored = {"user" : "joe", LazySession.TOUCH_KEY : time.time() - 1000}
+    session = LazySession(self.createSession)
+    self.assertEqual(session["user"], "joe")
+    session.commit()
+    self.assertEqual(self.sessions[0].saves, 1)
+  def testWrite(self):
+    self.stored = {LazySession.TOUCH_KEY : time.time()}
+    session = LazySession(self.createSession)
+    session["user"] = "joe"
+    session.commit()
+    self.assertEqual(self.sessions[0].saves, 1)
+    session.save()
+    session.commit()
+    self.assertEqual(self.sessions[0].saves, 2)
+    self.assertEqual(session.pop("user"), "joe")
+    self.assertEqual(session.pop("user", None), None)
+    session.commit()
+    self.assertEqual(self.sessions[0].saves, 3)
+  def testInvalidate(self):
+    session = LazySession(self.createSession)
+    session["user"] = "joe"
+    session.invalidate()
+    session.commit()
+    self.assertTrue(self.sessions[0].invalidated)
+    self.assertEqual(self.sessions[0].saves, 0)
+  def testLocking(self):
+    session = LazySession(self.createSession)
+    session.setLocking(False)
+    session.get("user")
+    self.assertFalse(self.sessions[0].locked)
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestLazySession))
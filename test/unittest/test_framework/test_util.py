@@ -2,7 +2,7 @@ import unittest, os, warnings, pmock
 
 from pywebmvc.framework.core import *
 from pywebmvc.framework.util import *
-from pywebmvc.framework import metadata
+from pywebmvc.framework import metadata, htmlutil
 from pywebmvc.unittest.testutils import *
 
 
@@ -77,9 +77,24 @@ class TabIndexTableTestCase(PyWebMvcTestCase):
     self.assertTrue("c" in table.lookupFields(3))
     self.assertTrue("d" in table.lookupFields(3))
 
+class HtmlutilTestCase(PyWebMvcTestCase):
+  def testHtmlBuffer(self):
+    html = htmlutil.HtmlBuffer("<ul>")
+    html.writeAll(["<li>%i</li>" % i for i in range(2)])
+    html.write(u"</ul>")
+    self.assertEqual(html.getvalue(), u"<ul><li>0</li><li>1</li></ul>")
+    html = htmlutil.HtmlBuffer(u"caf\xe9")
+    self.assertEqual(html.encode("utf-8"), "caf\xc3\xa9")
+  def testParameterString(self):
+    self.assertEqual(htmlutil.getParameterString([]), "")
+    self.assertEqual(htmlutil.getParameterString([("a", "1 2"), ("b", "&")]),
+                     "a=1+2&b=%26")
+    self.assertEqual(htmlutil.getParameterString({"a" : ["1", "2"]}),
+                     "a=1&a=2")
+
 loader = unittest.TestLoader()
 suite = unittest.TestSuite()
 suite.addTest(loader.loadTestsFromTestCase(PyWebMvcTestCase))
 suite.addTest(loader.loadTestsFromTestCase(MultiDictTestCase))
 suite.addTest(loader.loadTestsFromTestCase(TabIndexTableTestCase))
-
+suite.addTest(loader.loadTestsFromTestCase(HtmlutilTestCase))
@@ -0,0 +1,252 @@
+import unittest, StringIO
+
+from pywebmvc.framework.core import ActionError, ActionErrors, \
+                                    PyWebMvcInvalidConfigurationException
+from pywebmvc.framework.metadata import *
+from pywebmvc.framework.resourcebundle import ResourceBundle
+from pywebmvc.framework.util import TabIndexTable
+from pywebmvc.framework.validate import *
+from pywebmvc.unittest.testutils import *
+
+
+MESSAGES = """pywebmvc.message.requiredField={0} is required.
+error.digits={0} must be digits.
+error.short={0} is too long.
+error.form=The form is invalid.
+error.letter=Not a letter.
+label.field=Field
+"""
+
+class Request(object):
+  def __init__(self, form):
+    self.form = form
+    self.bundle = ResourceBundle(StringIO.StringIO(MESSAGES))
+
+class Mapping(object):
+  def __init__(self, formMetadata):
+    self.formMetadata = formMetadata
+  def getFormMetadata(self, req):
+    return self.formMetadata
+
+class OptionalField(FieldMetadata):
+  """a field only required when the form has a value for C{toggle}."""
+  def isRequired(self, req, mapping):
+    return req.form.has_key("toggle")
+
+def validateFormUncompiled(req, mapping):
+  """the field by field validation L{validateForm} performs."""
+  errors = ActionErrors()
+  hasFieldErrors = False
+  for fieldName in mapping.getFormMetadata(req).getFieldNames():
+    value = None
+    if req.form.has_key(fieldName):
+      value = req.form[fieldName]
+    fieldMetadata = mapping.getFormMetadata(req).getFieldMetadata(fieldName)
+    reqErrors = validateRequired(req, mapping, value, fieldName, fieldMetadata)
+    if reqErrors:
+      hasFieldErrors = True
+    if reqErrors and fieldMetadata.defaultValue:
+      if fieldMetadata.list:
+        req.form[fieldName] = [fieldMetadata.defaultValue]
+      else:
+        req.form[fieldName] = fieldMetadata.defaultValue
+    else:
+      errors.addAll(reqErrors)
+    if not reqErrors:
+      fieldErrors = fieldMetadata.getType(req, mapping).validate(req, mapping,
+                                                                req.form,
+                                                                fieldName)
+      if not fieldErrors:
+        fieldErrors = fieldMetadata.validate(req, mapping, req.form, fieldName)
+      if fieldErrors:
+        hasFieldErrors = True
+      errors.addAll(fieldErrors)
+  if not hasFieldErrors:
+    errors.addAll(mapping.getFormMetadata(req).validate(req, mapping, req.form,
+                                                        ActionError.GLOBAL))
+  return errors
+
+def createField(id, type, required = False, defaultValue = None, list = False,
+                validate = None, fieldClass = FieldMetadata):
+  return fieldClass(id, None, required, None, None, type, "label.field", None,
+                    False, validate = validate, list = list,
+                    defaultValue = defaultValue)
+
+def describeErrors(errors):
+  return [(e.key, e.message, e.index) for e in errors]
+
+class TestValidateForm(PyWebMvcTestCase):
+  def setUp(self):
+    text = TypeMetadata("text", "text", 0, createMultiValidator())
+    digits = TypeMetadata("digits", "text", 0, createMultiValidator(
+      createRegexValidator("^[0-9]*$", "error.digits")))
+    checkbox = TypeMetadata("checkbox", "checkbox", 0, createMultiValidator())
+    def validateForm(request, mapping, form, fieldName):
+      errors = ActionErrors()
+      if form.get("name") == "invalid":
+        errors.add(ActionError(fieldName, request.bundle["error.form"]))
+      return errors
+    self.form = FormMetadata("form", None, TabIndexTable(), validateForm)
+    self.form.addMetadata(createField("name", text, True))
+    self.form.addMetadata(createField("number", digits, True, "0"))
+    self.form.addMetadata(createField("numbers", digits, False, list = True,
+      validate = createRegexValidator("^.{0,3}$", "error.short")))
+    group = MetadataGroup("group")
+    group.addMetadata(createField("flag", checkbox, True))
+    group.addMetadata(createField("items", text, True, "none", list = True))
+    group.addMetadata(createField("optional", text, fieldClass = OptionalField))
+    self.form.addMetadata(group)
+    self.mapping = Mapping(self.form)
+  def assertValidation(self, form):
+    """asserts that L{validateForm} returns the same errors and updates the
+    form like the field by field validation."""
+    expectedRequest = Request(dict(form))
+    expected = validateFormUncompiled(expectedRequest, self.mapping)
+    request = Request(dict(form))
+    errors = validateForm(request, self.mapping)
+    self.assertEqual(describeErrors(errors), describeErrors(expected))
+    self.assertEqual(request.form, expectedRequest.form)
+    return errors
+  def testValid(self):
+    errors = self.assertValidation({"name" : "joe", "number" : "12",
+      "flag" : "on", "flag__onpage" : "1", "items" : ["a"]})
+    self.assertFalse(errors)
+  def testRequired(self):
+    errors = self.assertValidation({"name" : "", "items" : ["a", ""]})
+    self.assertEqual(describeErrors(errors), [
+      ("name", "Field is required.", 0),
+      ("flag", "Field is required.", 0),
+      ("flag", "Field is required.", 0)])
+  def testDefaultValue(self):
+    request = Request({"name" : "joe", "flag" : "on", "flag__onpage" : "1",
+                       "items" : []})
+    self.assertFalse(validateForm(request, self.mapping))
+    self.assertEqual(request.form["number"], "0")
+    self.assertEqual(request.form["items"], ["none"])
+    self.assertValidation({"name" : "joe", "flag" : "on", "items" : ["", ""]})
+  def testValidators(self):
+    errors = self.assertValidation({"name" : "joe", "number" : "1a",
+      "flag" : "on", "flag__onpage" : "1", "numbers" : ["1", "12345"]})
+    self.assertEqual(describeErrors(errors), [
+      ("number", "Field must be digits.", None),
+      ("numbers", "Field is too long.", 1)])
+    errors = self.assertValidation({"name" : "joe", "flag" : "on",
+      "flag__onpage" : "1", "numbers" : ["1", "x", "12345"]})
+    self.assertEqual(describeErrors(errors),
+                     [("numbers", "Field must be digits.", 1)])
+  def testFormValidation(self):
+    errors = self.assertValidation({"name" : "invalid", "number" : "1",
+      "flag" : "on", "flag__onpage" : "1", "items" : ["a"]})
+    self.assertEqual(describeErrors(errors),
+                     [(ActionError.GLOBAL, "The form is invalid.", None)])
+    self.assertValidation({"name" : "invalid"})
+  def testOverriddenRequired(self):
+    errors = self.assertValidation({"name" : "joe", "flag" : "on",
+                                    "flag__onpage" : "1", "toggle" : "1"})
+    self.assertEqual(describeErrors(errors),
+                     [("optional", "Field is required.", 0)])
+    self.assertValidation({"name" : "joe", "flag" : "on"})
+  def testChangedRequired(self):
+    program = self.form.getValidationProgram()
+    self.form.getFieldMetadata("name").required = False
+    self.assertValidation({"flag" : "on", "flag__onpage" : "1"})
+    self.form.getFieldMetadata("name").required = True
+    errors = self.assertValidation({"flag" : "on", "flag__onpage" : "1"})
+    self.assertEqual(describeErrors(errors),
+                     [("name", "Field is required.", 0)])
+    self.form.getFieldMetadata("items").defaultValue = "some"
+    request = Request({"name" : "joe", "flag" : "on", "flag__onpage" : "1",
+                       "items" : []})
+    self.assertFalse(validateForm(request, self.mapping))
+    self.assertEqual(request.form["items"], ["some"])
+    self.assertTrue(self.form.getValidationProgram() is program)
+  def testProgramReset(self):
+    program = self.form.getValidationProgram()
+    self.assertEqual(len(program), 6)
+    self.assertTrue(self.form.getValidationProgram() is program)
+    self.form.getMetadata("group").addMetadata(
+      createField("extra", self.form.getFieldMetadata("name").type, True))
+    self.assertEqual(len(self.form.getValidationProgram()), 7)
+    errors = self.assertValidation({"name" : "joe", "flag" : "on",
+                                    "flag__onpage" : "1"})
+    self.assertEqual(describeErrors(errors),
+                     [("extra", "Field is required.", 0)])
+
+class TestEnumValidator(PyWebMvcTestCase):
+  def setUp(self):
+    self.calls = 0
+    self.form = FormMetadata("form", None, TabIndexTable())
+    self.mapping = Mapping(self.form)
+  def generate(self, req):
+    self.calls += 1
+    return [{"value" : "a", "label" : "label.a"},
+            {"value" : "b", "label" : "label.b"}]
+  def addField(self, validator):
+    text = TypeMetadata("text", "select", 0, createMultiValidator())
+    self.form.addMetadata(createField("letters", text, list = True,
+                                      validate = validator))
+  def testEnumeration(self):
+    validator = createEnumValidator(self.generate(None), "error.letter")
+    errors = validator(Request({}), self.mapping,
+                       {"letters" : ["a", "c", "b", "d"]}, "letters")
+    self.assertEqual(describeErrors(errors),
+      [("letters", "Not a letter.", 1),
+       ("letters", "Not a letter.", 3)])
+    self.assertEqual(validator.getValueSet(None), frozenset(["a", "b"]))
+  def testRequestCache(self):
+    from pywebmvc.framework.render.form import MetadataRenderer
+    validator = createEnumGeneratorValidator(self.generate, "error.letter")
+    self.addField(validator)
+    request = Request({"letters" : ["a", "c"]})
+    errors = validateForm(request, self.mapping)
+    self.assertEqual(describeErrors(errors),
+                     [("letters", "Not a letter.", 1)])
+    attributes = {}
+    MetadataRenderer().getOptions(request, self.mapping, "letters",
+                                  attributes)
+    self.assertEqual([option["value"] for option in attributes["options"]],
+                     ["a", "b"])
+    self.assertEqual(self.calls, 1)
+    validateForm(Request({"letters" : ["b"]}), self.mapping)
+    self.assertEqual(self.calls, 2)
+  def testNoCache(self):
+    validator = createEnumGeneratorValidator(self.generate, "error.letter",
+                                             createEnumValuesCache("none"))
+    request = Request({})
+    validator.getValueLabelList(request)
+    validator.getValueSet(request)
+    self.assertEqual(self.calls, 2)
+  def testTimedCache(self):
+    cache = createEnumValuesCache("60")
+    validator = createEnumGeneratorValidator(self.generate, "error.letter",
+                                             cache)
+    self.assertFalse(validator(Request({}), self.mapping, {"letters" : "a"},
+                               "letters"))
+    validator.getValueLabelList(Request({}))
+    self.assertEqual(self.calls, 1)
+    validator = createEnumGeneratorValidator(self.generate, "error.letter",
+                                             createEnumValuesCache("0"))
+    validator.getValueLabelList(Request({}))
+    validator.getValueLabelList(Request({}))
+    self.assertEqual(self.calls, 3)
+    cache = TimedEnumValuesCache(60, lambda req: req.form.get("language"))
+    validator = createEnumGeneratorValidator(self.generate, "error.letter",
+                                             cache)
+    for language in ("en", "fr", "en"):
+      validator.getValueLabelList(Request({"language" : language}))
+    self.assertEqual(self.calls, 5)
+    cache = TimedEnumValuesCache(60, lambda req: req.form.get("user"), 2)
+    validator = createEnumGeneratorValidator(self.generate, "error.letter",
+                                             cache)
+    for user in range(5):
+      validator.getValueLabelList(Request({"user" : user}))
+      self.assertTrue(len(cache.entries) <= 2)
+    self.assertEqual(self.calls, 10)
+  def testInvalidCache(self):
+    self.assertRaises(PyWebMvcInvalidConfigurationException,
+                      createEnumValuesCache, "forever")
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestValidateForm))
+suite.addTest(loader.loadTestsFromTestCase(TestEnumValidator))
@@ -0,0 +1,116 @@
+import unittest, StringIO
+
+from pywebmvc.framework.render.widget import *
+from pywebmvc.framework.resourcebundle import ResourceBundle
+from pywebmvc.framework.validate import createEnumGeneratorValidator
+from pywebmvc.unittest.testutils import *
+
+
+class Request(object):
+  def __init__(self, bundle):
+    self.bundle = bundle
+
+OPTIONS = [{"value" : "fr", "label" : "country.fr"},
+           {"value" : "it", "label" : "country.it"},
+           {"value" : "jp", "label" : "country.jp"}]
+
+def option(value, label, selected = ""):
+  return '<option value="%s"%s>%s</option>' % (value, selected, label)
+
+def radio(value, label, checked = "", attributes = ""):
+  return ('<input type="radio" id="country" name="country" value="%s"%s%s>'
+          '&nbsp;<span onclick="this.previousSibling.previousSibling.click();"'
+          ' style="cursor: pointer;">%s</span>' % (value, checked, attributes,
+                                                   label))
+
+class TestOptionsRenderer(PyWebMvcTestCase):
+  def setUp(self):
+    self.english = Request(ResourceBundle(StringIO.StringIO(
+      "country.fr=France\ncountry.it=Italy\ncountry.jp=Japan\n")))
+    self.french = Request(ResourceBundle(StringIO.StringIO(
+      "country.fr=France\ncountry.it=Italie\ncountry.jp=Japon\n")))
+  def renderSelect(self, renderer, req, value):
+    return renderer.renderNormal(req, None, "country", value, None,
+                                 options = OPTIONS)
+  def testSelect(self):
+    renderer = SelectRenderer()
+    head = '<select id="country" name="country">'
+    self.assertEqual(self.renderSelect(renderer, self.english, None),
+      head + option("fr", "France") + option("it", "Italy") +
+      option("jp", "Japan") + "</select>")
+    self.assertEqual(self.renderSelect(renderer, self.english, "it"),
+      head + option("fr", "France") +
+      option("it", "Italy", ' selected="selected"') +
+      option("jp", "Japan") + "</select>")
+    self.assertEqual(self.renderSelect(renderer, self.french, "jp"),
+      head + option("fr", "France") + option("it", "Italie") +
+      option("jp", "Japon", ' selected="selected"') + "</select>")
+    self.assertEqual(len(renderer.optionMarkup), 2)
+  def testMultiSelect(self):
+    renderer = MultiSelectRenderer()
+    self.assertEqual(self.renderSelect(renderer, self.english, ["jp", "fr"]),
+      '<select id="country" name="country" multiple="multiple">' +
+      option("fr", "France", ' selected="selected"') + option("it", "Italy") +
+      option("jp", "Japan", ' selected="selected"') + "</select>")
+  def testRadio(self):
+    renderer = RadioRenderer()
+    self.assertEqual(renderer.renderNormal(self.english, None, "country", "fr",
+                                           None, options = OPTIONS,
+                                           onclick = "f()"),
+      radio("fr", "France", ' checked="checked"', ' onclick="f()"') +
+      radio("it", "Italy", "", ' onclick="f()"') +
+      radio("jp", "Japan", "", ' onclick="f()"'))
+    self.assertEqual(renderer.renderNormal(self.english, None, "country",
+                                           ["it", "jp"], None,
+                                           options = OPTIONS),
+      radio("fr", "France") + radio("it", "Italy", ' checked="checked"') +
+      radio("jp", "Japan", ' checked="checked"'))
+  def testChangedOptions(self):
+    renderer = SelectRenderer()
+    self.renderSelect(renderer, self.english, None)
+    options = OPTIONS[:1]
+    self.assertEqual(renderer.renderNormal(self.english, None, "country", None,
+                                           None, options = options),
+      '<select id="country" name="country">' + option("fr", "France") +
+      "</select>")
+  def testModifiedOptions(self):
+    renderer = SelectRenderer()
+    options = [dict(item) for item in OPTIONS[:2]]
+    def render():
+      return renderer.renderNormal(self.english, None, "country", None, None,
+                                   options = options)
+    head = '<select id="country" name="country">'
+    self.assertEqual(render(), head + option("fr", "France") +
+      option("it", "Italy") + "</select>")
+    options.append(OPTIONS[2])
+    self.assertEqual(render(), head + option("fr", "France") +
+      option("it", "Italy") + option("jp", "Japan") + "</select>")
+    options[0]["label"] = "country.jp"
+    self.assertEqual(render(), head + option("fr", "Japan") +
+      option("it", "Italy") + option("jp", "Japan") + "</select>")
+  def testGeneratedOptions(self):
+    renderer = SelectRenderer()
+    generated = [OPTIONS]
+    validator = createEnumGeneratorValidator(
+      lambda req: [option.copy() for option in generated[0]], "error")
+    def render(value):
+      req = Request(self.english.bundle)
+      return renderer.renderNormal(req, None, "country", value, None,
+        options = validator.getValueLabelList(req), optionsSource = validator)
+    head = '<select id="country" name="country">'
+    self.assertEqual(render(None), head + option("fr", "France") +
+      option("it", "Italy") + option("jp", "Japan") + "</select>")
+    markup = renderer.optionMarkup.values()[0][1]
+    self.assertEqual(render("it"), head + option("fr", "France") +
+      option("it", "Italy", ' selected="selected"') + option("jp", "Japan") +
+      "</select>")
+    self.assertEqual(len(renderer.optionMarkup), 1)
+    self.assertTrue(renderer.optionMarkup.values()[0][1] is markup)
+    generated[0] = OPTIONS[1:]
+    self.assertEqual(render(None), head + option("it", "Italy") +
+      option("jp", "Japan") + "</select>")
+    self.assertEqual(len(renderer.optionMarkup), 1)
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestOptionsRenderer))
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import unittest, os, sys, time, shutil, tempfile, threading, StringIO, urllib
+
+from pywebmvc.framework.wsgi import *
+from pywebmvc.unittest.testutils import *
+
+
+class WsgiTestCase(PyWebMvcTestCase):
+  def setUp(self):
+    self.options = {
+      "pyWebMvcConfig" : "test/data/config.xml",
+      "pyWebMvcExtension" : "tst"
+    }
+    self.application = WsgiApplication(self.options)
+  def getEnviron(self, path, query = "", body = None, cookie = None):
+    environ = {
+      "REQUEST_METHOD" : "GET",
+      "SCRIPT_NAME" : "",
+      "PATH_INFO" : path,
+      "QUERY_STRING" : query,
+      "SERVER_NAME" : "localhost",
+      "SERVER_PORT" : "8080",
+      "wsgi.url_scheme" : "http",
+      "wsgi.input" : StringIO.StringIO(body or ""),
+      "wsgi.errors" : StringIO.StringIO(),
+    }
+    if body is not None:
+      environ["REQUEST_METHOD"] = "POST"
+      environ["CONTENT_TYPE"] = "application/x-www-form-urlencoded"
+      environ["CONTENT_LENGTH"] = str(len(body))
+    if cookie:
+      environ["HTTP_COOKIE"] = cookie
+    return environ
+  def call(self, environ):
+    response = {}
+    written = []
+    def startResponse(status, headers):
+      self.assertFalse(response.has_key("status"))
+      response["status"] = status
+      response["headers"] = headers
+      return written.append
+    body = self.application(environ, startResponse)
+    return (response["status"], dict(response["headers"]),
+            "".join(written) + "".join(body))
+
+class TestWsgiApplication(WsgiTestCase):
+  def testPage(self):
+    (status, headers, body) = self.call(self.getEnviron("/stubbed.tst"))
+    self.assertEqual(status, "200 OK")
+    self.assertEqual(headers["Content-Type"], "text/html; charset=utf-8")
+    self.assertEqual(int(headers["Content-Length"]), len(body))
+    self.assertTrue(body.find("Stubbed out.") > 0)
+    self.assertTrue(body.find('<base href="http://localhost:8080/stubbed.tst">') > 0)
+  def testError(self):
+    #the notFound forward of the test configuration's error handler is missing
+    environ = self.getEnviron("/nothing.tst")
+    (status, headers, body) = self.call(environ)
+    self.assertEqual(status, "500 Internal Server Error")
+    self.assertFalse(headers.has_key("EXCEPTION"))
+    self.assertTrue(environ["wsgi.errors"].getvalue().find("KeyError") > 0)
+  def testUnusedSession(self):
+    #the stubbed action does not use the session
+    (status, headers, body) = self.call(self.getEnviron("/stubbed.tst"))
+    self.assertFalse(headers.has_key("Set-Cookie"))
+  def testSession(self):
+    handler = self.application.handler
+    req = WsgiRequest(self.getEnviron("/stubbed.tst"), None, self.options)
+    handler.prepareRequest(req)
+    req.session["count"] = 1
+    handler.cleanupRequest(req)
+    cookie = req.headers_out["Set-Cookie"].split(";")[0]
+    req = WsgiRequest(self.getEnviron("/stubbed.tst", cookie = cookie), None,
+                      self.options)
+    handler.prepareRequest(req)
+    self.assertEqual(req.session["count"], 1)
+    self.assertFalse(req.session.is_new())
+    self.assertFalse(req.headers_out.has_key("Set-Cookie"))
+    handler.cleanupRequest(req)
+    req = WsgiRequest(self.getEnviron("/stubbed.tst", cookie = "pysid=bad"),
+                      None, self.options)
+    handler.prepareRequest(req)
+    self.assertTrue(req.session.is_new())
+    handler.cleanupRequest(req)
+
+  def testUndecodableField(self):
+    (status, headers, body) = self.call(self.getEnviron("/stubbed.tst",
+                                                       "junk=%FF"))
+    self.assertEqual(status, "200 OK")
+
+class TestSessionStores(WsgiTestCase):
+  def setUp(self):
+    super(TestSessionStores, self).setUp()
+    self.directory = tempfile.mkdtemp()
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+  def createSession(self, store, cookie = None):
+    req = WsgiRequest(self.getEnviron("/stubbed.tst", cookie = cookie), None)
+    return Session(req, store)
+  def testForgedIds(self):
+    store = FileSessionStore(self.directory)
+    for cookie in ("pysid=a/b", "pysid=" + "A" * 32, "pysid=../x"):
+      session = self.createSession(store, cookie)
+      self.assertTrue(session.is_new())
+      self.assertTrue(Session.ID_REGEX.match(session.id()))
+      session.unlock()
+  def testMemoryLocks(self):
+    store = MemorySessionStore()
+    session = self.createSession(store)
+    session.unlock()
+    self.assertEqual(store.locks, {})
+    session = self.createSession(store)
+    session.save()
+    session.unlock()
+    self.assertEqual(store.locks, {})
+  def testWaitingForLock(self):
+    store = MemorySessionStore()
+    store.lock("id")
+    acquired = threading.Event()
+    release = threading.Event()
+    def waiter():
+      store.lock("id")
+      acquired.set()
+      release.wait(5)
+      store.unlock("id")
+    thread = threading.Thread(target = waiter)
+    thread.start()
+    while store.locks["id"][1] < 2:
+      time.sleep(0.001)
+    store.unlock("id")
+    acquired.wait(5)
+    self.assertTrue(acquired.isSet())
+    #the waiter holds the lock the next request for the id waits for
+    (lock, count) = store.locks["id"]
+    self.assertEqual(count, 1)
+    self.assertTrue(lock.locked())
+    release.set()
+    thread.join()
+    self.assertEqual(store.locks, {})
+  def testFileLocks(self):
+    store = FileSessionStore(self.directory)
+    saved = self.createSession(store)
+    saved.save()
+    saved.unlock()
+    unsaved = self.createSession(store)
+    unsaved.unlock()
+    lockName = os.path.basename(store.getFileName(unsaved.id())) + ".lock"
+    files = os.listdir(self.directory)
+    if lockName in files:
+      store.purge(1800)
+      self.assertTrue(lockName in os.listdir(self.directory))
+      past = time.time() - 3600
+      os.utime(os.path.join(self.directory, lockName), (past, past))
+      store.purge(1800)
+      files = os.listdir(self.directory)
+      self.assertFalse(lockName in files)
+    self.assertTrue(os.path.basename(store.getFileName(saved.id())) in files)
+
+class TestWsgiFieldStorage(WsgiTestCase):
+  def getForm(self, query = "", body = None):
+    req = WsgiRequest(self.getEnviron("/stubbed.tst", query, body), None)
+    req.charset = "utf-8"
+    return FieldStorage(req, 1)
+  def testQuery(self):
+    form = self.getForm("one=1&two=2&two=3&empty=")
+    self.assertEqual(form.keys(), ["one", "two", "empty"])
+    self.assertEqual(form["one"], u"1")
+    self.assertEqual(form["two"], [u"2", u"3"])
+    self.assertEqual(form["empty"], u"")
+    self.assertFalse(form.has_key("three"))
+  def testPostCharset(self):
+    body = urllib.urlencode([("_charset_", "iso-8859-1"),
+                             ("name", u"é".encode("iso-8859-1"))])
+    form = self.getForm(body = body)
+    self.assertTrue(form.has_key("_charset_"))
+    self.assertEqual(form.keys(), ["name"])
+    self.assertEqual(form["name"], u"é")
+  def testSetItem(self):
+    form = self.getForm("one=1")
+    form["one"] = None
+    self.assertFalse(form.has_key("one"))
+    form["two"] = [u"2", "3"]
+    self.assertEqual(form["two"], [u"2", u"3"])
+    self.assertRaises(TypeError, form.__setitem__, "three", 3)
+    form.reset()
+    self.assertEqual(form.keys(), ["one"])
+    self.assertEqual(form["one"], u"1")
+  def testUndecodableField(self):
+    form = self.getForm("name=ok&junk=%FF%FE")
+    self.assertEqual(form["name"], u"ok")
+    self.assertTrue(form.has_key("junk"))
+    self.assertRaises(UnicodeDecodeError, form.__getitem__, "junk")
+    form["junk"] = u"fixed"
+    self.assertEqual(form["junk"], u"fixed")
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestWsgiApplication))
+suite.addTest(loader.loadTestsFromTestCase(TestSessionStores))
+suite.addTest(loader.loadTestsFromTestCase(TestWsgiFieldStorage))
@@ -4,9 +4,13 @@
 #  END OF COPYRIGHT NOTICE 
 
 import unittest
+from test_table import suite as tableSuite
+from test_dbutils import suite as dbutilsSuite
 
 loader = unittest.TestLoader()
 suite = unittest.TestSuite()
+suite.addTest(tableSuite)
+suite.addTest(dbutilsSuite)
 
 if __name__ == "__main__":
   runner = unittest.TextTestRunner()
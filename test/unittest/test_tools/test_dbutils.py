@@ -0,0 +1,148 @@
+import unittest
+try:
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+
+from pywebmvc.tools.dbutils import *
+from pywebmvc.unittest.testutils import *
+
+
+class Person(object):
+  def __init__(self, name, age, city = None):
+    self.name = name
+    self.age = age
+    self.city = city
+
+class OddAge(SearchCriteria):
+  def accepts(self, obj):
+    return obj.age % 2 == 1
+
+class OddAgeSql(OddAge):
+  def sql(self, columnMap):
+    return "(%s %% 2 = 1)" % columnMap["age"]
+
+class TestSearchCriteria(PyWebMvcTestCase):
+  def setUp(self):
+    self.people = [Person("Joe", 30, "Paris"), Person("Ann", 25),
+                   Person("joel", 41, "Lyon")]
+  def names(self, criteria):
+    return [person.name for person in criteria.filter(self.people)]
+  def testBasic(self):
+    self.assertEqual(self.names(BasicSearchCriteria("name",
+      BasicSearchCriteria.OP_LIKE, "%JOE%")), ["Joe", "joel"])
+    self.assertEqual(self.names(BasicSearchCriteria("name",
+      BasicSearchCriteria.OP_EQUAL, "Ann")), ["Ann"])
+    self.assertEqual(self.names(BasicSearchCriteria("name",
+      BasicSearchCriteria.OP_NOT_EQUAL, "Ann")), ["Joe", "joel"])
+    self.assertEqual(self.names(BasicSearchCriteria("age",
+      BasicSearchCriteria.OP_GREATER_THAN_OR_EQUAL, 30)), ["Joe", "joel"])
+    self.assertTrue(BasicSearchCriteria("name", BasicSearchCriteria.OP_LESS_THAN,
+                                        "K").accepts(self.people[0]))
+    self.assertRaises(AttributeError, BasicSearchCriteria("phone",
+      BasicSearchCriteria.OP_EQUAL, "1").accepts, self.people[0])
+    self.assertRaises(ValueError, BasicSearchCriteria("name", "~", "J").accepts,
+                      self.people[0])
+  def testTrees(self):
+    joe = BasicSearchCriteria("name", BasicSearchCriteria.OP_LIKE, "joe")
+    old = BasicSearchCriteria("age", BasicSearchCriteria.OP_GREATER_THAN, "35")
+    self.assertEqual(self.names(AndSearchCriteria(joe, old)), ["joel"])
+    self.assertEqual(self.names(OrSearchCriteria(NotSearchCriteria(joe), old)),
+                     ["Ann", "joel"])
+    self.assertEqual(self.names(NotSearchCriteria(joe)), ["Ann"])
+    self.assertEqual(self.names(AndSearchCriteria(OddAge(),
+                                                  NotNullCriteria("city"))),
+                     ["joel"])
+  def testOtherCriteria(self):
+    self.assertEqual(self.names(InSearchCriteria("age", ["25", 41])),
+                     ["Ann", "joel"])
+    self.assertEqual(self.names(NullCriteria("city")), ["Ann"])
+    self.assertEqual(self.names(NotNullCriteria("city")), ["Joe", "joel"])
+  def testCacheKey(self):
+    joe = BasicSearchCriteria("name", BasicSearchCriteria.OP_LIKE, "joe")
+    old = BasicSearchCriteria("age", BasicSearchCriteria.OP_GREATER_THAN, 35)
+    paris = BasicSearchCriteria("city", BasicSearchCriteria.OP_EQUAL, "Paris")
+    self.assertEqual(
+      AndSearchCriteria(AndSearchCriteria(joe, old), paris).getCacheKey(),
+      AndSearchCriteria(paris, AndSearchCriteria(old, joe)).getCacheKey())
+    self.assertNotEqual(AndSearchCriteria(joe, old).getCacheKey(),
+                        OrSearchCriteria(joe, old).getCacheKey())
+    self.assertNotEqual(AndSearchCriteria(joe, old).getCacheKey(),
+      AndSearchCriteria(joe, BasicSearchCriteria("age",
+        BasicSearchCriteria.OP_GREATER_THAN, 40)).getCacheKey())
+    self.assertEqual(InSearchCriteria("age", [41, 25, 41]).getCacheKey(),
+                     InSearchCriteria("age", [25, 41]).getCacheKey())
+    self.assertEqual(NotSearchCriteria(NullCriteria("city")).getCacheKey(),
+                     ("not", ("null", "city")))
+    self.assertNone(OrSearchCriteria(joe, OddAge()).getCacheKey())
+  def testPlaceholder(self):
+    class DbModule(object):
+      paramstyle = "format"
+    self.assertEqual(getPlaceholder(DbModule), "%s")
+    DbModule.paramstyle = "qmark"
+    self.assertEqual(getPlaceholder(DbModule), "?")
+    for paramstyle in ("pyformat", "named", "numeric"):
+      DbModule.paramstyle = paramstyle
+      self.assertRaises(ValueError, getPlaceholder, DbModule)
+
+class TestSqlWithParams(PyWebMvcTestCase):
+  columnMap = {"name" : "p_name", "age" : "p_age", "city" : "p_city"}
+  def setUp(self):
+    self.connection = sqlite3.connect(":memory:")
+    self.connection.execute(
+      "create table person (p_name text, p_age integer, p_city text)")
+    self.people = [Person(u"Joe", 30, u"Paris"), Person(u"Ann", 25),
+                   Person(u"joel", 41, u"Lyon"), Person(u"O'Hara", 52, u"Nice")]
+    for person in self.people:
+      self.connection.execute("insert into person values (?, ?, ?)",
+                              (person.name, person.age, person.city))
+    self.cache = StatementCache(self.columnMap, getPlaceholder(sqlite3))
+  def tearDown(self):
+    self.connection.close()
+  def select(self, criteria):
+    (sql, params) = self.cache.getStatement(
+      "select p_name from person where %s order by rowid", criteria)
+    return [row[0] for row in self.connection.execute(sql, params)]
+  def assertSelect(self, criteria, names):
+    self.assertEqual(self.select(criteria), names)
+    self.assertEqual([person.name for person in criteria.filter(self.people)],
+                     names)
+  def testBasic(self):
+    self.assertEqual(BasicSearchCriteria("name", BasicSearchCriteria.OP_EQUAL,
+      "O'Hara").sqlWithParams(self.columnMap), ("(p_name = ?)", ("O'Hara",)))
+    self.assertSelect(BasicSearchCriteria("name", BasicSearchCriteria.OP_EQUAL,
+                                          "O'Hara"), [u"O'Hara"])
+    self.assertSelect(BasicSearchCriteria("name", BasicSearchCriteria.OP_LIKE,
+                                          "%oe%"), [u"Joe", u"joel"])
+  def testIn(self):
+    criteria = InSearchCriteria("name", ["Ann", "Joe", "Zoe"])
+    self.assertEqual(criteria.sqlWithParams(self.columnMap, "%s"),
+                     ("(p_name in (%s,%s,%s,%s))", ("Ann", "Joe", "Zoe", "Zoe")))
+    self.assertSelect(criteria, [u"Joe", u"Ann"])
+    self.assertSelect(InSearchCriteria("name", []), [])
+    self.assertSelect(NotSearchCriteria(InSearchCriteria("name", [])),
+                      [person.name for person in self.people])
+  def testTrees(self):
+    old = BasicSearchCriteria("age", BasicSearchCriteria.OP_GREATER_THAN, 35)
+    self.assertSelect(AndSearchCriteria(NotNullCriteria("city"), old),
+                      [u"joel", u"O'Hara"])
+    self.assertSelect(OrSearchCriteria(NullCriteria("city"),
+                                       NotSearchCriteria(old)),
+                      [u"Joe", u"Ann"])
+  def testCache(self):
+    first = self.cache.getStatement("select * from person where %s",
+      BasicSearchCriteria("name", BasicSearchCriteria.OP_EQUAL, "Joe"))
+    second = self.cache.getStatement("select * from person where %s",
+      BasicSearchCriteria("name", BasicSearchCriteria.OP_EQUAL, "Ann"))
+    self.assertTrue(first[0] is second[0])
+    self.assertEqual(second[1], ("Ann",))
+    self.assertEqual(self.select(None), [person.name for person in self.people])
+    self.assertSelect(AndSearchCriteria(OddAgeSql(), NotNullCriteria("city")),
+                      [u"joel"])
+    self.assertEqual(len(self.cache.statements), 1)
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestSearchCriteria))
+if sqlite3:
+  suite.addTest(loader.loadTestsFromTestCase(TestSqlWithParams))
@@ -0,0 +1,300 @@
+import unittest
+try:
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+
+from pywebmvc.framework.htmlutil import truncateText
+from pywebmvc.tools.dbutils import BasicSearchCriteria
+from pywebmvc.tools.table import *
+from pywebmvc.unittest.testutils import *
+
+
+class Item(object):
+  def __init__(self, name, address = None):
+    self.name = name
+    self.address = address
+  def getTitle(self, prefix):
+    return prefix + self.name
+
+class Bundle(object):
+  def getMessage(self, key, *args):
+    return "%s%r" % (key.split(".")[-1], args)
+  def __getitem__(self, key):
+    return key.split(".")[-1]
+
+class Request(object):
+  def __init__(self, form = None):
+    self.form = form or {}
+    self.bundle = Bundle()
+
+class MarkedTable(Table):
+  def getCellMarkup(self, req, item, column):
+    return ("<b>", "</b>")
+
+class TestColumn(PyWebMvcTestCase):
+  def testAttribute(self):
+    column = Column("name", "label.name", "name")
+    self.assertEqual(column.getValue(Item("joe")), "joe")
+    self.assertEqual(column.getValue(object()), "")
+  def testPath(self):
+    column = Column("city", "label.city", "address.name")
+    self.assertEqual(column.getValue(Item("joe", Item("Paris"))), "Paris")
+    self.assertEqual(column.getValue(Item("joe")), "")
+    column.property = "name"
+    self.assertEqual(column.getValue(Item("joe")), "joe")
+  def testExpression(self):
+    column = Column("title", "label.title", "getTitle('Dr. ')")
+    self.assertEqual(column.getValue(Item("joe")), "Dr. joe")
+    self.assertEqual(column.getValue(object()), "")
+
+class TestTable(PyWebMvcTestCase):
+  def setUp(self):
+    self.columns = [Column("name", "label.name", "name", maxlength = 5),
+                    Column("city", "label.city", "address.name",
+                           align = "right",
+                           formatter = lambda req, item, value: value.upper())]
+    self.item = Item("Josephine", Item("Paris"))
+    self.name = truncateText("Josephine", 5)
+  def testRow(self):
+    table = Table("list", rowHighlighting = False)
+    self.assertEqual(table._generateCellRow(None, 0, self.item, self.columns),
+      '<tr class="even"><td>%s</td>'
+      '<td style="text-align: right;">PARIS</td></tr>' % self.name)
+  def testCellMarkup(self):
+    table = MarkedTable("list", rowHighlighting = False)
+    self.assertEqual(table._generateCellRow(None, 1, self.item, self.columns),
+      '<tr class="odd"><td><b>%s</b></td>'
+      '<td style="text-align: right;"><b>PARIS</b></td></tr>' % self.name)
+
+class TestListDataSource(PyWebMvcTestCase):
+  def setUp(self):
+    self.items = [Item(name, Item(city)) for (name, city) in
+      [("d", "Paris"), ("b", "Lyon"), ("a", "Paris"), ("e", "Nice"),
+       ("c", "Paris"), ("f", "Lyon")]]
+    self.dataSource = ListDataSource(lambda: self.items)
+    self.name = Column("name", "label.name", "name")
+    self.city = Column("city", "label.city", "address.name")
+    self.paris = BasicSearchCriteria("address.name",
+                                     BasicSearchCriteria.OP_EQUAL, "Paris")
+  def names(self, *args):
+    return [item.name for item in self.dataSource.fetch(*args)]
+  def testCount(self):
+    self.assertEqual(self.dataSource.count(None), 6)
+    self.assertEqual(self.dataSource.count(self.paris), 3)
+  def testFetch(self):
+    self.assertEqual(self.names(None, None, None, 1, 2), ["b", "a"])
+    self.assertEqual(self.names(None, self.name, "asc", 1, 2), ["b", "c"])
+    self.assertEqual(self.names(None, self.name, "desc", 0, 3),
+                     ["f", "e", "d"])
+    self.assertEqual(self.names(self.paris, self.name, "asc", 1, None),
+                     ["c", "d"])
+    self.assertEqual(self.names(None, self.name, "desc", 4, None), ["b", "a"])
+    self.assertEqual(self.names(self.paris, None, None, 5, 10), [])
+  def testStableSort(self):
+    self.assertEqual(self.names(None, self.city, "asc", 0, 4),
+                     ["b", "f", "e", "d"])
+    self.assertEqual(self.names(None, self.city, "desc", 0, 3),
+                     ["c", "a", "d"])
+  def testTable(self):
+    class ParisTable(Table):
+      def getDataSource(table, req):
+        return self.dataSource
+      def getSearchCriteria(table, req):
+        return self.paris
+    table = ParisTable("list")
+    self.assertEqual(table.getListSize(None), 3)
+    self.assertEqual([item.name for item in
+                      table.getItems(None, self.name, "desc", 0, 2)],
+                     ["d", "c"])
+  def testKeyset(self):
+    dataSource = ListDataSource(self.items, "name")
+    names = lambda items: [item.name for item in items]
+    self.assertEqual(names(dataSource.fetch(None, self.city, "desc", 0, 3)),
+                     ["d", "c", "a"])
+    self.assertEqual(dataSource.getKey(self.items[1], self.city),
+                     ("Lyon", "b"))
+    self.assertEqual(names(dataSource.fetchAfter(None, self.city, "asc",
+                                                 ("Lyon", "f"), 2)),
+                     ["e", "a"])
+    self.assertEqual(names(dataSource.fetchAfter(None, self.city, "asc",
+                                                 ("Paris", "a"), 2, True)),
+                     ["f", "e"])
+    self.assertEqual(names(dataSource.fetchAfter(None, self.city, "desc",
+                                                 ("Paris", "c"), 2)),
+                     ["a", "e"])
+    self.assertEqual(names(dataSource.fetchAfter(self.paris, self.city,
+                                                 "desc", ("Nice", "e"), 2,
+                                                 True)),
+                     ["c", "a"])
+    self.assertEqual(names(dataSource.fetchAfter(None, None, "asc",
+                                                 (None, "d"), 5)),
+                     ["e", "f"])
+  def testKeysetTable(self):
+    class KeysetTable(Table):
+      def getDataSource(table, req):
+        return ListDataSource(self.items, "name")
+      def getPagingMode(table, req):
+        return table.PAGING_KEYSET
+    table = KeysetTable("list")
+    req = Request()
+    req.pageSizeForKeysetTable = 2
+    names = lambda items: [item.name for item in items]
+    self.assertEqual(names(table.getItems(req, self.city, "asc", 0, 2)),
+                     ["b", "f"])
+    self.assertEqual(table.getPageParamValue(req, 2), "2")
+    nextPage = table.getPageParamValue(req, 1)
+    self.assertTrue(nextPage.startswith("1~a~"))
+    #a row inserted before the page does not shift the page seeked to
+    self.items.append(Item("a0", Item("Lyon")))
+    req = Request({"page" : nextPage})
+    req.pageSizeForKeysetTable = 2
+    self.assertEqual(table.getCurrentPage(req), 1)
+    self.assertEqual(names(table.getItems(req, self.city, "asc", 2, 4)),
+                     ["e", "a"])
+    previousPage = table.getPageParamValue(req, 0)
+    self.assertEqual(previousPage, "0")
+    self.assertTrue(table.getPageParamValue(req, 2).startswith("2~a~"))
+    #keys for another sort order or which can not be decoded are ignored
+    self.assertEqual(names(table.getItems(req, self.city, "desc", 2, 4)),
+                     ["a", "e"])
+    req = Request({"page" : "1~a~not a key"})
+    req.pageSizeForKeysetTable = 2
+    self.assertEqual(names(table.getItems(req, self.city, "asc", 2, 4)),
+                     ["f", "e"])
+
+class TestDbApiDataSource(PyWebMvcTestCase):
+  def setUp(self):
+    self.connection = sqlite3.connect(":memory:")
+    self.connection.execute("create table person (p_name text, p_city text)")
+    for (name, city) in [("d", "Paris"), ("b", "Lyon"), ("a", "Paris"),
+                         ("c", "Paris")]:
+      self.connection.execute("insert into person values (?, ?)",
+                              (name, city))
+    self.dataSource = DbApiDataSource(self.connection, "person",
+                                      {"name" : "p_name", "city" : "p_city"})
+    self.name = Column("name", "label.name", "name")
+    self.paris = BasicSearchCriteria("city", BasicSearchCriteria.OP_EQUAL,
+                                     "Paris")
+  def tearDown(self):
+    self.connection.close()
+  def names(self, *args):
+    return [item.name for item in self.dataSource.fetch(*args)]
+  def testCount(self):
+    self.assertEqual(self.dataSource.count(None), 4)
+    self.assertEqual(self.dataSource.count(self.paris), 3)
+  def testFetch(self):
+    self.assertEqual(self.names(self.paris, self.name, "asc", 1, 5), ["c", "d"])
+    self.assertEqual(self.names(None, self.name, "desc", 1, 2), ["c", "b"])
+    self.assertEqual(self.names(None, self.name, "asc", 2, None), ["c", "d"])
+    row = self.dataSource.fetch(self.paris, self.name, "asc", 0, 1)[0]
+    self.assertEqual((row.name, row.city), ("a", "Paris"))
+  def testKeyset(self):
+    dataSource = DbApiDataSource(self.connection, "person",
+                                 {"name" : "p_name", "city" : "p_city"},
+                                 keyProperty = "name")
+    city = Column("city", "label.city", "city")
+    names = lambda items: [item.name for item in items]
+    self.assertEqual(names(dataSource.fetch(None, city, "asc", 1, 2)),
+                     ["a", "c"])
+    row = dataSource.fetch(None, city, "asc", 0, 1)[0]
+    self.assertEqual(dataSource.getKey(row, city), ("Lyon", "b"))
+    self.assertEqual(names(dataSource.fetchAfter(None, city, "asc",
+                                                 ("Lyon", "b"), 2)),
+                     ["a", "c"])
+    self.assertEqual(names(dataSource.fetchAfter(self.paris, city, "asc",
+                                                 ("Paris", "a"), 5)),
+                     ["c", "d"])
+    self.assertEqual(names(dataSource.fetchAfter(None, city, "asc",
+                                                 ("Paris", "d"), 2, True)),
+                     ["a", "c"])
+    self.assertEqual(names(dataSource.fetchAfter(None, city, "desc",
+                                                 ("Paris", "c"), 5)),
+                     ["a", "b"])
+
+class TestCountCache(PyWebMvcTestCase):
+  def setUp(self):
+    self.counts = 0
+  def count(self):
+    self.counts += 1
+    return 10 + self.counts
+  def testCount(self):
+    cache = CountCache(60)
+    self.assertEqual(cache.getCount((Table, ()), self.count), (11, False))
+    self.assertEqual(cache.getCount((Table, ()), self.count), (11, False))
+    self.assertEqual(cache.getCount((Table, ("a",)), self.count), (12, False))
+    cache.invalidate(Table)
+    self.assertEqual(cache.getCount((Table, ()), self.count), (13, False))
+  def testStale(self):
+    cache = CountCache(60, 60)
+    cache.getCount((Table, ()), self.count)
+    cache.getCount((Pager, ()), self.count)
+    cache.expire(Table)
+    self.assertEqual(cache.getCount((Table, ()), self.count), (11, True))
+    self.assertEqual(cache.getCount((Pager, ()), self.count), (12, False))
+    cache = CountCache(0)
+    cache.getCount((Table, ()), self.count)
+    self.assertEqual(cache.getCount((Table, ()), self.count), (14, False))
+  def testClearedWhileInvalidating(self):
+    class ClearedCache(CountCache):
+      def getKeys(cache, pagerClass):
+        #another thread clears the cache once the keys are listed
+        keys = CountCache.getKeys(cache, pagerClass)
+        cache.entries.clear()
+        return keys
+    cache = ClearedCache(60, 60)
+    cache.getCount((Table, ()), self.count)
+    cache.expire(Table)
+    cache.getCount((Table, ()), self.count)
+    cache.invalidate(Table)
+    self.assertEqual(cache.entries, {})
+  def testPager(self):
+    cache = CountCache(60, 60)
+    items = [Item(name) for name in "abcdef"]
+    class CachedTable(Table):
+      def getDataSource(table, req):
+        return ListDataSource(items)
+      def getCountCache(table, req):
+        return cache
+    class PagedTable(CachedTable):
+      def getSearchCriteria(table, req):
+        return BasicSearchCriteria("name", BasicSearchCriteria.OP_NOT_EQUAL,
+                                   req.form["not"])
+    req = Request({"not" : "a"})
+    req.pageSizeForPagedTable = 2
+    self.assertEqual(PagedTable("list").getEndIndex(req), 2)
+    self.assertEqual(cache.entries.values()[0][1], 5)
+    items.append(Item("g"))
+    cache.expire(CachedTable)
+    req = Request({"not" : "a"})
+    req.pageSizeForPagedTable = 2
+    table = PagedTable("list")
+    self.assertTrue(table.isListSizeApproximate(req))
+    self.assertTrue("approximateCount('5',)" in table.getPagerSummary(req))
+    req = Request({"not" : "b"})
+    req.pageSizeForPagedTable = 2
+    self.assertFalse(table.isListSizeApproximate(req))
+    self.assertTrue("'6'" in table.getPagerSummary(req))
+    cache.invalidate()
+    req = Request({"not" : "a"})
+    req.pageSizeForPagedTable = 2
+    self.assertTrue("'6'" in table.getPagerSummary(req))
+
+class TestKeys(PyWebMvcTestCase):
+  def testRoundTrip(self):
+    key = (None, "asc", True, 3, 2.5, "Paris", u"S\xe8te")
+    self.assertEqual(decodeKey(encodeKey(key)), key)
+  def testInvalid(self):
+    self.assertRaises(ValueError, encodeKey, (object(),))
+    self.assertRaises(ValueError, decodeKey, "x")
+    self.assertRaises(ValueError, decodeKey, encodeKey(("a",))[:-1] + "!")
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+suite.addTest(loader.loadTestsFromTestCase(TestColumn))
+suite.addTest(loader.loadTestsFromTestCase(TestTable))
+suite.addTest(loader.loadTestsFromTestCase(TestListDataSource))
+suite.addTest(loader.loadTestsFromTestCase(TestCountCache))
+suite.addTest(loader.loadTestsFromTestCase(TestKeys))
+if sqlite3:
+  suite.addTest(loader.loadTestsFromTestCase(TestDbApiDataSource))